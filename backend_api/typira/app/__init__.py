@@ -1,6 +1,7 @@
+import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from config import config_by_name
+from config import config_by_name, BLACKLIST_PURGE_INTERVAL_HOURS, METRICS_LOG_MINUTES
 from flask_cors import CORS
 from flask_bcrypt import Bcrypt
 from flask.cli import FlaskGroup
@@ -15,10 +16,24 @@ flask_cli = FlaskGroup()
 socketio = SocketIO(cors_allowed_origins="*", async_mode='eventlet')
 scheduler = BackgroundScheduler()
 
+# Process roles (see manage.py): `web` serves REST + Socket.IO, `worker` runs the
+# scheduler and its background jobs, `all` does both in one process. `cli` (the
+# default) starts no background services, for migrations and one-off commands.
+ROLE_WEB = 'web'
+ROLE_WORKER = 'worker'
+ROLE_ALL = 'all'
+ROLE_CLI = 'cli'
+ROLES = (ROLE_WEB, ROLE_WORKER, ROLE_ALL, ROLE_CLI)
+
+
+def create_app(config_name, role=None):
+    role = role or os.environ.get("TYPIRA_ROLE", ROLE_CLI)
+    if role not in ROLES:
+        raise ValueError(f"Unknown role '{role}', expected one of {', '.join(ROLES)}")
 
-def create_app(config_name):
     app = Flask(__name__,)
     app.config.from_object(config_by_name[config_name])
+    app.config['ROLE'] = role
 
     from app.api import blueprint
     app.register_blueprint(blueprint)
@@ -32,12 +47,47 @@ def create_app(config_name):
     socketio.init_app(app)
 
     with app.app_context():
-        from app import socket_endpoints
-        from app.business.scheduler_business import dispatch_due_schedules
+        from app.business.scheduler_business import dispatch_due_schedules, backfill_next_runs
+        from app.business.context_business import typing_buffer
+        from app.helpers.insight_helpers import insight_buffer
+        from app.helpers.notification_queue import notification_queue
+        from app.business.auth_business import AuthBusiness
+
+        if role == ROLE_CLI:
+            return app
+
+        configure_pools(role)
+        typing_buffer.init_app(app)
+        insight_buffer.init_app(app)
+        notification_queue.init_app(app)
+
+        if role != ROLE_WORKER:
+            from app import socket_endpoints
         
         # Start Scheduler
-        if not scheduler.running:
-            scheduler.add_job(func=dispatch_due_schedules, trigger="interval", minutes=1, args=[app])
+        if role != ROLE_WEB and not scheduler.running:
+            backfill_next_runs(app)
+            # Fire at second 0 so pushes go out on the minute they are scheduled for
+            scheduler.add_job(func=dispatch_due_schedules, trigger="cron", second=0, args=[app])
+            scheduler.add_job(func=AuthBusiness.purge_expired_blacklist, trigger="interval",
+                              hours=BLACKLIST_PURGE_INTERVAL_HOURS, args=[app])
+            if METRICS_LOG_MINUTES > 0:
+                from app.helpers.metrics import metrics
+                scheduler.add_job(func=metrics.log, trigger="interval", minutes=METRICS_LOG_MINUTES)
             scheduler.start()
 
     return app
+
+
+def configure_pools(role):
+    """Sizes the blocking-call pools for the process role."""
+    from app.business.gemini_business import GeminiBusiness
+    from app.business.scheduler_business import schedule_pool, prepare_pool
+    import config
+
+    if role == ROLE_WEB:
+        GeminiBusiness.pool.configure(max_workers=config.WEB_GEMINI_POOL_SIZE)
+    elif role == ROLE_WORKER:
+        GeminiBusiness.pool.configure(max_workers=config.WORKER_GEMINI_POOL_SIZE)
+        schedule_pool.configure(max_workers=config.WORKER_SCHEDULER_CONCURRENCY)
+        prepare_pool.configure(max_workers=config.WORKER_SCHEDULER_CONCURRENCY)
@@ -1,3 +1,5 @@
+import datetime
+import traceback
 import uuid
 from app import db
 from app.models.users import User
@@ -73,6 +75,52 @@ class AuthBusiness:
             }
             return response_object, 409
 
+    @staticmethod
+    def logout_user(auth_token):
+        """
+        Blacklists the token; it stops working immediately.
+        Logging the same token out twice (even concurrently) succeeds both times.
+        """
+        from sqlalchemy.exc import IntegrityError
+        from app.models.blacklisted_tokens import BlacklistToken
+        from app.helpers.auth_cache import auth_cache, token_digest
+
+        decoded = User.decode_auth_token(auth_token)
+        if decoded['status'] == 0:
+            return decoded, 401
+
+        try:
+            if not BlacklistToken.check_blacklist(auth_token):
+                expires_at = datetime.datetime.utcfromtimestamp(decoded['expire_date'])
+                db.session.add(BlacklistToken(token=auth_token, expires_at=expires_at))
+                try:
+                    db.session.commit()
+                except IntegrityError:
+                    # A concurrent logout of the same token committed first: it is blacklisted either way
+                    db.session.rollback()
+            auth_cache.revoke(token_digest(auth_token))
+            return {'status': 1, 'message': 'Successfully logged out.'}
+        except Exception as e:
+            db.session.rollback()
+            return {'status': 0, 'message': f'An error occurred. Try again {e}'}, 500
+
+    @staticmethod
+    def purge_expired_blacklist(app):
+        """
+        Called periodically by APScheduler: drops blacklist entries for tokens that have expired.
+        """
+        from app.models.blacklisted_tokens import BlacklistToken
+
+        with app.app_context():
+            try:
+                deleted = BlacklistToken.purge_expired()
+                if deleted:
+                    print(f"🧹 Purged {deleted} expired blacklisted tokens")
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error in purge_expired_blacklist: {e}")
+                traceback.print_exc()
+
     @staticmethod
     def delete_user(public_id):
         try:
@@ -0,0 +1,309 @@
+import datetime
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from app import db
+from app.models.context import TypingHistory, Memory, UserAction
+from app.helpers.atomizer import split_into_sentences, scrub_pii
+from app.helpers.semantic import get_semantic_hash, get_hash_bands, hamming_distance, NEAR_DUPLICATE_MAX_DISTANCE
+from app.helpers.write_behind import WriteBehindBuffer
+from config import CONTEXT_CACHE_MAX_USERS, CONTEXT_CACHE_TTL_SECONDS, TYPING_BUFFER_FLUSH_SECONDS, TYPING_BUFFER_MAX_PENDING
+
+HISTORY_LIMIT = 30
+MEMORY_LIMIT = 20
+ACTION_LIMIT = 15
+
+MIN_ATOM_LENGTH = 3
+ABSORPTION_WINDOW_SECONDS = 60
+
+
+class ContextBusiness:
+    """
+    Assembles the personal context (typing history, memories, recent actions) fed
+    into every prompt, formatted once and cached per user in process.
+    Entries are LRU-evicted, expire after CONTEXT_CACHE_TTL_SECONDS, and are
+    invalidated whenever that user's TypingHistory, Memory or UserAction rows change.
+    """
+    _lock = threading.Lock()
+    _cache = OrderedDict()
+    # Last invalidation per user, stamped from a global counter. Only the most recent
+    # CONTEXT_CACHE_MAX_USERS are kept; users without an entry read `_version_floor`,
+    # which is raised past every pruned stamp so an in-flight load still sees the change.
+    _versions = OrderedDict()
+    _version_clock = 0
+    _version_floor = 0
+
+    @staticmethod
+    def get_snapshot(user_id):
+        """
+        Returns {'history': [...], 'memories': [...], 'actions': [...]} for the user.
+        The lists are shared between callers and must not be mutated.
+        """
+        now = time.monotonic()
+        with ContextBusiness._lock:
+            entry = ContextBusiness._cache.get(user_id)
+            if entry and entry[0] > now:
+                ContextBusiness._cache.move_to_end(user_id)
+                return entry[1]
+            version = ContextBusiness._versions.get(user_id, ContextBusiness._version_floor)
+
+        snapshot = ContextBusiness._load_snapshot(user_id)
+
+        with ContextBusiness._lock:
+            # Only cache if no write for this user landed while we were reading
+            if ContextBusiness._versions.get(user_id, ContextBusiness._version_floor) == version:
+                ContextBusiness._cache[user_id] = (now + CONTEXT_CACHE_TTL_SECONDS, snapshot)
+                ContextBusiness._cache.move_to_end(user_id)
+                while len(ContextBusiness._cache) > CONTEXT_CACHE_MAX_USERS:
+                    ContextBusiness._cache.popitem(last=False)
+        return snapshot
+
+    @staticmethod
+    def invalidate(user_id):
+        """Drops the cached snapshot for a user. Call after bulk writes that bypass the ORM."""
+        with ContextBusiness._lock:
+            ContextBusiness._cache.pop(user_id, None)
+            ContextBusiness._version_clock += 1
+            ContextBusiness._versions[user_id] = ContextBusiness._version_clock
+            ContextBusiness._versions.move_to_end(user_id)
+            while len(ContextBusiness._versions) > CONTEXT_CACHE_MAX_USERS:
+                _, pruned = ContextBusiness._versions.popitem(last=False)
+                ContextBusiness._version_floor = max(ContextBusiness._version_floor, pruned)
+
+    @staticmethod
+    def _load_snapshot(user_id):
+        history = TypingHistory.query.filter_by(user_id=user_id).order_by(TypingHistory.date_updated.desc()).limit(HISTORY_LIMIT).all()
+        memories = Memory.query.filter_by(user_id=user_id).order_by(Memory.timestamp.desc()).limit(MEMORY_LIMIT).all()
+        recent_actions = UserAction.query.filter_by(user_id=user_id).order_by(UserAction.timestamp.desc()).limit(ACTION_LIMIT).all()
+
+        return {
+            'history': [f"{h.content} (Logged on {h.date_updated.strftime('%Y-%m-%d %H:%M:%S')})" for h in history],
+            'memories': [f"{m.content} (Logged on {m.timestamp.strftime('%Y-%m-%d %H:%M:%S')})" for m in memories],
+            'actions': [f"{a.decision.upper()}: {a.context or a.action_id} at {a.timestamp.strftime('%Y-%m-%d %H:%M:%S')}" for a in recent_actions],
+        }
+
+    @staticmethod
+    def queue_typing(user_id, app_context, text):
+        """
+        Hands a typed message to the write-behind buffer; it reaches TypingHistory
+        (and the words_polished counter) within TYPING_BUFFER_FLUSH_SECONDS.
+        """
+        atoms = split_into_sentences(text)
+        if not atoms:
+            return
+        typing_buffer.add((user_id, app_context), {
+            'entries': ContextBusiness.prepare_atoms(atoms),
+            'words': sum(len(atom.split()) for atom in atoms),
+        })
+
+    @staticmethod
+    def prepare_atoms(atoms):
+        """
+        Scrubs and hashes the sentences of one message.
+        Returns [{'content', 'semantic_hash', 'is_last'}], skipping fragments too short to keep.
+        `is_last` marks the final sentence, the only one eligible for expansion absorption.
+        """
+        entries = []
+        for i, atom in enumerate(atoms):
+            if not atom or len(atom.strip()) < MIN_ATOM_LENGTH:
+                continue
+            clean_text = scrub_pii(atom)
+            entries.append({
+                'content': clean_text,
+                'semantic_hash': get_semantic_hash(clean_text),
+                'is_last': i == len(atoms) - 1,
+            })
+        return entries
+
+    @staticmethod
+    def persist_typing(user_id, app_context, entries, commit=True):
+        """
+        Stores prepared atoms in a single transaction.
+
+        - Expansion absorption: a last atom that extends the fragment typed in the same
+          app within ABSORPTION_WINDOW_SECONDS replaces that fragment.
+        - Semantic deduplication: an atom within NEAR_DUPLICATE_MAX_DISTANCE bits of an
+          existing entry (or of an earlier atom in the batch) bumps its frequency
+          (by the atom's 'count', for atoms already merged in memory).
+        - Everything else is a new entry.
+
+        Costs two SELECTs (absorption candidate + every dedup candidate) and one
+        bulk INSERT/UPDATE each, whatever the number of atoms.
+        """
+        if not entries:
+            return
+        now = datetime.datetime.utcnow()
+
+        recent = TypingHistory.query.with_entities(TypingHistory.id, TypingHistory.content).filter(
+            TypingHistory.user_id == user_id,
+            TypingHistory.app_context == app_context,
+            TypingHistory.timestamp >= now - datetime.timedelta(seconds=ABSORPTION_WINDOW_SECONDS)
+        ).order_by(TypingHistory.timestamp.desc()).first()
+
+        hashes = {entry['semantic_hash'] for entry in entries if entry['semantic_hash']}
+        columns = TypingHistory.band_columns()
+        band_sets = [set() for _ in columns]
+        for s_hash in hashes:
+            for band_set, band in zip(band_sets, get_hash_bands(s_hash)):
+                band_set.add(band)
+
+        existing = []
+        if hashes:
+            existing = TypingHistory.query.with_entities(
+                TypingHistory.id, TypingHistory.content, TypingHistory.semantic_hash, TypingHistory.frequency
+            ).filter(
+                TypingHistory.user_id == user_id,
+                TypingHistory.app_context == app_context,
+                db.or_(
+                    TypingHistory.semantic_hash.in_(hashes),
+                    *[column.in_(band_set) for column, band_set in zip(columns, band_sets)]
+                )
+            ).all()
+
+        # Rows as plain mappings: existing ones keyed by id, new ones appended as we go
+        rows = {row.id: {'id': row.id, 'content': row.content, 'semantic_hash': row.semantic_hash,
+                         'frequency': row.frequency or 0} for row in existing}
+        if recent and recent.id not in rows:
+            rows[recent.id] = {'id': recent.id, 'content': recent.content}
+        inserts, updated_ids = [], set()
+        # The most recently written row, as the sequential path would have seen it
+        latest = rows[recent.id] if recent else None
+
+        for entry in entries:
+            clean_text, s_hash = entry['content'], entry['semantic_hash']
+            count = entry.get('count', 1)
+
+            if entry['is_last'] and latest and clean_text.startswith(latest['content']) \
+                    and len(clean_text) > len(latest['content']):
+                latest.update(content=clean_text, semantic_hash=s_hash, timestamp=now, date_updated=now)
+                if 'id' in latest:
+                    updated_ids.add(latest['id'])
+                continue
+
+            if not s_hash:
+                continue
+
+            match = ContextBusiness._closest(s_hash, list(rows.values()) + inserts)
+            if match:
+                match.update(frequency=(match.get('frequency') or 0) + count, content=clean_text,
+                             semantic_hash=s_hash, timestamp=now, date_updated=now)
+                if 'id' in match:
+                    updated_ids.add(match['id'])
+            else:
+                match = {'user_id': user_id, 'content': clean_text, 'semantic_hash': s_hash,
+                         'app_context': app_context, 'frequency': count, 'timestamp': now, 'date_updated': now}
+                inserts.append(match)
+            latest = match
+
+        updates = [rows[row_id] for row_id in updated_ids]
+        for mapping in inserts + updates:
+            mapping.update(TypingHistory.band_values(mapping.get('semantic_hash')))
+
+        # Bulk operations bypass mapper events, so flag the user for cache invalidation directly
+        _mark_session_dirty(db.session, user_id)
+        try:
+            if inserts:
+                db.session.bulk_insert_mappings(TypingHistory, inserts)
+            if updates:
+                db.session.bulk_update_mappings(TypingHistory, updates)
+            if commit:
+                db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    @staticmethod
+    def _closest(s_hash, rows):
+        best, best_distance = None, NEAR_DUPLICATE_MAX_DISTANCE + 1
+        for row in rows:
+            if not row.get('semantic_hash'):
+                continue
+            distance = hamming_distance(row['semantic_hash'], s_hash)
+            if distance < best_distance:
+                best, best_distance = row, distance
+        return best
+
+
+class TypingBuffer(WriteBehindBuffer):
+    """
+    Write-behind buffer for keyboard context, keyed by (user_id, app_context).
+    Repeated and near-duplicate sentences collapse into one pending entry with a
+    count, and expansion absorption is applied in memory, so each flush writes
+    every distinct sentence once and commits once for all users.
+    """
+
+    def merge(self, pending, key, item):
+        bucket = pending.setdefault(key, {'entries': [], 'words': 0, 'latest': None})
+        bucket['words'] += item['words']
+        entries = bucket['entries']
+
+        for entry in item['entries']:
+            latest = bucket['latest']
+            if entry['is_last'] and latest and entry['content'].startswith(latest['content']) \
+                    and len(entry['content']) > len(latest['content']):
+                latest.update(content=entry['content'], semantic_hash=entry['semantic_hash'])
+                continue
+
+            match = ContextBusiness._closest(entry['semantic_hash'], entries) if entry['semantic_hash'] else None
+            if match:
+                match.update(content=entry['content'], semantic_hash=entry['semantic_hash'],
+                             count=match.get('count', 1) + 1)
+            else:
+                match = dict(entry)
+                entries.append(match)
+            bucket['latest'] = match
+
+    def combine(self, older, newer):
+        # persist_typing dedupes within one call, so the entries can simply be concatenated
+        return {
+            'entries': older['entries'] + newer['entries'],
+            'words': older['words'] + newer['words'],
+            'latest': newer['latest'] or older['latest'],
+        }
+
+    def write(self, batch):
+        from app.helpers.insight_helpers import increment_user_stats
+
+        words = {}
+        for (user_id, app_context), bucket in batch.items():
+            ContextBusiness.persist_typing(user_id, app_context, bucket['entries'], commit=False)
+            words[user_id] = words.get(user_id, 0) + bucket['words']
+        db.session.commit()
+        # Only once committed, so a failed (and retried) write is not counted twice
+        for user_id, count in words.items():
+            increment_user_stats(user_id, words=count)
+
+
+typing_buffer = TypingBuffer("typing_buffer", flush_interval=TYPING_BUFFER_FLUSH_SECONDS,
+                             max_pending=TYPING_BUFFER_MAX_PENDING)
+
+
+# --- Invalidation: collect touched users per session, invalidate once the commit lands ---
+
+def _mark_session_dirty(session, user_id):
+    if user_id:
+        session.info.setdefault('context_dirty_users', set()).add(user_id)
+
+
+def _mark_user_dirty(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        _mark_session_dirty(session, target.user_id)
+
+
+for _model in (TypingHistory, Memory, UserAction):
+    for _event in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event, _mark_user_dirty)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_users(session):
+    for user_id in session.info.pop('context_dirty_users', ()):
+        ContextBusiness.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_dirty_users(session):
+    session.info.pop('context_dirty_users', None)
@@ -1,42 +1,138 @@
 import json
 import os
+import time
 import traceback
-import base64
+import httpx
 from google import genai
 from google.genai import types
+from config import GEMINI_POOL_SIZE, GEMINI_PER_USER_LIMIT, GEMINI_TIMEOUT_SECONDS, GEMINI_HTTP_MAX_CONNECTIONS, \
+    SPEECH_INLINE_MAX_BYTES
+from app.helpers.worker_pool import FairWorkerPool
+from app.helpers.image_processing import media_pool
+from app.helpers.metrics import metrics
+from app.helpers.json_stream import JsonArrayStreamParser
 from app.business.prompts import BASE_PERSONA, KEYBOARD_PERSONA, INSIGHTS_SCHEMA,OUTPUT_CONSTRAINTS, PRIORITY_TASK_GUIDELINES, STANDARD_CONTEXT_BLOCK, MULTI_STEP_THOUGHT_PROCESS, KEYBOARD_ACTION_DEFINITIONS, AGENTIC_ACTION_DEFINITIONS, KEYBOARD_CONTEXT_BLOCK, KEYBOARD_THOUGHT_PROCESS, KEYBOARD_INSTRUCTIONS, PROACTIVE_ACTIONS_INSTRUCTION, JSON_FORMAT_KEYBOARD_CONTEXT, JSON_FORMAT_INSIGHT, JSON_FORMAT_VOICE, JSON_FORMAT_EXECUTION, PRIORITY_TASK_GOAL, PRIORITY_TASK_EXECUTION_STEPS, AGENTIC_ACTION_PROMPT_TEMPLATE, AGENTIC_EXECUTION_PROMPT_TEMPLATE, AGENTIC_EXECUTION_INSTRUCTIONS, AGENTIC_EXECUTION_CONSTRAINTS_BLOCK, IMAGE_ANALYSIS_PROMPT_TEMPLATE, IMAGE_ANALYSIS_INSTRUCTIONS, VOICE_ANALYSIS_PROMPT_TEMPLATE, VOICE_ANALYSIS_INSTRUCTIONS, TEXT_ANALYSIS_PROMPT_TEMPLATE, TEXT_ANALYSIS_INSTRUCTIONS, JSON_FORMAT_SCHEDULED, SCHEDULED_INSIGHT_PROMPT_TEMPLATE
 
 class GeminiBusiness:
-    # Initialize Gemini
-    client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
+    # Initialize Gemini (one shared HTTP connection pool for every call)
+    client = genai.Client(
+        api_key=os.environ.get("GEMINI_API_KEY"),
+        http_options=types.HttpOptions(
+            timeout=GEMINI_TIMEOUT_SECONDS * 1000,
+            client_args={
+                'limits': httpx.Limits(
+                    max_connections=GEMINI_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=GEMINI_HTTP_MAX_CONNECTIONS
+                )
+            }
+        )
+    )
     model_name = 'gemini-3-flash-preview'
 
+    # Blocking SDK calls run here instead of on the eventlet hub
+    pool = FairWorkerPool(
+        "gemini",
+        max_workers=GEMINI_POOL_SIZE,
+        per_key_limit=GEMINI_PER_USER_LIMIT,
+        default_timeout=GEMINI_TIMEOUT_SECONDS
+    )
+
+    @staticmethod
+    def _generate(user_id: int = None, timeout: float = None, should_cancel=None, **request):
+        """
+        Runs generate_content on the Gemini pool, queued fairly per user.
+        Raises PoolTimeoutError if the call does not finish within `timeout`, and
+        PoolCancelledError if `should_cancel` reports the caller no longer needs it.
+        """
+        return GeminiBusiness.pool.run(
+            GeminiBusiness.client.models.generate_content,
+            key=user_id,
+            timeout=timeout,
+            should_cancel=should_cancel,
+            model=GeminiBusiness.model_name,
+            **request
+        )
+
+    @staticmethod
+    def _stream_json_text(progress, **request):
+        """
+        Runs on a pool worker: consumes the streamed response and publishes every
+        completed element of the "thoughts" array while the rest is still generating.
+        """
+        parser = JsonArrayStreamParser("thoughts")
+        for chunk in GeminiBusiness.client.models.generate_content_stream(
+            model=GeminiBusiness.model_name,
+            **request
+        ):
+            if chunk.text:
+                for thought in parser.feed(chunk.text):
+                    progress(thought)
+        return parser.text
+
+    @staticmethod
+    def _generate_json_text(user_id: int = None, timeout: float = None, on_thought=None, should_cancel=None, **request):
+        """
+        Returns the raw JSON text of a response. With `on_thought`, the response is
+        streamed and each thought is handed to `on_thought` in the caller's greenthread.
+        """
+        if not on_thought:
+            return GeminiBusiness._generate(user_id=user_id, timeout=timeout, should_cancel=should_cancel, **request).text
+        return GeminiBusiness.pool.run(
+            GeminiBusiness._stream_json_text,
+            key=user_id,
+            timeout=timeout,
+            on_progress=on_thought,
+            should_cancel=should_cancel,
+            **request
+        )
+
+    @staticmethod
+    def _media_part(data, mime_type):
+        # The SDK needs real bytes; this is the only copy of an uploaded buffer
+        return types.Part.from_bytes(data=data if isinstance(data, bytes) else bytes(data), mime_type=mime_type)
+
     @staticmethod
-    def speech_to_text(audio_file):
+    def speech_to_text(audio_file, user_id: int = None):
         """
         Receives an audio file and transcribes it using Gemini.
+        The upload is read straight from its stream (Werkzeug keeps small uploads in
+        memory and spools large ones to a temp file); uploads above
+        SPEECH_INLINE_MAX_BYTES go through the File API instead of inline bytes.
         """
+        from app.helpers.artifact_store import upload_store
+
+        uploaded = None
         try:
-            # Create uploads directory if it doesn't exist
-            upload_dir = "uploads"
-            if not os.path.exists(upload_dir):
-                os.makedirs(upload_dir)
-                
-            # Save file locally for testing
-            file_path = os.path.join(upload_dir, f"test_{audio_file.filename}")
-            audio_file.save(file_path)
-
-            with open(file_path, "rb") as f:
-                content = f.read()
-                
+            stream = audio_file.stream
+            stream.seek(0, os.SEEK_END)
+            size = stream.tell()
+            stream.seek(0)
+            mime_type = audio_file.content_type or "audio/wav"
+            extension = os.path.splitext(audio_file.filename or "")[1].lower()
+
+            saved_path = None
+            if upload_store:
+                # Hashing and copying the upload is file I/O: keep it off the eventlet hub
+                _, saved_path = media_pool.run(upload_store.put, stream, extension, key=user_id)
+                stream.seek(0)
+
+            if size <= SPEECH_INLINE_MAX_BYTES:
+                audio_part = types.Part.from_bytes(
+                    data=stream.read(),
+                    mime_type=mime_type
+                )
+            else:
+                uploaded = GeminiBusiness.pool.run(
+                    GeminiBusiness.client.files.upload,
+                    key=user_id,
+                    file=stream,
+                    config=types.UploadFileConfig(mime_type=mime_type)
+                )
+                audio_part = uploaded
+
             # Use Gemini to transcribe
-            audio_part = types.Part.from_bytes(
-                data=content,
-                mime_type=audio_file.content_type or "audio/wav"
-            )
-            
-            response = GeminiBusiness.client.models.generate_content(
-                model=GeminiBusiness.model_name,
+            response = GeminiBusiness._generate(
+                user_id=user_id,
                 contents=[
                     "Transcribe this audio exactly as spoken. Return ONLY the transcribed text.",
                     audio_part
@@ -44,17 +140,21 @@ class GeminiBusiness:
             )
 
             print(response.text)
-            
+
             return {
                 "transcript": response.text.strip(),
-                "saved_locally": file_path
+                "saved_locally": saved_path
             }
         except Exception as e:
             print(traceback.format_exc())
             return {"error": str(e)}
+        finally:
+            if uploaded is not None:
+                # Best-effort cleanup; the File API also expires uploads after 48h
+                GeminiBusiness.pool.submit(GeminiBusiness.client.files.delete, name=uploaded.name, key=user_id)
 
     @staticmethod
-    def rewrite_text(text: str, tone: str, context: str):
+    def rewrite_text(text: str, tone: str, context: str, user_id: int = None):
         """
         Rewrites text according to a specific tone and user context.
         """
@@ -62,8 +162,8 @@ class GeminiBusiness:
             prompt = f"User Context (Memories): {context}\n\n" if context else ""
             prompt += f"Rewrite the following text in a {tone} tone:\n\n{text}\n\nReturn only the rewritten text."
             
-            response = GeminiBusiness.client.models.generate_content(
-                model=GeminiBusiness.model_name,
+            response = GeminiBusiness._generate(
+                user_id=user_id,
                 contents=prompt
             )
             return {"rewritten_text": response.text.strip()}
@@ -83,7 +183,7 @@ class GeminiBusiness:
         return {"status": "success"}
 
     @staticmethod
-    def suggest_text(text: str, context: str):
+    def suggest_text(text: str, context: str, user_id: int = None):
         """
         Provides a real-time suggestion based on current text and user context.
         optimized for speed (using gemini-3-flash).
@@ -105,8 +205,8 @@ Rules:
 
 Sentence:"""
             
-            response = GeminiBusiness.client.models.generate_content(
-                model=GeminiBusiness.model_name,
+            response = GeminiBusiness._generate(
+                user_id=user_id,
                 contents=prompt
             )
             full_sentence = response.text.strip().replace('"', '')
@@ -118,9 +218,11 @@ Sentence:"""
             return {"suggestion": ""}
 
     @staticmethod
-    def analyze_context(text: str, history: list, app_context: str, current_time: str = None, user_platform: str = None):
+    def analyze_context(text: str, history: list, app_context: str, current_time: str = None, user_platform: str = None, user_id: int = None, on_thought=None, should_cancel=None):
         """
         Agentic Brain: Analyzes current text + full semantic history.
+        `on_thought` (optional) receives each thought as soon as it is generated.
+        `should_cancel` (optional) lets a superseded request drop out of the Gemini queue.
         """
         try:
             history_block = "\n".join([f"- {h}" for h in history])
@@ -143,18 +245,19 @@ Sentence:"""
 
 {OUTPUT_CONSTRAINTS}"""
             
-            response = GeminiBusiness.client.models.generate_content(
-                model=GeminiBusiness.model_name,
+            response_text = GeminiBusiness._generate_json_text(
+                user_id=user_id,
+                on_thought=on_thought,
+                should_cancel=should_cancel,
                 contents=prompt,
                 config=types.GenerateContentConfig(
                     response_mime_type='application/json'
                 )
             )
             
-            import json
-            if not response.text:
+            if not response_text:
                 raise Exception("Empty response from AI")
-            return json.loads(response.text)
+            return json.loads(response_text)
             
         except Exception as e:
             print(f"Agentic Analysis Error: {e}")
@@ -165,11 +268,12 @@ Sentence:"""
             }
 
     @staticmethod
-    def get_priority_task(history: list, memories: list, action_history: list, app_context: str, current_time: str = None, user_platform: str = None):
+    def get_priority_task(history: list, memories: list, action_history: list, app_context: str, current_time: str = None, user_platform: str = None, user_id: int = None, on_thought=None):
         """
         Looks through user's deep history and memories to find the ONE most important
         priority task they need to handle right now.
         Uses Single-Shot CoT Verification in the prompt.
+        `on_thought` (optional) receives each thought as soon as it is generated.
         """
         try:
             history_block = "\n".join([f"- {h}" for h in history])
@@ -198,17 +302,17 @@ Sentence:"""
 
 {OUTPUT_CONSTRAINTS}"""
 
-            response = GeminiBusiness.client.models.generate_content(
-                model=GeminiBusiness.model_name,
+            response_text = GeminiBusiness._generate_json_text(
+                user_id=user_id,
+                on_thought=on_thought,
                 contents=prompt,
                 config=types.GenerateContentConfig(
                     response_mime_type='application/json'
                 )
             )
-            import json
-            if not response.text:
+            if not response_text:
                 raise Exception("Empty response from AI")
-            return json.loads(response.text)
+            return json.loads(response_text)
             
         except Exception as e:
             print(f"Priority Task Error: {e}")
@@ -227,7 +331,7 @@ Sentence:"""
             }
 
     @staticmethod
-    def perform_keyboard_agentic_action(action_id: str, payload: str, context: str, history: list, current_time: str = None):
+    def perform_keyboard_agentic_action(action_id: str, payload: str, context: str, history: list, current_time: str = None, user_id: int = None):
         """
         Executes a specific agentic task (Step 2 of the loop).
         Returns a final result (usually text to be inserted).
@@ -247,8 +351,8 @@ Sentence:"""
                 OUTPUT_CONSTRAINTS=OUTPUT_CONSTRAINTS
             )
 
-            response = GeminiBusiness.client.models.generate_content(
-                model=GeminiBusiness.model_name,
+            response = GeminiBusiness._generate(
+                user_id=user_id,
                 contents=prompt,
                 config=types.GenerateContentConfig(
                     response_mime_type='application/json'
@@ -268,10 +372,11 @@ Sentence:"""
             }
 
     @staticmethod
-    def perform_agentic_action(action_id: str, payload: str, history: list, user_input: str = None, current_time: str = None, user_platform: str = None):
+    def perform_agentic_action(action_id: str, payload: str, history: list, user_input: str = None, current_time: str = None, user_platform: str = None, user_id: int = None, on_thought=None):
         """
         Executes a specific agentic task (Step 2 of the loop).
         Returns a final result with a multi-step thinking process.
+        `on_thought` (optional) receives each thought as soon as it is generated.
         """
         try:
             history_block = "\n".join([f"- {h}" for h in history])
@@ -292,17 +397,17 @@ Sentence:"""
                 output_constraints=OUTPUT_CONSTRAINTS
             )
 
-            response = GeminiBusiness.client.models.generate_content(
-                model=GeminiBusiness.model_name,
+            response_text = GeminiBusiness._generate_json_text(
+                user_id=user_id,
+                on_thought=on_thought,
                 contents=prompt,
                 config=types.GenerateContentConfig(
                     response_mime_type='application/json'
                 )
             )
-            import json
-            if not response.text:
+            if not response_text:
                 raise Exception("Empty response from AI")
-            return json.loads(response.text)
+            return json.loads(response_text)
         except Exception as e:
             print(f"Action Execution Error: {e}")
             return {
@@ -313,19 +418,20 @@ Sentence:"""
             }
 
     @staticmethod
-    def analyze_image(image_base64: str, mime_type: str, history: list, memories: list, action_history: list, current_time: str = None, user_platform: str = None):
+    def analyze_image(image_data, mime_type: str, history: list, memories: list, action_history: list, current_time: str = None, user_platform: str = None, user_id: int = None):
         """
         Analyzes an image using Gemini Vision and context.
+        `image_data` is sent as is (bytes or a memoryview); run_image_analysis has
+        already downscaled it with prepare_image.
         """
+        started = time.monotonic()
         try:
             history_block = "\n".join([f"- {h}" for h in history])
             memory_block = "\n".join([f"- {m}" for m in memories])
             action_block = "\n".join([f"- {a}" for a in action_history])
             time_context = f"CURRENT TIME: {current_time}\n" if current_time else ""
 
-            # Prepare Image Part
-            image_data = base64.b64decode(image_base64)
-            image_part = types.Part.from_bytes(data=image_data, mime_type=mime_type)
+            image_part = GeminiBusiness._media_part(image_data, mime_type)
 
             prompt = IMAGE_ANALYSIS_PROMPT_TEMPLATE.format(
                 time_context=time_context,
@@ -335,8 +441,8 @@ Sentence:"""
                 output_constraints=OUTPUT_CONSTRAINTS
             )
 
-            response = GeminiBusiness.client.models.generate_content(
-                model=GeminiBusiness.model_name,
+            response = GeminiBusiness._generate(
+                user_id=user_id,
                 contents=[prompt, image_part],
                 config=types.GenerateContentConfig(
                     response_mime_type='application/json'
@@ -360,11 +466,14 @@ Sentence:"""
                 "plan": "I'm having trouble analyzing this specific image right now.",
                 "actions": [{"id": "none", "label": "Ok", "type": "none", "payload": ""}]
             }
+        finally:
+            metrics.observe('vision.analyze_seconds', time.monotonic() - started)
 
     @staticmethod
-    def analyze_voice(audio_base64: str, mime_type: str, history: list, memories: list, action_history: list, current_time: str = None, user_platform: str = None):
+    def analyze_voice(audio_data, mime_type: str, history: list, memories: list, action_history: list, current_time: str = None, user_platform: str = None, user_id: int = None):
         """
         Analyzes audio using Gemini and context.
+        `audio_data` is the raw recording (bytes or a memoryview from a chunked upload).
         """
         try:
             history_block = "\n".join([f"- {h}" for h in history])
@@ -373,8 +482,7 @@ Sentence:"""
             time_context = f"CURRENT TIME: {current_time}\n" if current_time else ""
 
             # Prepare Audio Part
-            audio_data = base64.b64decode(audio_base64)
-            audio_part = types.Part.from_bytes(data=audio_data, mime_type=mime_type)
+            audio_part = GeminiBusiness._media_part(audio_data, mime_type)
 
             prompt = VOICE_ANALYSIS_PROMPT_TEMPLATE.format(
                 time_context=time_context,
@@ -384,8 +492,8 @@ Sentence:"""
                 output_constraints=OUTPUT_CONSTRAINTS
             )
 
-            response = GeminiBusiness.client.models.generate_content(
-                model=GeminiBusiness.model_name,
+            response = GeminiBusiness._generate(
+                user_id=user_id,
                 contents=[prompt, audio_part],
                 config=types.GenerateContentConfig(
                     response_mime_type='application/json'
@@ -407,7 +515,7 @@ Sentence:"""
             }
 
     @staticmethod
-    def analyze_text_command(text: str, history: list, memories: list, action_history: list, current_time: str = None, user_platform: str = None):
+    def analyze_text_command(text: str, history: list, memories: list, action_history: list, current_time: str = None, user_platform: str = None, user_id: int = None):
         """
         Analyzes manually entered text using Gemini and context.
         """
@@ -427,8 +535,8 @@ Sentence:"""
                 output_constraints=OUTPUT_CONSTRAINTS
             )
 
-            response = GeminiBusiness.client.models.generate_content(
-                model=GeminiBusiness.model_name,
+            response = GeminiBusiness._generate(
+                user_id=user_id,
                 contents=prompt,
                 config=types.GenerateContentConfig(
                     response_mime_type='application/json'
@@ -449,10 +557,11 @@ Sentence:"""
                 "actions": [{"id": "none", "label": "Ok", "type": "none", "payload": ""}]
             }
     @staticmethod
-    def generate_scheduled_insight(action_description: str, history: list, memories: list, action_history: list, current_time: str = None, user_platform: str = None):
+    def generate_scheduled_insight(action_description: str, history: list, memories: list, action_history: list, current_time: str = None, user_platform: str = None, user_id: int = None, timeout: float = None, raise_errors: bool = False):
         """
         Generates a personalized insight for a scheduled moment, using Google Search grounding.
         Returns: {title, short_description, full_formatted_result}
+        On failure returns a generic fallback insight, or re-raises if `raise_errors`.
         """
         try:
             history_block = "\n".join([f"- {h}" for h in history])
@@ -470,8 +579,9 @@ Sentence:"""
                 output_constraints=OUTPUT_CONSTRAINTS
             )
 
-            response = GeminiBusiness.client.models.generate_content(
-                model=GeminiBusiness.model_name,
+            response = GeminiBusiness._generate(
+                user_id=user_id,
+                timeout=timeout,
                 contents=prompt,
                 config=types.GenerateContentConfig(
                     response_mime_type='application/json',
@@ -485,6 +595,8 @@ Sentence:"""
 
         except Exception as e:
             print(f"Scheduled Insight Error: {e}")
+            if raise_errors:
+                raise
             return {
                 "title": "Scheduled Helper",
                 "short_description": "I noticed it's time for your scheduled update!",
@@ -1,31 +1,136 @@
 import datetime
+import json
+import os
+import socket
+import threading
+import uuid
+import zlib
 import pytz
 import traceback
 from app import db, socketio
-from app.models.scheduler import Schedule
-from app.models.context import Memory, TypingHistory, UserAction
+from app.models.scheduler import Schedule, SchedulerLease
+from app.models.context import Memory
 from app.business.gemini_business import GeminiBusiness
+from app.business.context_business import ContextBusiness
 from app.helpers.insight_helpers import increment_user_stats
+from app.helpers.metrics import metrics
+from app.helpers.worker_pool import FairWorkerPool
+from config import SCHEDULER_CONCURRENCY, SCHEDULER_JOB_TIMEOUT_SECONDS, SCHEDULER_PRECOMPUTE_MINUTES, \
+    SCHEDULER_LEASE_SECONDS
+
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+# Due schedules run here, at most SCHEDULER_CONCURRENCY at once (one per user at a time)
+schedule_pool = FairWorkerPool("scheduler", max_workers=SCHEDULER_CONCURRENCY, per_key_limit=1)
+# Insights for upcoming runs are generated here, so slow Gemini calls never delay a due push
+prepare_pool = FairWorkerPool("scheduler-prepare", max_workers=SCHEDULER_CONCURRENCY, per_key_limit=1)
+
+_preparing = set()
+_preparing_lock = threading.Lock()
+
+# Only the process holding this lease dispatches; the others stand by and take over when it expires
+DISPATCHER_LEASE = "schedule_dispatcher"
+LEASE_HOLDER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
 
 def dispatch_due_schedules(app):
-    print("dispatch_due_schedules")
     """
-    Called every minute by APScheduler. Checks for schedules that match the current time.
+    Called at the start of every minute by APScheduler, in every process; only the
+    holder of the dispatcher lease does anything.
+    1. Sends the schedules whose next_run_utc has passed (using the insight prepared
+       ahead of time when there is one) on schedule_pool.
+    2. Starts preparing the insights due within the next SCHEDULER_PRECOMPUTE_MINUTES.
+    Returns without waiting for either. Runs missed while the worker was down are
+    caught up once, on the next tick.
     """
     # Use app context since this runs in a separate thread
     with app.app_context():
         try:
+            if not SchedulerLease.acquire(DISPATCHER_LEASE, LEASE_HOLDER, SCHEDULER_LEASE_SECONDS):
+                return
             now_utc = datetime.datetime.utcnow()
-            schedules = Schedule.query.all()
-            
-            for schedule in schedules:
-                if is_due(schedule, now_utc):
-                    # We use a socket background task or separate thread to not block the main scheduler loop
-                    process_schedule(schedule)
+            _dispatch_due(app, now_utc)
+            _prepare_upcoming(app, now_utc)
         except Exception as e:
             print(f"Error in dispatch_due_schedules: {e}")
             traceback.print_exc()
 
+def _dispatch_due(app, now_utc):
+    schedules = Schedule.query.filter(
+        Schedule.next_run_utc != None,
+        Schedule.next_run_utc <= now_utc
+    ).order_by(Schedule.next_run_utc.asc()).all()
+
+    # Claim every due schedule before running any, so a slow run cannot trigger it twice.
+    # The claim is a compare-and-set on next_run_utc: if another dispatcher (e.g. a
+    # previous lease holder that has not noticed yet) advanced it first, we skip it.
+    next_minute = now_utc.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+    table = Schedule.__table__
+    runs = []
+    for schedule in schedules:
+        due_at = schedule.next_run_utc
+        prepared = schedule.prepared_payload if schedule.prepared_for_utc == due_at else None
+        claimed = db.session.execute(
+            table.update()
+            .where(table.c.id == schedule.id, table.c.next_run_utc == due_at)
+            .values(last_run=now_utc, next_run_utc=compute_next_run_utc(schedule, next_minute),
+                    prepared_for_utc=None, prepared_payload=None)
+        ).rowcount
+        if claimed:
+            runs.append((schedule.id, schedule.user_id, due_at, prepared))
+    db.session.commit()
+
+    for schedule_id, user_id, due_at, prepared in runs:
+        schedule_pool.submit(process_schedule, app, schedule_id, due_at, prepared, key=user_id)
+    metrics.incr('scheduler.dispatched', len(runs))
+
+def _prepare_upcoming(app, now_utc):
+    if SCHEDULER_PRECOMPUTE_MINUTES <= 0:
+        return
+    upcoming = Schedule.query.with_entities(Schedule.id, Schedule.user_id, Schedule.next_run_utc).filter(
+        Schedule.next_run_utc > now_utc,
+        Schedule.next_run_utc <= now_utc + datetime.timedelta(minutes=SCHEDULER_PRECOMPUTE_MINUTES),
+        db.or_(Schedule.prepared_for_utc == None, Schedule.prepared_for_utc != Schedule.next_run_utc)
+    ).all()
+
+    for schedule_id, user_id, due_at in upcoming:
+        if now_utc < prepare_at(schedule_id, due_at):
+            continue
+        with _preparing_lock:
+            if (schedule_id, due_at) in _preparing:
+                continue
+            _preparing.add((schedule_id, due_at))
+        prepare_pool.submit(prepare_schedule, app, schedule_id, due_at, key=user_id)
+
+def prepare_at(schedule_id, due_at):
+    """
+    When to start generating the insight for the run at `due_at`.
+    Runs due at the same minute are spread over the precompute window with a stable
+    per-schedule jitter, keeping the last minute free so the result is ready in time.
+    """
+    window = SCHEDULER_PRECOMPUTE_MINUTES * 60
+    spread = max(window - 60, 1)
+    jitter = zlib.crc32(f"{schedule_id}:{due_at.isoformat()}".encode()) % spread
+    return due_at - datetime.timedelta(seconds=window - jitter)
+
+def backfill_next_runs(app):
+    """
+    Fills next_run_utc for schedules created before it existed. Safe to run on every start.
+    """
+    with app.app_context():
+        try:
+            now_minute = datetime.datetime.utcnow().replace(second=0, microsecond=0)
+            pending = Schedule.query.filter(Schedule.next_run_utc == None).all()
+            for schedule in pending:
+                after = now_minute
+                if schedule.last_run:
+                    after = max(after, schedule.last_run.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1))
+                schedule.next_run_utc = compute_next_run_utc(schedule, after)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error in backfill_next_runs: {e}")
+            traceback.print_exc()
+
 def get_timezone_obj(tz_str):
     """
     Safely returns a timezone object. Handles 'GMT+X', 'UTC+X', and standard IANA names.
@@ -45,119 +150,162 @@ def get_timezone_obj(tz_str):
                 return pytz.FixedOffset(offset * 60)
             elif clean_str.startswith("-"):
                 offset = int(clean_str.replace("-", ""))
-                return pytz.FixedOffset(offset * 60) # FixedOffset takes minutes, negative handled?
-                # pytz.FixedOffset(60) is +1h. pytz.FixedOffset(-60) is -1h.
+                # FixedOffset takes minutes east of UTC: pytz.FixedOffset(-60) is -1h
+                return pytz.FixedOffset(-offset * 60)
         except Exception:
             pass
             
         print(f"Warning: Unknown timezone '{tz_str}', defaulting to UTC")
         return pytz.utc
 
-def is_due(schedule, now_utc):
+def compute_next_run_utc(schedule, after_utc):
     """
-    Determines if a schedule is due based on time and frequency.
+    First run of `schedule` at or after `after_utc` (naive UTC), as naive UTC.
+    `time` is "HH:mm" in the schedule's timezone; `date_or_repeat` is "Everyday",
+    a weekday name ("Monday") or a date ("YYYY-MM-DD").
+    Returns None when the schedule will never run again (or cannot be parsed).
     """
     try:
-        # 1. Check if it already ran in this same minute (to avoid overlaps)
-        if schedule.last_run:
-            if schedule.last_run.strftime("%Y-%m-%d %H:%M") == now_utc.strftime("%Y-%m-%d %H:%M"):
-                return False
-
-        # 2. Parse schedule timezone
-        tz = get_timezone_obj(schedule.timezone)
-        local_now = now_utc.replace(tzinfo=pytz.utc).astimezone(tz)
-        
-        # 3. Check time match (HH:mm)
-        local_time_str = local_now.strftime("%H:%M")
-        print(local_time_str)
-        print(schedule.time)
-        if local_time_str != schedule.time:
-            return False
-            
-        # 4. Check Date or Repeat
-        if schedule.date_or_repeat == "Everyday":
-            return True
-        
-        # Day of week match (Monday, Tuesday, etc.)
-        current_day = local_now.strftime("%A")
-        if schedule.date_or_repeat == current_day:
-            return True
-            
-        # Specific date match (YYYY-MM-DD)
-        if schedule.date_or_repeat == local_now.strftime("%Y-%m-%d"):
-            return True
+        hour, minute = (int(part) for part in schedule.time.split(":"))
+        run_time = datetime.time(hour, minute)
+    except (AttributeError, ValueError):
+        print(f"Warning: Invalid time '{schedule.time}' on schedule {schedule.id}")
+        return None
 
-        return False
-    except Exception as e:
-        print(f"Error checking schedule {schedule.id}: {e}")
-        return False
+    tz = get_timezone_obj(schedule.timezone)
+    local_after = pytz.utc.localize(after_utc).astimezone(tz)
+    repeat = schedule.date_or_repeat
+
+    if repeat == "Everyday" or repeat in WEEKDAYS:
+        # The day before covers runs that fall on the previous local date but after `after_utc`
+        candidates = [local_after.date() + datetime.timedelta(days=offset) for offset in range(-1, 9)]
+        if repeat != "Everyday":
+            candidates = [day for day in candidates if day.strftime("%A") == repeat]
+    else:
+        try:
+            candidates = [datetime.datetime.strptime(repeat, "%Y-%m-%d").date()]
+        except (TypeError, ValueError):
+            print(f"Warning: Invalid date_or_repeat '{repeat}' on schedule {schedule.id}")
+            return None
 
-def process_schedule(schedule):
+    for day in candidates:
+        local_run = tz.normalize(tz.localize(datetime.datetime.combine(day, run_time)))
+        run_utc = local_run.astimezone(pytz.utc).replace(tzinfo=None)
+        if run_utc >= after_utc:
+            return run_utc
+    return None
+
+def prepare_schedule(app, schedule_id, due_at):
     """
-    Executes the AI logic for a due schedule, stores results in memory, and sends a push notification.
+    Generates the insight for the run at `due_at` ahead of time and stores it on the
+    schedule. Runs on a prepare_pool worker.
     """
-    try:
-        from app.helpers.notification_method import NotificationMethod
-        print(f"⏰ [SCHEDULER] Processing schedule: {schedule.title} for user {schedule.user_id}")
-        
-        # 1. Update last_run immediately to prevent double triggers
-        schedule.last_run = datetime.datetime.utcnow()
-        db.session.add(schedule)
-        db.session.commit()
-        
-        # 2. Gather context
-        user_id = schedule.user_id
-        history = TypingHistory.query.filter_by(user_id=user_id).order_by(TypingHistory.date_updated.desc()).limit(30).all()
-        memories = Memory.query.filter_by(user_id=user_id).order_by(Memory.timestamp.desc()).limit(20).all()
-        recent_actions = UserAction.query.filter_by(user_id=user_id).order_by(UserAction.timestamp.desc()).limit(15).all()
-
-        history_list = [f"{h.content} (Logged on {h.date_updated.strftime('%Y-%m-%d %H:%M:%S')})" for h in history]
-        memory_list = [f"{m.content} (Logged on {m.timestamp.strftime('%Y-%m-%d %H:%M:%S')})" for m in memories]
-        action_history = [f"{a.decision.upper()}: {a.context or a.action_id} at {a.timestamp.strftime('%Y-%m-%d %H:%M:%S')}" for a in recent_actions]
-        
-        # 3. Call AI
-        current_time_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        insight = GeminiBusiness.generate_scheduled_insight(
-            schedule.action_description, 
-            history_list, 
-            memory_list, 
-            action_history, 
-            current_time=current_time_str
-        )
-
-        print(insight)
-        
-        title = insight.get('title', 'Scheduled Update')
-        short_desc = insight.get('short_description', 'I have a new personal insight for you.')
-        full_findings = insight.get('full_formatted_result', '')
-
-        # 4. Store in Memory
-        new_memory = Memory(
-            user_id=user_id,
-            content=full_findings,
-            source_type='scheduled_insight',
-            tags=f"scheduler_{schedule.id}",
-            timestamp=datetime.datetime.utcnow()
-        )
-        db.session.add(new_memory)
-        db.session.commit()
-        
-        # 5. Send Push Notification
-        # We pass memory_id in the data payload so the app can navigate to it
-        notification_data = {
-            "type": "scheduled_insight",
-            "memory_id": f"mem_{new_memory.id}",
-            "title": title,
-            "description": short_desc
-        }
-        
-        NotificationMethod.send_push_notification_to_a_user(
-            user_id=user_id,
-            title=title,
-            body=short_desc,
-            data=notification_data
-        )
-
-    except Exception as e:
-        print(f"Error processing schedule {schedule.id}: {e}")
-        traceback.print_exc()
+    with app.app_context():
+        try:
+            schedule = Schedule.query.get(schedule_id)
+            if not schedule or schedule.next_run_utc != due_at:
+                return
+            # A failure leaves nothing prepared, so the due-time run generates the insight itself
+            insight = _generate_insight(schedule, due_at, raise_errors=True)
+
+            # Keep it only if the schedule was not edited or sent in the meantime
+            Schedule.query.filter_by(id=schedule_id, next_run_utc=due_at).update({
+                'prepared_for_utc': due_at,
+                'prepared_payload': json.dumps(insight),
+            }, synchronize_session=False)
+            db.session.commit()
+            metrics.incr('scheduler.prepared')
+        except Exception as e:
+            db.session.rollback()
+            metrics.incr('scheduler.prepare_failed')
+            print(f"Error preparing schedule {schedule_id}: {e}")
+            traceback.print_exc()
+        finally:
+            with _preparing_lock:
+                _preparing.discard((schedule_id, due_at))
+
+def process_schedule(app, schedule_id, due_at, prepared=None):
+    """
+    Stores the insight for a due schedule in memory and sends the push notification.
+    Uses the insight prepared ahead of time (`prepared`, JSON) when there is one,
+    otherwise generates it now.
+    Runs on a schedule_pool worker; `due_at` is the (UTC) minute the run was scheduled for.
+    """
+    with app.app_context():
+        schedule = Schedule.query.get(schedule_id)
+        if not schedule:
+            return
+        try:
+            _run_schedule(schedule, due_at, prepared)
+        except Exception as e:
+            metrics.incr('scheduler.failed')
+            print(f"Error processing schedule {schedule_id}: {e}")
+            traceback.print_exc()
+
+def _generate_insight(schedule, due_at, raise_errors=False):
+    """
+    Calls the AI for a schedule's run at `due_at`.
+    Returns: {title, short_description, full_formatted_result}
+    With `raise_errors`, a failed call raises instead of returning the generic fallback.
+    """
+    snapshot = ContextBusiness.get_snapshot(schedule.user_id)
+
+    # The insight is written for the moment it will be delivered, not when it is generated
+    due_local = pytz.utc.localize(due_at).astimezone()
+    return GeminiBusiness.generate_scheduled_insight(
+        schedule.action_description,
+        snapshot['history'],
+        snapshot['memories'],
+        snapshot['actions'],
+        current_time=due_local.strftime("%Y-%m-%d %H:%M:%S"),
+        user_id=schedule.user_id,
+        timeout=SCHEDULER_JOB_TIMEOUT_SECONDS,
+        raise_errors=raise_errors
+    )
+
+def _run_schedule(schedule, due_at, prepared):
+    from app.helpers.notification_method import NotificationMethod
+    print(f"⏰ [SCHEDULER] Processing schedule: {schedule.title} for user {schedule.user_id}")
+    user_id = schedule.user_id
+
+    # 1. Insight: prepared ahead of time, or generated now
+    if prepared:
+        metrics.incr('scheduler.prepared_hit')
+        insight = json.loads(prepared)
+    else:
+        metrics.incr('scheduler.prepared_miss')
+        insight = _generate_insight(schedule, due_at)
+
+    title = insight.get('title', 'Scheduled Update')
+    short_desc = insight.get('short_description', 'I have a new personal insight for you.')
+    full_findings = insight.get('full_formatted_result', '')
+
+    # 2. Store in Memory
+    new_memory = Memory(
+        user_id=user_id,
+        content=full_findings,
+        source_type='scheduled_insight',
+        tags=f"scheduler_{schedule.id}",
+        timestamp=datetime.datetime.utcnow()
+    )
+    db.session.add(new_memory)
+    db.session.commit()
+
+    # 3. Send Push Notification
+    # We pass memory_id in the data payload so the app can navigate to it
+    notification_data = {
+        "type": "scheduled_insight",
+        "memory_id": f"mem_{new_memory.id}",
+        "title": title,
+        "description": short_desc
+    }
+
+    NotificationMethod.send_push_notification_to_a_user(
+        user_id=user_id,
+        title=title,
+        body=short_desc,
+        data=notification_data
+    )
+
+    # Time between the scheduled minute and the push going out
+    metrics.observe('scheduler.dispatch_lag_seconds', (datetime.datetime.utcnow() - due_at).total_seconds())
@@ -22,7 +22,7 @@ class SpeechToText(Resource):
         """Receives an audio file and transcribes it."""
         args = upload_parser.parse_args()
         audio_file = args['audio_file']
-        return GeminiBusiness.speech_to_text(audio_file)
+        return GeminiBusiness.speech_to_text(audio_file, user_id=kwargs.get('user_id'))
 
 analyze_parser = ns.parser()
 analyze_parser.add_argument('text', type=str, required=True, location='json', help='The text content typed by the user')
@@ -2,6 +2,7 @@ from flask import request
 from flask_restx import Resource
 from app.util.auth_dto import AuthDto
 from app.business.auth_business import AuthBusiness
+from app.helpers.auth_helpers import token_required
 
 ns = AuthDto.api
 
@@ -24,3 +25,16 @@ class Login(Resource):
         """
         data = request.get_json()
         return AuthBusiness.login_user(data=data)
+
+@ns.route('/logout')
+class Logout(Resource):
+    @ns.doc(security="apikey")
+    @token_required
+    def post(self, *args, **kwargs):
+        """
+        Log out: the current token is blacklisted and stops working immediately
+        """
+        auth_token = request.headers.get('Authorization')
+        if auth_token.startswith("Bearer "):
+            auth_token = auth_token[7:]
+        return AuthBusiness.logout_user(auth_token)
@@ -1,9 +1,12 @@
-from flask import request
+from flask import request, current_app
 from flask_restx import Resource
 from app.util.insights_dto import InsightsDto
 from app.helpers.auth_helpers import token_required
+from app.helpers.insight_helpers import overlay_pending_stats
+from app.helpers.metrics import metrics
 from app.models.insights import UserInsight, UserActivityHistory
 import datetime
+import os
 from app import db
 
 ns = InsightsDto.api
@@ -27,6 +30,18 @@ class InsightsStats(Resource):
             db.session.commit()
             # We continue with the newly created insight object and empty/default data
 
+        # Fetch last 7 days of activity history
+        today = datetime.date.today()
+        seven_days_ago = today - datetime.timedelta(days=6)
+        history_records = UserActivityHistory.query.filter(
+            UserActivityHistory.user_id == user_id,
+            UserActivityHistory.date >= seven_days_ago
+        ).order_by(UserActivityHistory.date.asc()).all()
+        history_map = {record.date: record.time_saved_minutes for record in history_records}
+
+        # Include counters still waiting in the write-behind buffer
+        overlay_pending_stats(user_id, insight, history_map)
+
         # Calculate interaction mode data percentages
         total_interactions = insight.vision_count + insight.voice_count + insight.text_count
         if total_interactions > 0:
@@ -36,16 +51,7 @@ class InsightsStats(Resource):
         else:
             vision_pct, voice_pct, text_pct = 0, 0, 0
 
-        # Fetch last 7 days of activity history
-        today = datetime.date.today()
-        seven_days_ago = today - datetime.timedelta(days=6)
-        history_records = UserActivityHistory.query.filter(
-            UserActivityHistory.user_id == user_id,
-            UserActivityHistory.date >= seven_days_ago
-        ).order_by(UserActivityHistory.date.asc()).all()
-
         # Map history to activityData (x=0 to 6)
-        history_map = {record.date: record.time_saved_minutes for record in history_records}
         activity_data = []
         for i in range(7):
             date = seven_days_ago + datetime.timedelta(days=i)
@@ -83,3 +89,23 @@ class InsightsStats(Resource):
                 ]
             }
         }, 200
+
+
+@ns.route('/metrics')
+class ProcessMetrics(Resource):
+    @ns.doc('Get server metrics')
+    @ns.doc(security="apikey")
+    @token_required
+    def get(self, current_user, *args, **kwargs):
+        """
+        Returns the counters and timings of the process serving this request
+        (worker processes log theirs instead, see METRICS_LOG_MINUTES)
+        """
+        return {
+            'status': 1,
+            'data': {
+                'role': current_app.config.get('ROLE'),
+                'pid': os.getpid(),
+                **metrics.snapshot()
+            }
+        }, 200
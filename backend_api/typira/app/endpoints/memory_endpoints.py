@@ -4,6 +4,7 @@ from ..util.memory_dto import MemoryDto
 from ..models.context import Memory, TypingHistory, UserAction
 from ..helpers.time_helpers import get_time_ago
 from ..helpers.auth_helpers import token_required
+from ..business.context_business import ContextBusiness
 from .. import db
 
 api = MemoryDto.api
@@ -183,6 +184,8 @@ class MemoryPurge(Resource):
             UserAction.query.filter_by(user_id=current_user.id).delete()
             
             db.session.commit()
+            # Bulk deletes bypass the ORM events, so drop the cached prompt context explicitly
+            ContextBusiness.invalidate(current_user.id)
             return {'status': 1, 'message': 'AI memory cleared successfully.'}, 200
         except Exception as e:
             db.session.rollback()
@@ -4,10 +4,16 @@ from app.util.scheduler_dto import SchedulerDto
 from app.models.scheduler import Schedule
 from app import db
 from app.helpers.auth_helpers import token_required
+from app.business.scheduler_business import compute_next_run_utc
+import datetime
 
 ns = SchedulerDto.api
 _schedule = SchedulerDto.schedule
 
+def _current_minute():
+    # A schedule set for the current minute still runs on the next dispatcher tick
+    return datetime.datetime.utcnow().replace(second=0, microsecond=0)
+
 @ns.route('/')
 class SchedulerList(Resource):
     @ns.doc('list_of_schedules')
@@ -34,6 +40,7 @@ class SchedulerList(Resource):
             time=data.get('time'),
             is_repeat=data.get('is_repeat', False)
         )
+        new_schedule.next_run_utc = compute_next_run_utc(new_schedule, _current_minute())
         db.session.add(new_schedule)
         db.session.commit()
         return {
@@ -73,6 +80,10 @@ class Scheduler(Resource):
         schedule.date_or_repeat = data.get('date_or_repeat', schedule.date_or_repeat)
         schedule.time = data.get('time', schedule.time)
         schedule.is_repeat = data.get('is_repeat', schedule.is_repeat)
+        schedule.next_run_utc = compute_next_run_utc(schedule, _current_minute())
+        # Any insight prepared for the old settings is stale
+        schedule.prepared_for_utc = None
+        schedule.prepared_payload = None
         
         db.session.commit()
         return {"status": "success", "message": "Schedule updated successfully"}
@@ -0,0 +1,157 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+from app.helpers.image_processing import media_pool
+from app.helpers.metrics import metrics
+from config import UPLOAD_RETENTION_ENABLED, UPLOAD_RETENTION_DIR, UPLOAD_RETENTION_MAX_MB, \
+    UPLOAD_RETENTION_MAX_AGE_HOURS
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class ArtifactStore:
+    """
+    Content-addressed file store for retained uploads.
+
+    Files live at `<root>/<sha256[:2]>/<sha256><extension>`, so identical uploads are
+    stored once and concurrent writers never collide. Eviction drops files older than
+    `max_age_seconds`, then the least recently stored ones until the total fits in
+    `max_bytes` (storing existing content again refreshes its mtime).
+
+    Everything here is blocking file I/O: call `put` from a worker thread, never a
+    greenthread. Sweeps triggered by `put` run in the background on `pool` (inline
+    when there is none), one at a time.
+    """
+
+    def __init__(self, root, max_bytes, max_age_seconds, sweep_interval=60, pool=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.sweep_interval = sweep_interval
+        self.pool = pool
+        self._lock = threading.Lock()
+        self._total = None
+        self._next_sweep = 0
+        self._sweep_queued = False
+
+    def put(self, source, extension=""):
+        """
+        Stores `source` (bytes or a binary file object, read from its current
+        position in chunks) and returns (digest, path).
+        """
+        os.makedirs(self.root, exist_ok=True)
+        sha = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".incoming-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for chunk in _chunks(source):
+                    sha.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            digest = sha.hexdigest()
+            path = self.path(digest, extension)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.exists(path):
+                os.utime(path)
+                os.remove(tmp_path)
+                metrics.incr("artifacts.deduplicated")
+                size = 0
+            else:
+                os.replace(tmp_path, path)
+                metrics.incr("artifacts.stored")
+                metrics.observe("artifacts.bytes", size)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            if self._total is not None:
+                self._total += size
+            due = self._total is None or self._total > self.max_bytes or time.time() >= self._next_sweep
+        if due:
+            self._request_sweep()
+        return digest, path
+
+    def path(self, digest, extension=""):
+        return os.path.join(self.root, digest[:2], digest + extension)
+
+    def _request_sweep(self):
+        if self.pool is None:
+            self.evict()
+            return
+        with self._lock:
+            if self._sweep_queued:
+                return
+            self._sweep_queued = True
+        self.pool.submit(self._background_sweep, key="artifact-sweep")
+
+    def _background_sweep(self):
+        try:
+            self.evict()
+        except Exception as e:
+            print(f"⚠️ Artifact sweep of {self.root} failed: {e}")
+        finally:
+            with self._lock:
+                self._sweep_queued = False
+
+    def evict(self):
+        """Applies the age and size limits. Returns the number of files deleted."""
+        with self._lock:
+            self._next_sweep = time.time() + self.sweep_interval
+            files = []
+            for directory, _, names in os.walk(self.root):
+                for name in names:
+                    if name.startswith(".incoming-"):
+                        continue
+                    path = os.path.join(directory, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+
+            files.sort()
+            cutoff = time.time() - self.max_age_seconds
+            total = sum(size for _, size, _ in files)
+            deleted = 0
+            for mtime, size, path in files:
+                if mtime >= cutoff and total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                deleted += 1
+            self._total = total
+
+        if deleted:
+            metrics.incr("artifacts.evicted", deleted)
+        return deleted
+
+
+def _chunks(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        view = memoryview(source)
+        for start in range(0, len(view), CHUNK_SIZE):
+            yield view[start:start + CHUNK_SIZE]
+        return
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+# None unless UPLOAD_RETENTION_ENABLED is set
+upload_store = ArtifactStore(
+    UPLOAD_RETENTION_DIR,
+    max_bytes=UPLOAD_RETENTION_MAX_MB * 1024 * 1024,
+    max_age_seconds=UPLOAD_RETENTION_MAX_AGE_HOURS * 3600,
+    pool=media_pool
+) if UPLOAD_RETENTION_ENABLED else None
@@ -0,0 +1,153 @@
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from config import AUTH_CACHE_TTL_SECONDS, AUTH_CACHE_MAX_TOKENS, AUTH_BLACKLIST_SYNC_SECONDS, AUTH_BLOOM_CAPACITY
+
+
+def token_digest(auth_token):
+    """Fixed-length key for a JWT (hex SHA-256)."""
+    return hashlib.sha256(str(auth_token).encode('utf-8')).hexdigest()
+
+
+class BloomFilter:
+    """
+    Bloom filter over hex SHA-256 digests: no false negatives, ~`error_rate` false positives.
+    The digest is already uniformly distributed, so its 4-byte slices serve as the k hashes.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, min(16, round(self.size / capacity * math.log(2))))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, digest):
+        raw = bytes.fromhex(digest)
+        for i in range(self.hash_count):
+            yield int.from_bytes(raw[(i * 4) % 32:(i * 4) % 32 + 4], 'big') * (i + 1) % self.size
+
+    def add(self, digest):
+        for position in self._positions(digest):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, digest):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(digest))
+
+
+class AuthCache:
+    """
+    Per-process auth shortcuts used by User.decode_auth_token:
+
+    - verified tokens: digest -> user_id, kept AUTH_CACHE_TTL_SECONDS (never past the JWT's own exp)
+    - blacklist Bloom filter: tokens not in it are known not to be blacklisted without a DB lookup;
+      hits are confirmed against BlacklistToken.
+
+    `revoke` (logout) takes effect at once in this process. Other processes pick up new
+    BlacklistToken rows within AUTH_BLACKLIST_SYNC_SECONDS and drop them from their cache,
+    so across processes a logged-out token can keep working for up to that long.
+    AUTH_BLACKLIST_SYNC_SECONDS=0 makes logout immediate everywhere at the cost of one
+    indexed `id > last_id` query per authenticated request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._verified = OrderedDict()
+        self._bloom = BloomFilter(AUTH_BLOOM_CAPACITY)
+        self._synced_id = 0
+        self._next_sync = 0
+
+    def get(self, digest):
+        """Cached user_id and exp for a verified token, or None."""
+        self._sync_blacklist()
+        now = time.time()
+        with self._lock:
+            entry = self._verified.get(digest)
+            if not entry:
+                return None
+            expires_at, user_id, exp = entry
+            if expires_at <= now:
+                del self._verified[digest]
+                return None
+            self._verified.move_to_end(digest)
+            return user_id, exp
+
+    def put(self, digest, user_id, exp):
+        expires_at = min(time.time() + AUTH_CACHE_TTL_SECONDS, exp)
+        with self._lock:
+            self._verified[digest] = (expires_at, user_id, exp)
+            self._verified.move_to_end(digest)
+            while len(self._verified) > AUTH_CACHE_MAX_TOKENS:
+                self._verified.popitem(last=False)
+
+    def is_blacklisted(self, auth_token, digest):
+        from app.models.blacklisted_tokens import BlacklistToken
+
+        self._sync_blacklist()
+        with self._lock:
+            maybe = digest in self._bloom
+        return maybe and BlacklistToken.check_blacklist(auth_token)
+
+    def revoke(self, digest):
+        """Forgets a verified token and marks it blacklisted (call after saving the BlacklistToken)."""
+        with self._lock:
+            self._verified.pop(digest, None)
+            if self._bloom.count < self._bloom.capacity:
+                self._bloom.add(digest)
+                return
+        # Full: the row is already committed, so the rebuilt filter includes it
+        self._rebuild()
+
+    def _sync_blacklist(self):
+        """Pulls BlacklistToken rows added since the last sync (all of them the first time)."""
+        if time.time() < self._next_sync:
+            return
+        from app.models.blacklisted_tokens import BlacklistToken
+
+        with self._lock:
+            if time.time() < self._next_sync:
+                return
+            self._next_sync = time.time() + AUTH_BLACKLIST_SYNC_SECONDS
+            last_id = self._synced_id
+
+        rows = BlacklistToken.query.with_entities(BlacklistToken.id, BlacklistToken.token_digest).filter(
+            BlacklistToken.id > last_id
+        ).order_by(BlacklistToken.id.asc()).all()
+        if not rows:
+            return
+
+        digests = [digest for _, digest in rows if digest]
+        with self._lock:
+            for digest in digests:
+                self._verified.pop(digest, None)
+            if self._bloom.count + len(digests) <= self._bloom.capacity:
+                for digest in digests:
+                    self._bloom.add(digest)
+                self._synced_id = max(self._synced_id, rows[-1][0])
+                return
+        self._rebuild()
+
+    def _rebuild(self):
+        """
+        Replaces the filter with one sized for every BlacklistToken row (at least twice
+        the current count) and loads all of them, so nothing added earlier is lost.
+        """
+        from app.models.blacklisted_tokens import BlacklistToken
+
+        # Held across the query so a concurrent revoke cannot land in the filter being replaced
+        with self._lock:
+            rows = BlacklistToken.query.with_entities(BlacklistToken.id, BlacklistToken.token_digest).all()
+            digests = [digest for _, digest in rows if digest]
+            bloom = BloomFilter(max(AUTH_BLOOM_CAPACITY, self._bloom.capacity, 2 * len(digests)))
+            for digest in digests:
+                bloom.add(digest)
+            self._bloom = bloom
+            self._synced_id = max((row_id for row_id, _ in rows), default=0)
+            self._next_sync = time.time() + AUTH_BLACKLIST_SYNC_SECONDS
+
+
+auth_cache = AuthCache()
@@ -1,5 +1,6 @@
 from functools import wraps
 from flask import request
+from app import db
 from app.models.users import User
 
 def token_required(f):
@@ -13,18 +14,15 @@ def token_required(f):
             auth_token = auth_header
             if auth_token.startswith("Bearer "):
                 auth_token = auth_token[7:]
-
-            print(auth_token)
         except IndexError:
             return {'status': 0, 'message': 'Bearer token malformed'}, 401
 
         decoded_token = User.decode_auth_token(auth_token)
-        print(decoded_token)
         if decoded_token['status'] == 0:
             return decoded_token, 401
 
         user_id = decoded_token['user_id']
-        current_user = User.query.filter_by(id=user_id).first()
+        current_user = db.session.get(User, user_id)
         if not current_user:
             return {'status': 0, 'message': 'User not found'}, 404
 
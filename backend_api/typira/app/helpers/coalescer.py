@@ -0,0 +1,36 @@
+import itertools
+import threading
+
+
+class LatestWins:
+    """
+    Latest-wins bookkeeping for bursts of equivalent requests.
+    Each request `claim`s a token for its key; any newer claim on the same key
+    supersedes it, and the older request checks `is_current` to drop its work.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latest = {}
+        self._tokens = itertools.count(1)
+
+    def claim(self, key) -> int:
+        with self._lock:
+            token = next(self._tokens)
+            self._latest[key] = token
+            return token
+
+    def is_current(self, key, token) -> bool:
+        return self._latest.get(key) == token
+
+    def release(self, key, token):
+        """Forgets the key once its latest request has finished."""
+        with self._lock:
+            if self._latest.get(key) == token:
+                del self._latest[key]
+
+    def forget(self, predicate):
+        """Drops every key matching `predicate` (e.g. all keys of a disconnected sid)."""
+        with self._lock:
+            for key in [k for k in self._latest if predicate(k)]:
+                del self._latest[key]
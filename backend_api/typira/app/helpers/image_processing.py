@@ -0,0 +1,79 @@
+import hashlib
+import io
+import time
+
+from PIL import Image, ImageOps
+
+from app.helpers.metrics import metrics
+from app.helpers.worker_pool import FairWorkerPool
+from config import IMAGE_MAX_DIMENSION, IMAGE_JPEG_QUALITY, MEDIA_POOL_SIZE
+
+# Decoding and resizing are CPU-bound; keep them off the eventlet hub
+media_pool = FairWorkerPool("media", max_workers=MEDIA_POOL_SIZE)
+
+
+def downscale_image(data, max_dimension=IMAGE_MAX_DIMENSION, quality=IMAGE_JPEG_QUALITY):
+    """
+    Decodes an image, applies its EXIF orientation, shrinks it so the long edge is at
+    most `max_dimension` and re-encodes it as JPEG at `quality`. No metadata (EXIF,
+    GPS, ICC) is carried over. Returns (JPEG bytes, image_fingerprint of the
+    downscaled pixels), all from a single decode.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        # JPEG only: let the decoder scale by 1/2, 1/4 or 1/8 instead of decoding every pixel
+        image.draft('RGB', (max_dimension, max_dimension))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        out = io.BytesIO()
+        image.save(out, format='JPEG', quality=quality, optimize=True)
+        return out.getvalue(), image_fingerprint(image)
+
+
+def image_fingerprint(image, hash_size=8):
+    """
+    (sha256, dhash) of a decoded image, as hex.
+    sha256 covers every pixel, so it only matches the same picture. The difference
+    hash reduces the image to (hash_size + 1) x hash_size greys, each bit saying whether
+    a pixel is brighter than its right neighbour: re-encoded or slightly recompressed
+    copies land within a few bits, but so can different screenshots of the same layout.
+    """
+    digest = hashlib.sha256(f"{image.mode}:{image.size}:".encode())
+    digest.update(image.tobytes())
+
+    pixels = list(image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS).getdata())
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return digest.hexdigest(), format(bits, f'0{hash_size * hash_size // 4}x')
+
+
+def prepare_image(data, mime_type, user_id=None):
+    """
+    Preprocessing stage of the vision path: runs downscale_image on the media pool and
+    returns (data, mime_type, fingerprint) with the JPEG to send to the model. Images
+    Pillow cannot decode are passed through unchanged, with no fingerprint.
+    """
+    started = time.monotonic()
+    try:
+        processed, fingerprint = media_pool.run(downscale_image, data, key=user_id)
+    except Exception as e:
+        metrics.incr('image_preprocess.failed')
+        print(f"⚠️ Image preprocessing skipped ({mime_type}, {len(data)} bytes): {e}")
+        return data, mime_type, None
+
+    metrics.observe('image_preprocess.bytes_in', len(data))
+    metrics.observe('image_preprocess.bytes_out', len(processed))
+    metrics.observe('image_preprocess.seconds', time.monotonic() - started)
+    return processed, 'image/jpeg', fingerprint
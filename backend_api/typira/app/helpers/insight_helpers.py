@@ -1,8 +1,18 @@
 from app import db
 from app.models.insights import UserInsight, UserActivityHistory
+from app.helpers.write_behind import WriteBehindBuffer
+from sqlalchemy import func, inspect
+from config import INSIGHT_BUFFER_FLUSH_SECONDS, INSIGHT_BUFFER_MAX_PENDING
 import datetime
 
-def increment_user_stats(user_id, minutes=0, words=0, focus=None, 
+# interaction_mode -> UserInsight counter column
+MODE_COUNTERS = {
+    'vision': 'vision_count',
+    'voice': 'voice_count',
+    'text': 'text_count',
+}
+
+def increment_user_stats(user_id, minutes=0, words=0, focus=None,
                          mood=None, mood_emoji=None, mood_color=None,
                          stress=None, stress_conclusion=None, stress_emoji=None, stress_color=None,
                          energy=None, energy_conclusion=None, energy_emoji=None, energy_color=None,
@@ -11,85 +21,131 @@ def increment_user_stats(user_id, minutes=0, words=0, focus=None,
     """
     Increments time saved and words polished for a user.
     Updates full bio-digital metadata suite (mood, stress, energy, tone, sentiment, focus) if provided.
-    Creates the record if it doesn't exist.
+    The change is coalesced in insight_buffer and written within INSIGHT_BUFFER_FLUSH_SECONDS
+    (see write_user_stats); use overlay_pending_stats to read it back before then.
     """
     if not user_id:
         return
-        
-    insight = UserInsight.query.filter_by(user_id=user_id).first()
-    
-    if not insight:
-        insight = UserInsight(user_id=user_id)
-        db.session.add(insight)
-        db.session.commit()
-        db.session.flush()
-        
-    insight.time_saved_minutes = (insight.time_saved_minutes or 0) + minutes
-    insight.words_polished = (insight.words_polished or 0) + words
-    
-    # 1. Update Mood
-    if mood:
-        insight.current_mood = mood
-    if mood_emoji:
-        insight.mood_emoji = mood_emoji
-    if mood_color:
-        insight.mood_color = mood_color
-
-    # 2. Update Stress
-    if stress is not None:
-        insight.stress_level = stress
-    if stress_conclusion:
-        insight.stress_conclusion = stress_conclusion
-    if stress_emoji:
-        insight.stress_emoji = stress_emoji
-    if stress_color:
-        insight.stress_color = stress_color
-
-    # 3. Update Energy
-    if energy:
-        insight.energy_level = energy
-    if energy_conclusion:
-        insight.energy_conclusion = energy_conclusion
-    if energy_emoji:
-        insight.energy_emoji = energy_emoji
-    if energy_color:
-        insight.energy_color = energy_color
-
-    # 4. Update Tone
-    if tone:
-        insight.tone_profile = tone
-    if tone_conclusion:
-        insight.tone_conclusion = tone_conclusion
-    if tone_emoji:
-        insight.tone_emoji = tone_emoji
-    if tone_color:
-        insight.tone_color = tone_color
-
-    # 5. Update Focus & Sentiment
-    if focus is not None:
-        insight.focus_score = focus
-    if sentiment is not None:
-        insight.sentiment = sentiment
-        
-    # 6. Update Interaction Mode counts
-    if interaction_mode:
-        mode = interaction_mode.lower()
-        if mode == 'vision':
-            insight.vision_count = (insight.vision_count or 0) + 1
-        elif mode == 'voice':
-            insight.voice_count = (insight.voice_count or 0) + 1
-        elif mode == 'text':
-            insight.text_count = (insight.text_count or 0) + 1
-
-    # 7. Update Daily Activity History
-    if minutes > 0:
-        today = datetime.date.today()
-        history = UserActivityHistory.query.filter_by(user_id=user_id, date=today).first()
-        if not history:
-            history = UserActivityHistory(user_id=user_id, date=today, time_saved_minutes=minutes)
-            db.session.add(history)
-        else:
-            history.time_saved_minutes = (history.time_saved_minutes or 0) + minutes
-    
-    db.session.commit()
+
+    increments = {'time_saved_minutes': minutes, 'words_polished': words}
+    mode_column = MODE_COUNTERS.get(interaction_mode.lower()) if interaction_mode else None
+    if mode_column:
+        increments[mode_column] = 1
+
+    # Text metadata only overwrites when given; numeric scores also accept 0
+    assignments = {
+        'current_mood': mood, 'mood_emoji': mood_emoji, 'mood_color': mood_color,
+        'stress_conclusion': stress_conclusion, 'stress_emoji': stress_emoji, 'stress_color': stress_color,
+        'energy_level': energy, 'energy_conclusion': energy_conclusion,
+        'energy_emoji': energy_emoji, 'energy_color': energy_color,
+        'tone_profile': tone, 'tone_conclusion': tone_conclusion, 'tone_emoji': tone_emoji, 'tone_color': tone_color,
+    }
+    assignments = {column: value for column, value in assignments.items() if value}
+    for column, value in (('stress_level', stress), ('focus_score', focus), ('sentiment', sentiment)):
+        if value is not None:
+            assignments[column] = value
+    assignments['last_updated'] = datetime.datetime.utcnow()
+
+    insight_buffer.add(user_id, {
+        'increments': {column: amount for column, amount in increments.items() if amount},
+        'assignments': assignments,
+        'daily': {datetime.date.today(): minutes} if minutes > 0 else {},
+    })
     print(f"📊 Rich Bio-Insights updated for user {user_id}: +{minutes}m, +{words}w, Mood: {mood}, Stress: {stress}, Energy: {energy}, Tone: {tone}")
+
+def write_user_stats(user_id, delta):
+    """
+    Applies a coalesced stats delta with atomic upserts, in the caller's transaction.
+    """
+    upsert_counters(UserInsight, {'user_id': user_id}, delta['increments'], delta['assignments'])
+
+    # Daily Activity History
+    for date, minutes in delta['daily'].items():
+        upsert_counters(UserActivityHistory, {'user_id': user_id, 'date': date}, {'time_saved_minutes': minutes})
+
+def overlay_pending_stats(user_id, insight, history_map):
+    """
+    Read-your-writes for the stats endpoint: folds the user's unflushed deltas into
+    `insight` (detached from the session first, so nothing is written back) and
+    into `history_map` ({date: minutes}).
+    """
+    pending = insight_buffer.peek(user_id)
+    if not pending:
+        return
+    if insight in db.session:
+        if inspect(insight).expired_attributes:
+            db.session.refresh(insight)
+        db.session.expunge(insight)
+    for column, amount in pending['increments'].items():
+        setattr(insight, column, (getattr(insight, column) or 0) + amount)
+    for column, value in pending['assignments'].items():
+        setattr(insight, column, value)
+    for date, minutes in pending['daily'].items():
+        history_map[date] = history_map.get(date, 0) + minutes
+
+def upsert_counters(model, keys, increments, assignments=None):
+    """
+    Atomically adds `increments` to the counters of the row identified by `keys`
+    (a unique key of `model`) and sets `assignments`, inserting the row if needed.
+    One statement on MySQL (ON DUPLICATE KEY UPDATE), PostgreSQL and SQLite (ON CONFLICT).
+    """
+    table = model.__table__
+    assignments = assignments or {}
+    increments = {column: amount for column, amount in increments.items() if amount}
+    updates = {column: func.coalesce(table.c[column], 0) + amount for column, amount in increments.items()}
+    updates.update(assignments)
+    if not updates:
+        return
+
+    # Columns not given here fall back to their model defaults on insert
+    values = {**keys, **increments, **assignments}
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table).values(**values).on_duplicate_key_update(**updates)
+    elif dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values(**values).on_conflict_do_update(index_elements=list(keys), set_=updates)
+    else:
+        # Generic fallback: atomic UPDATE, INSERT only when the row is missing
+        criteria = [table.c[column] == value for column, value in keys.items()]
+        if db.session.execute(table.update().where(*criteria).values(**updates)).rowcount:
+            return
+        stmt = table.insert().values(**values)
+
+    db.session.execute(stmt)
+
+
+class InsightCounterBuffer(WriteBehindBuffer):
+    """
+    Coalesces per-user stats deltas so each flush issues one upsert per user
+    (plus one per touched day) instead of one per event on the hot user_insights row.
+    Counters are summed; metadata keeps the latest value.
+    """
+
+    def merge(self, pending, key, item):
+        current = pending.setdefault(key, {'increments': {}, 'assignments': {}, 'daily': {}})
+        for column, amount in item['increments'].items():
+            current['increments'][column] = current['increments'].get(column, 0) + amount
+        current['assignments'].update(item['assignments'])
+        for date, minutes in item['daily'].items():
+            current['daily'][date] = current['daily'].get(date, 0) + minutes
+
+    def combine(self, older, newer):
+        # A pending delta has the same shape as an item, so merging `newer` into `older` sums them
+        pending = {None: older}
+        self.merge(pending, None, newer)
+        return pending[None]
+
+    def write(self, batch):
+        for user_id, delta in batch.items():
+            write_user_stats(user_id, delta)
+        db.session.commit()
+
+
+insight_buffer = InsightCounterBuffer("insight_buffer", flush_interval=INSIGHT_BUFFER_FLUSH_SECONDS,
+                                      max_pending=INSIGHT_BUFFER_MAX_PENDING)
@@ -0,0 +1,94 @@
+import json
+
+
+class JsonArrayStreamParser:
+    """
+    Incremental parser for a streamed JSON object.
+    Feed it text chunks as they arrive; it returns every element of the top-level
+    array named `key` (e.g. "thoughts") as soon as that element is complete,
+    without waiting for the rest of the document.
+    """
+
+    def __init__(self, key: str = "thoughts"):
+        self.key = key
+        self._buf = ""
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._expect_key = False
+        self._last_key = None
+        self._in_target = False
+        self._element_start = None
+
+    def feed(self, chunk: str) -> list:
+        """Consumes a chunk and returns the elements completed by it."""
+        if not chunk:
+            return []
+        self._buf += chunk
+        completed = []
+
+        while self._pos < len(self._buf):
+            ch = self._buf[self._pos]
+            depth = len(self._stack)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if depth == 1 and self._expect_key:
+                        self._last_key = json.loads(self._buf[self._string_start:self._pos + 1])
+                        self._expect_key = False
+                    elif self._in_target and depth == 2:
+                        self._emit(self._pos + 1, completed)
+                self._pos += 1
+                continue
+
+            if self._in_target and depth == 2 and self._element_start is None and ch not in ' \t\r\n,]':
+                self._element_start = self._pos
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = self._pos
+            elif ch in '{[':
+                if depth == 1 and ch == '[' and self._last_key == self.key:
+                    self._in_target = True
+                self._stack.append(ch)
+                if ch == '{' and len(self._stack) == 1:
+                    self._expect_key = True
+            elif ch in '}]':
+                if self._in_target and depth == 2 and ch == ']':
+                    # Scalar element terminated by the end of the array
+                    self._emit(self._pos, completed)
+                    self._in_target = False
+                if self._stack:
+                    self._stack.pop()
+                if self._in_target and len(self._stack) == 2 and self._element_start is not None:
+                    # Nested object/array element just closed
+                    self._emit(self._pos + 1, completed)
+            elif ch == ',':
+                if depth == 1:
+                    self._expect_key = True
+                    self._last_key = None
+                elif self._in_target and depth == 2:
+                    self._emit(self._pos, completed)
+            self._pos += 1
+
+        return completed
+
+    def _emit(self, end: int, completed: list):
+        if self._element_start is None:
+            return
+        raw = self._buf[self._element_start:end].strip()
+        self._element_start = None
+        if raw:
+            completed.append(json.loads(raw))
+
+    @property
+    def text(self) -> str:
+        """The full text fed so far."""
+        return self._buf
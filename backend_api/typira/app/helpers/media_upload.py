@@ -0,0 +1,123 @@
+import threading
+import time
+import uuid
+
+from app.helpers.metrics import metrics
+from config import MEDIA_UPLOAD_MAX_BYTES, MEDIA_UPLOAD_CHUNK_BYTES, MEDIA_UPLOAD_TTL_SECONDS
+
+
+class UploadError(ValueError):
+    """Raised for a rejected begin/chunk/commit (unknown upload, over the cap, out-of-order chunk...)."""
+
+
+class _Upload:
+    __slots__ = ("user_id", "sid", "kind", "mime_type", "meta", "buffer", "received", "expires_at")
+
+    def __init__(self, user_id, sid, kind, mime_type, meta, size):
+        self.user_id = user_id
+        self.sid = sid
+        self.kind = kind
+        self.mime_type = mime_type
+        self.meta = meta
+        # Preallocated once; chunks are copied straight into place
+        self.buffer = bytearray(size)
+        self.received = 0
+        self.expires_at = time.monotonic() + MEDIA_UPLOAD_TTL_SECONDS
+
+
+class MediaUploads:
+    """
+    Reassembles binary media sent over Socket.IO in chunks.
+
+    `begin` reserves a buffer of the announced size. Together with the user's other
+    open uploads it must fit in MEDIA_UPLOAD_MAX_BYTES. Chunks are copied into place
+    in order. `commit` returns the finished upload with its content as a memoryview
+    over the buffer. Uploads left idle for MEDIA_UPLOAD_TTL_SECONDS are dropped.
+    """
+
+    def __init__(self, max_bytes=MEDIA_UPLOAD_MAX_BYTES, chunk_bytes=MEDIA_UPLOAD_CHUNK_BYTES):
+        self.max_bytes = max_bytes
+        self.chunk_bytes = chunk_bytes
+        self._lock = threading.Lock()
+        self._uploads = {}
+
+    def begin(self, user_id, sid, kind, size, mime_type, meta=None, upload_id=None):
+        """Opens an upload and returns its id."""
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError("size must be a positive number of bytes")
+        upload_id = str(upload_id or uuid.uuid4().hex)
+        with self._lock:
+            self._expire()
+            if (user_id, upload_id) in self._uploads:
+                raise UploadError("upload_id already in use")
+            reserved = sum(len(u.buffer) for u in self._uploads.values() if u.user_id == user_id)
+            if reserved + size > self.max_bytes:
+                metrics.incr('media_upload.rejected')
+                raise UploadError(f"upload exceeds the {self.max_bytes} byte limit")
+            self._uploads[(user_id, upload_id)] = _Upload(user_id, sid, kind, mime_type, meta or {}, size)
+        metrics.incr('media_upload.started')
+        return upload_id
+
+    def chunk(self, user_id, upload_id, data, offset=None):
+        """
+        Appends `data` to the upload. Chunks must arrive in order; `offset`, when
+        given, must match the bytes received so far. Returns that new total.
+        """
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            raise UploadError("chunk data must be binary")
+        if len(data) > self.chunk_bytes:
+            raise UploadError(f"chunks are limited to {self.chunk_bytes} bytes")
+        with self._lock:
+            upload = self._get(user_id, upload_id)
+            start = upload.received
+            if offset is not None and offset != start:
+                raise UploadError(f"expected offset {start}")
+            end = start + len(data)
+            if end > len(upload.buffer):
+                raise UploadError("chunk goes past the announced size")
+            upload.buffer[start:end] = data
+            upload.received = end
+            upload.expires_at = time.monotonic() + MEDIA_UPLOAD_TTL_SECONDS
+            return end
+
+    def commit(self, user_id, upload_id):
+        """Closes the upload and returns it; `upload.buffer` is a read-only memoryview."""
+        with self._lock:
+            upload = self._get(user_id, upload_id)
+            if upload.received != len(upload.buffer):
+                raise UploadError(f"incomplete upload: {upload.received}/{len(upload.buffer)} bytes")
+            del self._uploads[(user_id, str(upload_id))]
+        upload.buffer = memoryview(upload.buffer).toreadonly()
+        metrics.incr('media_upload.committed')
+        metrics.observe('media_upload.bytes', len(upload.buffer))
+        return upload
+
+    def abort(self, user_id, upload_id):
+        with self._lock:
+            self._uploads.pop((user_id, str(upload_id)), None)
+
+    def forget_sid(self, sid):
+        """Drops every upload opened by a disconnected socket."""
+        with self._lock:
+            for key in [k for k, u in self._uploads.items() if u.sid == sid]:
+                del self._uploads[key]
+
+    def _get(self, user_id, upload_id):
+        key = (user_id, str(upload_id))
+        upload = self._uploads.get(key)
+        if upload is not None and upload.expires_at <= time.monotonic():
+            del self._uploads[key]
+            metrics.incr('media_upload.expired')
+            upload = None
+        if upload is None:
+            raise UploadError("unknown or expired upload")
+        return upload
+
+    def _expire(self):
+        now = time.monotonic()
+        for key in [k for k, u in self._uploads.items() if u.expires_at <= now]:
+            del self._uploads[key]
+            metrics.incr('media_upload.expired')
+
+
+media_uploads = MediaUploads()
@@ -0,0 +1,47 @@
+import json
+import os
+import threading
+
+
+class Metrics:
+    """
+    Process-local counters and timing summaries.
+    Cheap enough to call from hot paths; read with `snapshot()`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._observations = {}
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, name, value):
+        """Records one sample (e.g. a latency in ms or a size in bytes)."""
+        with self._lock:
+            stats = self._observations.get(name)
+            if stats is None:
+                self._observations[name] = {"count": 1, "total": value, "min": value, "max": value, "last": value}
+                return
+            stats["count"] += 1
+            stats["total"] += value
+            stats["min"] = min(stats["min"], value)
+            stats["max"] = max(stats["max"], value)
+            stats["last"] = value
+
+    def snapshot(self):
+        with self._lock:
+            observations = {
+                name: dict(stats, avg=stats["total"] / stats["count"])
+                for name, stats in self._observations.items()
+            }
+            return {"counters": dict(self._counters), "observations": observations}
+
+    def log(self):
+        """Prints the snapshot as one JSON line (scheduled in worker processes, see METRICS_LOG_MINUTES)."""
+        print(f"📈 [METRICS] pid={os.getpid()} {json.dumps(self.snapshot(), sort_keys=True)}")
+
+
+metrics = Metrics()
@@ -1,8 +1,8 @@
 import firebase_admin
-from firebase_admin import credentials, messaging
+from firebase_admin import credentials
 import os
-from ..models.users import User
 from ..models.fcm_tokens import FCMTokens
+from .notification_queue import notification_queue
 from .. import db
 
 
@@ -23,40 +23,13 @@ class NotificationMethod:
     def send_push_to_all(tokens: list[str], title: str, body: str, data: dict = None):
         """
         Send push notification to multiple device tokens (Android + iOS).
+        Delivery is queued: batched with other pushes, retried on transient errors,
+        and dead tokens are pruned (see notification_queue).
         """
         if not tokens:
             return
 
-        # Ensure all data values are strings
-        if data:
-            data = {k: str(v) for k, v in data.items()}
-
-        notification = messaging.Notification(
-            title=title,
-            body=body,
-        )
-
-        message = messaging.MulticastMessage(
-            notification=notification,
-            tokens=tokens,
-            data=data,
-            apns=messaging.APNSConfig(
-                payload=messaging.APNSPayload(
-                    aps=messaging.Aps(
-                        sound='default',
-                        badge=1,
-                    )
-                )
-            ),
-            android=messaging.AndroidConfig(
-                notification=messaging.AndroidNotification(
-                    sound='default'
-                )
-            )
-        )
-
-        response = messaging.send_each_for_multicast(message)
-        print(f"Successfully sent {response.success_count} messages; {response.failure_count} failed.")
+        notification_queue.enqueue(tokens, title, body, data)
 
     @staticmethod
     def save_fcm_token(user_id, token):
@@ -90,22 +63,15 @@ class NotificationMethod:
         """
         Sends a push notification to a specific user using their fcm_tokens in the FCMTokens table.
         """
-        user_tokens = FCMTokens.query.filter_by(user_id=user_id).all()
-        if user_tokens:
-            tokens = [t.token for t in user_tokens if t.token]
-            if tokens:
-                NotificationMethod.send_push_to_all(tokens, title, body, data)
+        tokens = [token for (token,) in FCMTokens.query.with_entities(FCMTokens.token).filter_by(user_id=user_id) if token]
+        if tokens:
+            NotificationMethod.send_push_to_all(tokens, title, body, data)
 
     @staticmethod
-    def send_push_notification_to_all_users(title, body, data: dict = None):
+    def send_push_notification_to_all_users(title, body, data: dict = None, start_after_id=0, on_progress=None):
         """
         Sends a push notification to all users globally using the FCMTokens table.
+        Streams through the tokens in id order with a bounded number of chunks in flight;
+        returns the delivery report, whose `resume_after_id` resumes an interrupted run.
         """
-        all_tokens = [fcm_token.token for fcm_token in FCMTokens.query.all() if fcm_token.token]
-        if all_tokens:
-            # Multi-cast chunking (max 500 per call is handled by messaging.send_each_for_multicast usually, 
-            # but MultiCastMessage class itself has a tokens limit of 500)
-            for i in range(0, len(all_tokens), 500):
-                chunk = all_tokens[i:i + 500]
-                NotificationMethod.send_push_to_all(chunk, title, body, data)
-
+        return notification_queue.broadcast(title, body, data, start_after_id=start_after_id, on_progress=on_progress)
@@ -0,0 +1,302 @@
+import atexit
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from app.helpers.metrics import metrics
+from config import FCM_BATCH_SIZE, FCM_BATCH_LINGER_SECONDS, FCM_MAX_RETRIES, FCM_RETRY_BACKOFF_SECONDS, \
+    FCM_BROADCAST_CONCURRENCY
+
+# FirebaseError.code values worth another attempt
+RETRYABLE_ERROR_CODES = {'UNAVAILABLE', 'INTERNAL', 'RESOURCE_EXHAUSTED', 'DEADLINE_EXCEEDED', 'UNKNOWN'}
+
+
+def is_dead_token_error(error):
+    """True for errors meaning the token will never work again (app uninstalled, malformed token)."""
+    code = getattr(error, 'code', None)
+    if code == 'NOT_FOUND':
+        # messaging.UnregisteredError
+        return True
+    return code == 'INVALID_ARGUMENT' and 'registration token' in str(error).lower()
+
+
+def is_retryable_error(error):
+    return getattr(error, 'code', None) in RETRYABLE_ERROR_CODES
+
+
+def _stringify(data):
+    # FCM data payload values must be strings
+    if data:
+        return {k: str(v) for k, v in data.items()}
+    return data
+
+
+class _Push:
+    __slots__ = ("token", "message", "attempt")
+
+    def __init__(self, token, message):
+        self.token = token
+        self.message = message
+        self.attempt = 0
+
+
+class NotificationQueue:
+    """
+    Sends FCM pushes off the caller's thread.
+
+    - Pushes from every user are sent together, up to FCM_BATCH_SIZE (max 500)
+      messages per `send_each` call, after lingering FCM_BATCH_LINGER_SECONDS
+      so concurrent enqueues share a call.
+    - Transient failures are retried with exponential backoff, up to FCM_MAX_RETRIES times.
+    - Tokens FCM reports as unregistered or invalid are deleted from FCMTokens.
+
+    `messaging_api` defaults to firebase_admin.messaging; pass a fake with the same
+    Message/Notification/... constructors and `send_each` to run it locally.
+    """
+
+    def __init__(self, messaging_api=None, batch_size=FCM_BATCH_SIZE, linger=FCM_BATCH_LINGER_SECONDS,
+                 max_retries=FCM_MAX_RETRIES, backoff=FCM_RETRY_BACKOFF_SECONDS):
+        self._messaging = messaging_api
+        self.batch_size = min(batch_size, 500)
+        self.linger = linger
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.app = None
+        self._cond = threading.Condition()
+        self._ready = deque()
+        self._delayed = []
+        self._seq = itertools.count()
+        self._thread = None
+
+    @property
+    def messaging(self):
+        if self._messaging is None:
+            from firebase_admin import messaging
+            self._messaging = messaging
+        return self._messaging
+
+    def init_app(self, app, messaging_api=None):
+        self.app = app
+        if messaging_api is not None:
+            self._messaging = messaging_api
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="notification-queue", daemon=True)
+            self._thread.start()
+            atexit.register(self.drain)
+
+    def enqueue(self, tokens, title, body, data: dict = None):
+        """Queues the same notification for every token. Returns the number queued."""
+        data = _stringify(data)
+        pushes = [_Push(token, self.build_message(token, title, body, data)) for token in tokens if token]
+        if not pushes:
+            return 0
+        with self._cond:
+            self._ready.extend(pushes)
+            self._cond.notify()
+        metrics.incr('notifications.queued', len(pushes))
+        return len(pushes)
+
+    def build_message(self, token, title, body, data=None):
+        messaging = self.messaging
+        return messaging.Message(
+            token=token,
+            notification=messaging.Notification(
+                title=title,
+                body=body,
+            ),
+            data=data,
+            apns=messaging.APNSConfig(
+                payload=messaging.APNSPayload(
+                    aps=messaging.Aps(
+                        sound='default',
+                        badge=1,
+                    )
+                )
+            ),
+            android=messaging.AndroidConfig(
+                notification=messaging.AndroidNotification(
+                    sound='default'
+                )
+            )
+        )
+
+    def drain(self):
+        """Sends everything ready now (pending retries are not waited for)."""
+        while True:
+            batch = self._take_batch(block=False)
+            if not batch:
+                return
+            self.send_batch(batch)
+
+    def send_batch(self, batch):
+        """Sends one batch and sorts out the per-token results."""
+        try:
+            response = self.messaging.send_each([push.message for push in batch])
+        except Exception as e:
+            print(f"⚠️ FCM send_each failed for {len(batch)} messages: {e}")
+            self._retry(batch)
+            return
+
+        dead, retry, failed = self._classify(batch, response)
+        metrics.incr('notifications.sent', response.success_count)
+        metrics.incr('notifications.failed', failed)
+        print(f"Successfully sent {response.success_count} messages; {response.failure_count} failed "
+              f"({len(dead)} dead tokens, {len(retry)} to retry).")
+        if retry:
+            self._retry(retry)
+        if dead:
+            self._prune(dead)
+
+    def broadcast(self, title, body, data: dict = None, start_after_id=0, on_progress=None):
+        """
+        Sends a notification to every FCMTokens row, synchronously.
+
+        Tokens are read page by page in id order (keyset pagination, so memory stays
+        flat), and up to FCM_BROADCAST_CONCURRENCY pages of `batch_size` are in flight
+        at once. After each page completes, `on_progress(report, chunk)` is called.
+        `report['resume_after_id']` is the last token id known to be fully processed:
+        pass it back as `start_after_id` to resume an interrupted broadcast.
+        """
+        from app.models.fcm_tokens import FCMTokens
+
+        data = _stringify(data)
+        report = {'sent': 0, 'failed': 0, 'pruned': 0, 'chunks': 0, 'failed_chunks': 0,
+                  'resume_after_id': start_after_id}
+        in_flight = deque()
+        last_id = start_after_id
+
+        def collect():
+            chunk_last_id, future = in_flight.popleft()
+            chunk = future.result()
+            if chunk['dead']:
+                self._prune(chunk['dead'])
+            report['sent'] += chunk['sent']
+            report['failed'] += chunk['failed']
+            report['pruned'] += len(chunk['dead'])
+            report['chunks'] += 1
+            report['failed_chunks'] += 1 if chunk['failed'] else 0
+            # Pages are collected in order, so everything up to here is done
+            report['resume_after_id'] = chunk_last_id
+            if on_progress:
+                on_progress(dict(report), chunk)
+
+        with ThreadPoolExecutor(max_workers=FCM_BROADCAST_CONCURRENCY, thread_name_prefix="fcm-broadcast") as executor:
+            while True:
+                page = FCMTokens.query.with_entities(FCMTokens.id, FCMTokens.token).filter(
+                    FCMTokens.id > last_id,
+                    FCMTokens.token != None
+                ).order_by(FCMTokens.id.asc()).limit(self.batch_size).all()
+                if not page:
+                    break
+                last_id = page[-1].id
+                pushes = [_Push(token, self.build_message(token, title, body, data)) for _, token in page if token]
+                in_flight.append((last_id, executor.submit(self._send_now, pushes)))
+                while len(in_flight) >= FCM_BROADCAST_CONCURRENCY:
+                    collect()
+            while in_flight:
+                collect()
+
+        print(f"📣 Broadcast done: {report['sent']} sent, {report['failed']} failed, "
+              f"{report['pruned']} dead tokens pruned, {report['failed_chunks']}/{report['chunks']} chunks with failures.")
+        return report
+
+    def _send_now(self, pushes):
+        """Sends one chunk, retrying transient failures in place. Returns per-chunk counts."""
+        sent, failed, dead = 0, 0, []
+        attempt = 0
+        while pushes:
+            try:
+                response = self.messaging.send_each([push.message for push in pushes])
+            except Exception as e:
+                print(f"⚠️ FCM send_each failed for {len(pushes)} messages: {e}")
+                response, retry = None, pushes
+            else:
+                chunk_dead, retry, chunk_failed = self._classify(pushes, response)
+                sent += response.success_count
+                failed += chunk_failed
+                dead.extend(chunk_dead)
+
+            attempt += 1
+            if retry and attempt > self.max_retries:
+                failed += len(retry)
+                break
+            if retry:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            pushes = retry
+        return {'sent': sent, 'failed': failed, 'dead': dead}
+
+    @staticmethod
+    def _classify(batch, response):
+        """Splits a BatchResponse into (dead tokens, pushes to retry, number of permanent failures)."""
+        dead, retry, failed = [], [], 0
+        for push, result in zip(batch, response.responses):
+            if result.success:
+                continue
+            if is_dead_token_error(result.exception):
+                dead.append(push.token)
+            elif is_retryable_error(result.exception):
+                retry.append(push)
+            else:
+                failed += 1
+        return dead, retry, failed
+
+    def _retry(self, pushes):
+        now = time.monotonic()
+        with self._cond:
+            for push in pushes:
+                push.attempt += 1
+                if push.attempt > self.max_retries:
+                    metrics.incr('notifications.failed')
+                    continue
+                delay = self.backoff * 2 ** (push.attempt - 1)
+                heapq.heappush(self._delayed, (now + delay, next(self._seq), push))
+            self._cond.notify()
+
+    def _prune(self, tokens):
+        from app import db
+        from app.models.fcm_tokens import FCMTokens
+
+        try:
+            with self.app.app_context():
+                FCMTokens.query.filter(FCMTokens.token.in_(tokens)).delete(synchronize_session=False)
+                db.session.commit()
+            metrics.incr('notifications.pruned_tokens', len(tokens))
+        except Exception as e:
+            print(f"⚠️ Failed to prune {len(tokens)} dead FCM tokens: {e}")
+
+    def _promote_delayed(self):
+        now = time.monotonic()
+        while self._delayed and self._delayed[0][0] <= now:
+            self._ready.append(heapq.heappop(self._delayed)[2])
+
+    def _take_batch(self, block=True):
+        with self._cond:
+            self._promote_delayed()
+            if not self._ready and not block:
+                return []
+            while not self._ready:
+                timeout = self._delayed[0][0] - time.monotonic() if self._delayed else None
+                self._cond.wait(timeout)
+                self._promote_delayed()
+
+            # Give concurrent enqueues a moment to join this call
+            if block and self.linger and len(self._ready) < self.batch_size:
+                self._cond.wait(self.linger)
+                self._promote_delayed()
+
+            count = min(self.batch_size, len(self._ready))
+            return [self._ready.popleft() for _ in range(count)]
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            try:
+                self.send_batch(batch)
+            except Exception as e:
+                print(f"⚠️ Notification batch of {len(batch)} dropped: {e}")
+
+
+notification_queue = NotificationQueue()
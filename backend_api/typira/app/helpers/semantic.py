@@ -20,6 +20,13 @@ STOP_WORDS = {
     'wasn', "wasn't", 'weren', "weren't", 'won', "won't", 'wouldn', "wouldn't"
 }
 
+# Near-duplicate lookup: the 64-bit SimHash is split into 4 blocks of 16 bits.
+# By the pigeonhole principle, two hashes within Hamming distance 3 share at least
+# one block exactly, so an exact match on any indexed block finds every candidate.
+SIMHASH_BAND_COUNT = 4
+SIMHASH_BAND_BITS = 16
+NEAR_DUPLICATE_MAX_DISTANCE = SIMHASH_BAND_COUNT - 1
+
 def get_semantic_hash(sentence):
     """
     Returns a 64-bit SimHash (as hex) of the normalized intent of the sentence.
@@ -47,3 +54,19 @@ def get_semantic_hash(sentence):
     
     # Return as 16-character hex string for stable DB storage
     return format(hash_obj.value, '016x')
+
+def get_hash_bands(semantic_hash):
+    """
+    Splits a hex SimHash into SIMHASH_BAND_COUNT integer blocks (lowest bits first).
+    """
+    if not semantic_hash:
+        return [None] * SIMHASH_BAND_COUNT
+    value = int(semantic_hash, 16)
+    mask = (1 << SIMHASH_BAND_BITS) - 1
+    return [(value >> (i * SIMHASH_BAND_BITS)) & mask for i in range(SIMHASH_BAND_COUNT)]
+
+def hamming_distance(hash_a, hash_b):
+    """
+    Number of differing bits between two hex SimHashes.
+    """
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count('1')
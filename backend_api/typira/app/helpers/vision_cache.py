@@ -0,0 +1,63 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from app.helpers.semantic import hamming_distance
+from config import VISION_CACHE_TTL_SECONDS, VISION_CACHE_MAX_DISTANCE, VISION_CACHE_PER_USER, VISION_CACHE_MAX_USERS
+
+
+class VisionCache:
+    """
+    Recent image analyses per user, keyed by image fingerprint (sha256, dhash),
+    see image_fingerprint. An image sent again within VISION_CACHE_TTL_SECONDS gets
+    its analysis back when the pixels are identical (same sha256). With
+    VISION_CACHE_MAX_DISTANCE above 0, an image whose dhash is within that many bits
+    of a cached one also matches; that can replay the analysis of another screenshot
+    of the same app layout, so it is off by default. Users are LRU-evicted beyond
+    VISION_CACHE_MAX_USERS, each keeping VISION_CACHE_PER_USER entries.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+
+    def get(self, user_id, fingerprint):
+        """A copy of the matching cached analysis, or None."""
+        digest, image_hash = fingerprint
+        now = time.monotonic()
+        with self._lock:
+            entries = self._users.get(user_id)
+            if not entries:
+                return None
+            best = None
+            for cached_digest, (expires_at, cached_hash, analysis) in list(entries.items()):
+                if expires_at <= now:
+                    del entries[cached_digest]
+                    continue
+                if cached_digest == digest:
+                    best = (-1, analysis)
+                    break
+                if VISION_CACHE_MAX_DISTANCE > 0:
+                    distance = hamming_distance(cached_hash, image_hash)
+                    if distance <= VISION_CACHE_MAX_DISTANCE and (best is None or distance < best[0]):
+                        best = (distance, analysis)
+            if best is None:
+                return None
+            self._users.move_to_end(user_id)
+            return copy.deepcopy(best[1])
+
+    def put(self, user_id, fingerprint, analysis):
+        digest, image_hash = fingerprint
+        with self._lock:
+            entries = self._users.setdefault(user_id, OrderedDict())
+            entries[digest] = (time.monotonic() + VISION_CACHE_TTL_SECONDS, image_hash, copy.deepcopy(analysis))
+            entries.move_to_end(digest)
+            while len(entries) > VISION_CACHE_PER_USER:
+                entries.popitem(last=False)
+            self._users.move_to_end(user_id)
+            while len(self._users) > VISION_CACHE_MAX_USERS:
+                self._users.popitem(last=False)
+
+
+vision_cache = VisionCache()
@@ -0,0 +1,187 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from concurrent.futures import wait as futures_wait
+
+import eventlet
+import greenlet
+
+
+class PoolTimeoutError(Exception):
+    """Raised when a pooled call does not finish within its timeout."""
+
+
+class PoolCancelledError(Exception):
+    """Raised when the caller gave up on a pooled call (its `should_cancel` returned True)."""
+
+
+def in_green_thread():
+    """
+    True when running inside an eventlet greenthread (i.e. a socket handler),
+    False for plain OS threads such as the APScheduler workers.
+    """
+    return greenlet.getcurrent().parent is not None
+
+
+class _Job:
+    __slots__ = ("fn", "args", "kwargs", "future", "key")
+
+    def __init__(self, fn, args, kwargs, key):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.key = key
+
+
+class FairWorkerPool:
+    """
+    Bounded pool of native OS threads for blocking calls (Gemini HTTP, bcrypt, Pillow).
+
+    - At most `max_workers` calls run at once; the rest wait in per-key queues.
+    - Queues are served round-robin so one busy user cannot starve the others,
+      and a single key never holds more than `per_key_limit` workers.
+    - `run()` waits cooperatively: greenthreads yield to the eventlet hub while
+      the native thread works, so other sockets keep being served.
+    """
+
+    def __init__(self, name, max_workers=8, per_key_limit=None, default_timeout=None):
+        self.name = name
+        self.max_workers = max_workers
+        self.per_key_limit = per_key_limit
+        self.default_timeout = default_timeout
+        self._cond = threading.Condition()
+        self._queues = OrderedDict()
+        self._active = {}
+        self._threads = []
+        self._anonymous = itertools.count()
+
+    def configure(self, max_workers=None, per_key_limit=None, default_timeout=None):
+        """Adjusts pool limits. Extra workers are started lazily on the next submit."""
+        with self._cond:
+            if max_workers is not None:
+                self.max_workers = max_workers
+            if per_key_limit is not None:
+                self.per_key_limit = per_key_limit
+            if default_timeout is not None:
+                self.default_timeout = default_timeout
+            self._cond.notify_all()
+
+    def submit(self, fn, *args, key=None, **kwargs) -> Future:
+        """Queues `fn(*args, **kwargs)` under the fairness `key` and returns a Future."""
+        if key is None:
+            key = f"_anon_{next(self._anonymous)}"
+        job = _Job(fn, args, kwargs, key)
+        with self._cond:
+            self._queues.setdefault(key, deque()).append(job)
+            self._ensure_workers()
+            self._cond.notify()
+        return job.future
+
+    def run(self, fn, *args, key=None, timeout=None, on_progress=None, should_cancel=None, **kwargs):
+        """
+        Runs `fn` on the pool and waits for its result.
+        `timeout` bounds how long the caller waits; a call that is already running is
+        not interrupted and keeps its worker until it returns.
+        If `on_progress` is given, `fn` receives a `progress` callable; every value it
+        publishes is handed to `on_progress` in the *caller's* thread, so socket emits
+        stay on the hub.
+        If `should_cancel` returns True while waiting, a queued call is dropped before
+        it starts (a running one is abandoned) and PoolCancelledError is raised.
+        """
+        timeout = timeout if timeout is not None else self.default_timeout
+        outbox = deque() if on_progress else None
+        if outbox is not None:
+            kwargs["progress"] = outbox.append
+
+        future = self.submit(fn, *args, key=key, **kwargs)
+        try:
+            self.wait(future, timeout=timeout, outbox=outbox, on_progress=on_progress, should_cancel=should_cancel)
+        except (PoolTimeoutError, PoolCancelledError):
+            future.cancel()
+            raise
+        self._drain(outbox, on_progress)
+        return future.result()
+
+    def wait(self, future, timeout=None, outbox=None, on_progress=None, should_cancel=None):
+        deadline = time.monotonic() + timeout if timeout else None
+
+        if not in_green_thread() and outbox is None and should_cancel is None:
+            done, _ = futures_wait([future], timeout=timeout)
+            if not done:
+                raise PoolTimeoutError(f"{self.name} call timed out after {timeout}s")
+            return
+
+        # Cooperative wait: poll the future, sleeping on the hub in between.
+        delay = 0.005
+        while not future.done():
+            self._drain(outbox, on_progress)
+            if should_cancel and should_cancel():
+                raise PoolCancelledError(f"{self.name} call cancelled by caller")
+            if deadline and time.monotonic() >= deadline:
+                raise PoolTimeoutError(f"{self.name} call timed out after {timeout}s")
+            if in_green_thread():
+                eventlet.sleep(delay)
+            else:
+                time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+
+    @staticmethod
+    def _drain(outbox, on_progress):
+        while outbox:
+            on_progress(outbox.popleft())
+
+    def stats(self):
+        with self._cond:
+            return {
+                "workers": len(self._threads),
+                "busy": sum(self._active.values()),
+                "queued": sum(len(q) for q in self._queues.values()),
+            }
+
+    def _ensure_workers(self):
+        while len(self._threads) < self.max_workers:
+            thread = threading.Thread(
+                target=self._worker_loop,
+                name=f"{self.name}-{len(self._threads)}",
+                daemon=True,
+            )
+            self._threads.append(thread)
+            thread.start()
+
+    def _next_job(self):
+        """Round-robin over keys, skipping keys that already hold `per_key_limit` workers."""
+        while True:
+            key = next((k for k in self._queues
+                        if not self.per_key_limit or self._active.get(k, 0) < self.per_key_limit), None)
+            if key is None:
+                return None
+            queue = self._queues.pop(key)
+            job = queue.popleft()
+            if queue:
+                # Re-append at the end so the next pick starts with another key
+                self._queues[key] = queue
+            if job.future.set_running_or_notify_cancel():
+                return job
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_job()
+                self._active[job.key] = self._active.get(job.key, 0) + 1
+
+            try:
+                job.future.set_result(job.fn(*job.args, **job.kwargs))
+            except BaseException as e:
+                job.future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._active[job.key] -= 1
+                    if not self._active[job.key]:
+                        del self._active[job.key]
+                    self._cond.notify_all()
@@ -0,0 +1,180 @@
+import atexit
+import copy
+import threading
+import time
+
+from app.helpers.metrics import metrics
+from config import WRITE_BEHIND_MAX_ATTEMPTS, WRITE_BEHIND_RETRY_SECONDS, WRITE_BEHIND_MAX_RETRY_SECONDS
+
+
+class WriteBehindBuffer:
+    """
+    In-process write-behind buffer.
+
+    Writers call `add(key, item)`; the subclass merges the item into whatever is
+    already pending for that key (`merge`). A background OS thread hands the
+    pending batch to `write` - inside an app context - when `max_pending` items
+    have been added or `flush_interval` seconds have passed since the oldest
+    unflushed item, whichever comes first. Pending data is also flushed at exit.
+
+    If writing the batch fails, it is rolled back and each key is written on its own,
+    so one bad key cannot take the others down. Keys that still fail go back into
+    the pending set (`combine`d with anything added since) and are retried with
+    exponential backoff. After WRITE_BEHIND_MAX_ATTEMPTS failed flushes a key is dropped.
+
+    Subclasses implement:
+        merge(pending: dict, key, item)  -> None  (mutate `pending[key]`)
+        combine(older, newer)            -> value (two pending values for one key, oldest first)
+        write(batch: dict)               -> None  (persist, commit once)
+    """
+
+    def __init__(self, name, flush_interval=1.0, max_pending=500):
+        self.name = name
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.app = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending = {}
+        # Batch handed to `write` and not yet committed (or requeued); still visible to `peek`
+        self._inflight = {}
+        self._count = 0
+        self._oldest = None
+        self._thread = None
+        self._attempts = {}
+        self._failed_flushes = 0
+        self._retry_at = None
+
+    def init_app(self, app, flush_interval=None, max_pending=None):
+        self.app = app
+        if flush_interval is not None:
+            self.flush_interval = flush_interval
+        if max_pending is not None:
+            self.max_pending = max_pending
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-flusher", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def add(self, key, item):
+        with self._lock:
+            self.merge(self._pending, key, item)
+            self._count += 1
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = self._count >= self.max_pending
+        if full:
+            self._wakeup.set()
+
+    def peek(self, key):
+        """
+        A copy of the merged value not yet committed for `key`, including a flush that is
+        still being written (None if nothing is buffered).
+        """
+        with self._lock:
+            inflight, pending = copy.deepcopy((self._inflight.get(key), self._pending.get(key)))
+        if inflight is None or pending is None:
+            return pending if inflight is None else inflight
+        return self.combine(inflight, pending)
+
+    def flush(self):
+        """Writes everything pending now. Safe to call from any thread."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                count, self._count, self._oldest = self._count, 0, None
+                self._inflight = batch
+            if not batch:
+                return
+
+            started = time.monotonic()
+            with self.app.app_context():
+                try:
+                    self.write(batch)
+                    failed = {}
+                except Exception as e:
+                    self._rollback()
+                    print(f"⚠️ {self.name}: flush of {count} items for {len(batch)} keys failed, "
+                          f"writing keys one by one: {e}")
+                    failed = self._write_each(batch)
+
+            for key in batch:
+                if key not in failed:
+                    self._attempts.pop(key, None)
+            with self._lock:
+                # Committed keys are now in the database, failed ones go back to pending, in one step
+                self._inflight = {}
+                if failed:
+                    self._requeue(failed)
+                else:
+                    self._failed_flushes, self._retry_at = 0, None
+            metrics.incr(f"{self.name}.flushed", len(batch) - len(failed))
+            metrics.observe(f"{self.name}.flush_seconds", time.monotonic() - started)
+
+    def _write_each(self, batch):
+        failed = {}
+        for key, value in batch.items():
+            try:
+                self.write({key: value})
+            except Exception as e:
+                self._rollback()
+                failed[key] = value
+                print(f"⚠️ {self.name}: write for {key!r} failed: {e}")
+        return failed
+
+    def _requeue(self, failed):
+        """
+        Puts failed keys back (older than anything added since) and schedules a retry.
+        Called with `_lock` held.
+        """
+        self._failed_flushes += 1
+        delay = min(WRITE_BEHIND_RETRY_SECONDS * 2 ** (self._failed_flushes - 1), WRITE_BEHIND_MAX_RETRY_SECONDS)
+        for key, value in failed.items():
+            attempts = self._attempts.get(key, 0) + 1
+            if attempts >= WRITE_BEHIND_MAX_ATTEMPTS:
+                self._attempts.pop(key, None)
+                metrics.incr(f"{self.name}.dropped")
+                print(f"⚠️ {self.name}: dropping {key!r} after {attempts} failed writes")
+                continue
+            self._attempts[key] = attempts
+            newer = self._pending.pop(key, None)
+            self._pending[key] = value if newer is None else self.combine(value, newer)
+            self._count += 1
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+        self._retry_at = time.monotonic() + delay
+        metrics.incr(f"{self.name}.retried", len(failed))
+
+    @staticmethod
+    def _rollback():
+        from app import db
+        db.session.rollback()
+
+    def merge(self, pending, key, item):
+        raise NotImplementedError
+
+    def combine(self, older, newer):
+        raise NotImplementedError
+
+    def write(self, batch):
+        raise NotImplementedError
+
+    def _run(self):
+        timeout = self.flush_interval
+        while True:
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+            with self._lock:
+                age = time.monotonic() - self._oldest if self._oldest is not None else None
+                due = self._count >= self.max_pending or (age is not None and age >= self.flush_interval)
+                backoff = self._retry_at - time.monotonic() if self._retry_at is not None else 0
+            if due and backoff > 0:
+                # Last flush failed: hold off until its retry time
+                timeout = backoff
+            elif due:
+                self.flush()
+                timeout = self.flush_interval
+            else:
+                # Wake up exactly when the oldest pending item reaches its deadline
+                timeout = self.flush_interval - age if age is not None else self.flush_interval
@@ -1,6 +1,6 @@
 from .users import User
 from .context import TypingHistory, Memory, UserAction
 from .insights import UserInsight
-from .scheduler import Schedule
+from .scheduler import Schedule, SchedulerLease
 from .blacklisted_tokens import BlacklistToken
 from .fcm_tokens import FCMTokens
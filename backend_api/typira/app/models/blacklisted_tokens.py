@@ -1,31 +1,92 @@
 from .. import db
+from ..helpers.auth_cache import token_digest
 import datetime
 
+# JWT lifetime (see User.encode_auth_token); used when a legacy row has no parseable expiry
+TOKEN_LIFETIME = datetime.timedelta(days=30, seconds=5)
+
 
 class BlacklistToken(db.Model):
     """
-    Token Model for storing JWT tokens
+    Token Model for storing blacklisted JWT tokens, by SHA-256 digest.
+    Rows are purged once the token has expired anyway (see purge_expired).
     """
     __tablename__ = 'blacklisted_tokens'
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    token = db.Column(db.String(225), unique=True, nullable=False)
-    expire_date = db.Column(db.String(225),nullable=False)
+    token_digest = db.Column(db.String(64), unique=True, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)
     blacklisted_on = db.Column(db.DateTime, nullable=False)
 
-    def __init__(self, token,expire_date):
-        self.token = token
-        self.expire_date = expire_date
+    # Legacy columns: emptied by `python manage.py migrate_blacklist`, drop once every deployment has run it
+    token = db.Column(db.String(225), unique=True, nullable=True)
+    expire_date = db.Column(db.String(225), nullable=True)
+
+    def __init__(self, token, expires_at):
+        self.token_digest = token_digest(token)
+        self.expires_at = expires_at
         self.blacklisted_on = datetime.datetime.now()
 
     def __repr__(self):
-        return '<id: token: {}'.format(self.token)
+        return '<id: token_digest: {}'.format(self.token_digest)
 
     @staticmethod
     def check_blacklist(auth_token):
         # check whether auth token has been blacklisted
-        res = BlacklistToken.query.filter_by(token=str(auth_token)).first()
+        res = BlacklistToken.query.with_entities(BlacklistToken.id).filter_by(
+            token_digest=token_digest(auth_token)
+        ).first()
         if res:
             return True
         else:
-            return False
\ No newline at end of file
+            return False
+
+    @staticmethod
+    def purge_expired(now=None):
+        """Deletes entries whose token has expired (an expired JWT is rejected anyway). Returns the count."""
+        now = now or datetime.datetime.utcnow()
+        deleted = BlacklistToken.query.filter(BlacklistToken.expires_at < now).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+    @staticmethod
+    def migrate_legacy_rows(batch_size=1000):
+        """
+        Converts rows that still hold the raw token: stores its digest and a real
+        expiry, then clears the legacy columns. Safe to re-run. Returns the count.
+        """
+        migrated = 0
+        while True:
+            rows = BlacklistToken.query.filter(BlacklistToken.token != None).limit(batch_size).all()
+            if not rows:
+                return migrated
+            for row in rows:
+                digest = token_digest(row.token)
+                duplicate = BlacklistToken.query.with_entities(BlacklistToken.id).filter(
+                    BlacklistToken.token_digest == digest, BlacklistToken.id != row.id
+                ).first()
+                if duplicate:
+                    db.session.delete(row)
+                else:
+                    row.token_digest = digest
+                    row.expires_at = BlacklistToken._parse_legacy_expiry(row)
+                    row.token = None
+                    row.expire_date = None
+                migrated += 1
+            db.session.commit()
+
+    @staticmethod
+    def _parse_legacy_expiry(row):
+        value = (row.expire_date or '').strip()
+        try:
+            # JWT `exp` (epoch seconds)
+            return datetime.datetime.utcfromtimestamp(float(value))
+        except ValueError:
+            pass
+        try:
+            parsed = datetime.datetime.fromisoformat(value)
+            if parsed.tzinfo:
+                parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+            return parsed
+        except ValueError:
+            return (row.blacklisted_on or datetime.datetime.utcnow()) + TOKEN_LIFETIME
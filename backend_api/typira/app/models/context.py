@@ -1,4 +1,5 @@
 from .. import db
+from ..helpers.semantic import get_hash_bands
 import datetime
 
 class TypingHistory(db.Model):
@@ -7,15 +8,53 @@ class TypingHistory(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     content = db.Column(db.Text, nullable=False)
-    semantic_hash = db.Column(db.String(64), nullable=True, index=True)
+    semantic_hash = db.Column(db.String(64), nullable=True)
+    # 16-bit blocks of semantic_hash for near-duplicate lookup (kept in sync on insert/update)
+    simhash_band_0 = db.Column(db.Integer, nullable=True)
+    simhash_band_1 = db.Column(db.Integer, nullable=True)
+    simhash_band_2 = db.Column(db.Integer, nullable=True)
+    simhash_band_3 = db.Column(db.Integer, nullable=True)
     frequency = db.Column(db.Integer, default=1)
     timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     date_updated = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
     app_context = db.Column(db.String(255), nullable=True)
 
+    __table_args__ = (
+        # Prompt context: latest history per user
+        db.Index('ix_typing_history_user_updated', 'user_id', 'date_updated'),
+        # Typing history listing
+        db.Index('ix_typing_history_user_timestamp', 'user_id', 'timestamp'),
+        # Semantic deduplication upsert
+        db.Index('ix_typing_history_user_hash_app', 'user_id', 'semantic_hash', 'app_context'),
+        # Expansion absorption: last fragment typed in the same app in the past minute
+        db.Index('ix_typing_history_user_app_timestamp', 'user_id', 'app_context', 'timestamp'),
+        # Near-duplicate (Hamming distance) lookup, one index per SimHash block
+        db.Index('ix_typing_history_user_band_0', 'user_id', 'simhash_band_0'),
+        db.Index('ix_typing_history_user_band_1', 'user_id', 'simhash_band_1'),
+        db.Index('ix_typing_history_user_band_2', 'user_id', 'simhash_band_2'),
+        db.Index('ix_typing_history_user_band_3', 'user_id', 'simhash_band_3'),
+    )
+
     def __repr__(self):
         return f"<TypingHistory '{self.id}'>"
 
+    @staticmethod
+    def band_columns():
+        return [TypingHistory.simhash_band_0, TypingHistory.simhash_band_1,
+                TypingHistory.simhash_band_2, TypingHistory.simhash_band_3]
+
+    @staticmethod
+    def band_values(semantic_hash):
+        """Column values for the SimHash blocks of `semantic_hash` (for inserts/updates)."""
+        return {column.key: band for column, band in zip(TypingHistory.band_columns(), get_hash_bands(semantic_hash))}
+
+
+@db.event.listens_for(TypingHistory, 'before_insert')
+@db.event.listens_for(TypingHistory, 'before_update')
+def _sync_simhash_bands(mapper, connection, target):
+    for key, band in TypingHistory.band_values(target.semantic_hash).items():
+        setattr(target, key, band)
+
 class Memory(db.Model):
     __tablename__ = "memories"
 
@@ -26,6 +65,10 @@ class Memory(db.Model):
     tags = db.Column(db.String(255), nullable=True)
     timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_memories_user_timestamp', 'user_id', 'timestamp'),
+    )
+
     def __repr__(self):
         return f"<Memory '{self.id}'>"
 
@@ -39,5 +82,12 @@ class UserAction(db.Model):
     context = db.Column(db.Text, nullable=True) # Store the payload/instruction for the action
     timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow)
 
+    __table_args__ = (
+        # Recent actions for prompt context
+        db.Index('ix_user_actions_user_timestamp', 'user_id', 'timestamp'),
+        # Priority loop exclusions (approved forever / declined in the last hour)
+        db.Index('ix_user_actions_user_decision_timestamp', 'user_id', 'decision', 'timestamp'),
+    )
+
     def __repr__(self):
         return f"<UserAction '{self.action_id}' : {self.decision}>"
@@ -14,6 +14,53 @@ class Schedule(db.Model):
     is_repeat = db.Column(db.Boolean, default=False)
     timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     last_run = db.Column(db.DateTime, nullable=True)
+    # Next due minute in UTC, derived from time/timezone/date_or_repeat (None: never runs again)
+    next_run_utc = db.Column(db.DateTime, nullable=True, index=True)
+    # Insight generated ahead of time for the run at prepared_for_utc (JSON)
+    prepared_for_utc = db.Column(db.DateTime, nullable=True)
+    prepared_payload = db.Column(db.Text, nullable=True)
 
     def __repr__(self):
         return f"<Schedule '{self.title}' for User {self.user_id}>"
+
+
+class SchedulerLease(db.Model):
+    """
+    Time-limited lease on a cluster-wide role (e.g. the schedule dispatcher).
+    Only the process holding an unexpired lease performs the role.
+    """
+    __tablename__ = "scheduler_leases"
+
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(255), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<SchedulerLease '{self.name}' held by '{self.holder}'>"
+
+    @staticmethod
+    def acquire(name, holder, ttl_seconds):
+        """
+        Takes or renews the lease `name` for `holder`. Returns True if `holder` now owns it.
+        Atomic across processes: a conditional UPDATE renews our own (or an expired) lease,
+        and the primary key makes concurrent first-time INSERTs fail for all but one.
+        """
+        from sqlalchemy.exc import IntegrityError
+
+        now = datetime.datetime.utcnow()
+        expires_at = now + datetime.timedelta(seconds=ttl_seconds)
+        table = SchedulerLease.__table__
+        try:
+            renewed = db.session.execute(
+                table.update()
+                .where(table.c.name == name, db.or_(table.c.holder == holder, table.c.expires_at < now))
+                .values(holder=holder, expires_at=expires_at)
+            ).rowcount
+            if not renewed:
+                db.session.execute(table.insert().values(name=name, holder=holder, expires_at=expires_at))
+            db.session.commit()
+            return True
+        except IntegrityError:
+            # Someone else holds it
+            db.session.rollback()
+            return False
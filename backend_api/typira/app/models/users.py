@@ -2,8 +2,12 @@ from .. import db,flask_bcrypt
 import datetime
 import jwt
 import logging
-from app.models.blacklisted_tokens import BlacklistToken
-from config import key
+from app.helpers.auth_cache import auth_cache, token_digest
+from app.helpers.worker_pool import FairWorkerPool
+from config import key, PASSWORD_POOL_SIZE
+
+# bcrypt is CPU-bound C code that never yields to eventlet; run it on native threads
+password_pool = FairWorkerPool("password", max_workers=PASSWORD_POOL_SIZE)
 
 class User(db.Model):
     __tablename__ = "users"
@@ -27,11 +31,11 @@ class User(db.Model):
 
     @staticmethod
     def generate_password(pass_word):
-        return flask_bcrypt.generate_password_hash(pass_word).decode('utf-8')
+        return password_pool.run(flask_bcrypt.generate_password_hash, pass_word).decode('utf-8')
 
     @staticmethod
     def check_password(password, pass_word):
-        return flask_bcrypt.check_password_hash(password, pass_word)
+        return password_pool.run(flask_bcrypt.check_password_hash, password, pass_word)
 
     def encode_auth_token(self, public_id):
         """
@@ -65,10 +69,22 @@ class User(db.Model):
     def decode_auth_token(auth_token):
         """
         Decodes the auth token
+        Tokens verified recently are answered from auth_cache without touching the DB.
         """
         try:
+            digest = token_digest(auth_token)
+            cached = auth_cache.get(digest)
+            if cached:
+                user_id, expire_date = cached
+                return {
+                    'status': 1,
+                    'message': 'Authorization Token Decoded successfully',
+                    'user_id': user_id,
+                    'expire_date': expire_date,
+                }
+
             payload = jwt.decode(auth_token, key, algorithms=['HS256'])
-            is_blacklisted_token = BlacklistToken.check_blacklist(auth_token)
+            is_blacklisted_token = auth_cache.is_blacklisted(auth_token, digest)
             if is_blacklisted_token:
                 response_object = {
                     'status': 0,
@@ -76,8 +92,9 @@ class User(db.Model):
                 }
                 return response_object
             else:
-                user = User.query.filter_by(public_id=payload['sub']).first()
+                user = User.query.with_entities(User.id).filter_by(public_id=payload['sub']).first()
                 if user:
+                    auth_cache.put(digest, user.id, payload['exp'])
                     response_object = {
                         'status': 1,
                         'message': 'Authorization Token Decoded successfully',
@@ -1,13 +1,32 @@
-from flask import request, session, current_app
+from flask import request, session, current_app, copy_current_request_context
 from flask_socketio import emit
 from app import socketio, db
 from app.models.context import TypingHistory, Memory, UserAction
 from app.models.users import User
 from app.helpers.insight_helpers import increment_user_stats
+from app.business.context_business import ContextBusiness
+from app.helpers.coalescer import LatestWins
+from app.helpers.metrics import metrics
+from app.helpers.media_upload import media_uploads, UploadError
+from app.helpers.image_processing import prepare_image
+from app.helpers.vision_cache import vision_cache
+from config import ANALYZE_DEBOUNCE_MS
 # from app.helpers.auth_helpers import token_required_socket # We need a socket version of this
+import base64
+import binascii
 import datetime
 import time
 
+# Thought delivery modes, negotiated on connect.
+# 'paced': legacy clients; the server emits one thought_update every THOUGHT_DISPLAY_SECONDS.
+# 'batch': the server emits a single thought_batch and the client paces the animation.
+THOUGHT_DELIVERY_PACED = 'paced'
+THOUGHT_DELIVERY_BATCH = 'batch'
+THOUGHT_DISPLAY_SECONDS = 2
+
+# Latest `analyze` per (sid, app_context); older ones are coalesced or cancelled
+analyze_requests = LatestWins()
+
 def get_socket_user_id():
     """Extract user_id from session or Authorization header."""
     user_id = session.get('user_id')
@@ -23,6 +42,54 @@ def get_socket_user_id():
                 session['user_id'] = user_id
     return user_id
 
+def undelivered_thoughts(thoughts, streamed):
+    """
+    Returns the thoughts that still need emitting after a streamed call.
+    If the final result diverged from what was streamed (e.g. an error fallback), all of it is new.
+    """
+    if thoughts[:len(streamed)] == streamed:
+        return thoughts[len(streamed):]
+    return thoughts
+
+def negotiate_thought_delivery(auth=None):
+    """
+    Picks the thought delivery mode from the connect `auth` payload or the
+    `thought_delivery` query arg. Anything unknown falls back to the legacy paced mode.
+    """
+    requested = (auth or {}).get('thought_delivery') if isinstance(auth, dict) else None
+    requested = requested or request.args.get('thought_delivery')
+    mode = THOUGHT_DELIVERY_BATCH if requested == THOUGHT_DELIVERY_BATCH else THOUGHT_DELIVERY_PACED
+    session['thought_delivery'] = mode
+    return mode
+
+def deliver_thoughts(thoughts, result_event, result, final_thought=None, is_stale=None, **emit_kwargs):
+    """
+    Emits the remaining thoughts followed by the final result.
+    Batch clients get everything in one `thought_batch` event with suggested display
+    timings; paced clients get one `thought_update` per THOUGHT_DISPLAY_SECONDS and
+    then `result_event`, exactly as before. Paced delivery stops early once
+    `is_stale()` reports the request was superseded.
+    """
+    if session.get('thought_delivery') == THOUGHT_DELIVERY_BATCH:
+        batch = list(thoughts) + ([final_thought] if final_thought else [])
+        emit('thought_batch', {
+            'thoughts': batch,
+            'timings_ms': [THOUGHT_DISPLAY_SECONDS * 1000] * len(batch),
+            'event': result_event,
+            'result': result
+        }, **emit_kwargs)
+        return
+
+    for thought in thoughts:
+        emit('thought_update', {'text': thought}, **emit_kwargs)
+        socketio.sleep(THOUGHT_DISPLAY_SECONDS) # Allow user to read the thinking process
+        if is_stale and is_stale():
+            metrics.incr('analyze.cancelled')
+            return
+    if final_thought:
+        emit('thought_update', {'text': final_thought}, **emit_kwargs)
+    emit(result_event, result, **emit_kwargs)
+
 @socketio.on('connect', namespace='/agent')
 def handle_agent_connect(auth=None):
     auth_token = request.headers.get('Authorization')
@@ -32,7 +99,13 @@ def handle_agent_connect(auth=None):
         resp = User.decode_auth_token(auth_token)
         if resp['status'] == 1:
             session['user_id'] = resp['user_id']
-    emit('con_response', {'status': 'connected', 'authenticated': 'user_id' in session}, namespace='/agent')
+    mode = negotiate_thought_delivery(auth)
+    emit('con_response', {'status': 'connected', 'authenticated': 'user_id' in session, 'thought_delivery': mode}, namespace='/agent')
+
+@socketio.on('disconnect', namespace='/agent')
+def handle_agent_disconnect(*args):
+    sid = request.sid
+    analyze_requests.forget(lambda key: key[0] == sid)
 
 @socketio.on('connect', namespace='/home')
 def handle_home_connect(auth=None):
@@ -43,7 +116,12 @@ def handle_home_connect(auth=None):
         resp = User.decode_auth_token(auth_token)
         if resp['status'] == 1:
             session['user_id'] = resp['user_id']
-    emit('con_response', {'status': 'connected'}, namespace='/home')
+    mode = negotiate_thought_delivery(auth)
+    emit('con_response', {'status': 'connected', 'thought_delivery': mode}, namespace='/home')
+
+@socketio.on('disconnect', namespace='/home')
+def handle_home_disconnect(*args):
+    media_uploads.forget_sid(request.sid)
 
 @socketio.on('get_priority', namespace='/home')
 def handle_get_priority(data=None):
@@ -52,16 +130,12 @@ def handle_get_priority(data=None):
     if user_id:
         find_priority(user_id, platform=platform)
 
-def find_priority(user_id, platform=None):
-    """Synchronous helper to find a priority task and emit it."""
-    from app.business.gemini_business import GeminiBusiness
-    
-    # 1. Fetch History & Memories (Personalization)
-    history = TypingHistory.query.filter_by(user_id=user_id).order_by(TypingHistory.date_updated.desc()).limit(30).all()
-    
-    # Exclude actions:
-    # - Approved actions are excluded forever.
-    # - Declined actions are excluded for 1 hour.
+def handled_action_ids(user_id):
+    """
+    Action ids the priority loop must not propose again:
+    - Approved actions are excluded forever.
+    - Declined actions are excluded for 1 hour.
+    """
     one_hour_ago = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
     
     excluded_actions = UserAction.query.filter(
@@ -75,16 +149,22 @@ def find_priority(user_id, platform=None):
         )
     ).all()
     
-    handled_ids = [a.action_id for a in excluded_actions]
+    return [a.action_id for a in excluded_actions]
+
+def find_priority(user_id, platform=None):
+    """Synchronous helper to find a priority task and emit it."""
+    from app.business.gemini_business import GeminiBusiness
     
-    memories = Memory.query.filter_by(user_id=user_id).order_by(Memory.timestamp.desc()).limit(20).all()
+    # 1. Fetch History & Memories (Personalization)
+    snapshot = ContextBusiness.get_snapshot(user_id)
     
-    # 2. Fetch Recent Action Context (for Gemini to avoid repetition)
-    recent_actions = UserAction.query.filter_by(user_id=user_id).order_by(UserAction.timestamp.desc()).limit(15).all()
-    action_history = [f"{a.decision.upper()}: {a.context or a.action_id} at {a.timestamp.strftime('%Y-%m-%d %H:%M:%S')}" for a in recent_actions]
+    handled_ids = handled_action_ids(user_id)
+    
+    # 2. Recent Action Context (for Gemini to avoid repetition)
+    action_history = snapshot['actions']
 
-    history_list = [f"{h.content} (Logged on {h.date_updated.strftime('%Y-%m-%d %H:%M:%S')})" for h in history]
-    memory_list = [f"{m.content} (Logged on {m.timestamp.strftime('%Y-%m-%d %H:%M:%S')})" for m in memories]
+    history_list = snapshot['history']
+    memory_list = snapshot['memories']
     
     # Handle New User / No Context
     if not history_list and not memory_list:
@@ -98,22 +178,25 @@ def find_priority(user_id, platform=None):
 
     # 3. Get Priority Task
     current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    task = GeminiBusiness.get_priority_task(history_list, memory_list, action_history, "mobile_home", current_time=current_time, user_platform=platform)
+    streamed = []
+
+    def on_thought(thought):
+        streamed.append(thought)
+        emit('thought_update', {'text': thought}, room=request.sid, namespace='/home')
+
+    task = GeminiBusiness.get_priority_task(history_list, memory_list, action_history, "mobile_home", current_time=current_time, user_platform=platform, user_id=user_id, on_thought=on_thought)
 
     print(task)
     
-    # Stream Thoughts
-    thoughts = task.get('thoughts', [])
-    for thought in thoughts:
-        emit('thought_update', {'text': thought}, room=request.sid, namespace='/home')
-        socketio.sleep(2) # Short pause for readability
+    # Thoughts still to deliver (anything not already streamed while generating)
+    thoughts = undelivered_thoughts(task.get('thoughts', []), streamed)
     
     # 3. Emit Result
     # We check if the primary action (the first one) has already been handled.
     primary_action_id = task.get('actions', [{}])[0].get('id', 'none')
     
     if primary_action_id in handled_ids and primary_action_id != 'none':
-        emit('priority_task', {
+        deliver_thoughts(thoughts, 'priority_task', {
                 "thoughts": ["I'm having a bit of trouble connecting to my brain..."],
                 "title": "Standing by",
                 "plan": "I'm standing by to assist with your tasks.",
@@ -129,80 +212,7 @@ def find_priority(user_id, platform=None):
     else:
         # User 'plan' as the final presented thought for approval
         task['thought'] = task.get('plan', '')
-        emit('priority_task', task, room=request.sid, namespace='/home')
-
-def async_persist_context(app, user_id, text, app_context, is_full):
-    """
-    Background task to persist and deduplicate context.
-    Includes 'Expansion Absorption' to merge fragments typed in a short window.
-    """
-    with app.app_context():
-        from app import db
-        from app.models.context import TypingHistory
-        from app.helpers.atomizer import split_into_sentences, scrub_pii
-        from app.helpers.semantic import get_semantic_hash
-        from app.helpers.insight_helpers import increment_user_stats
-        import datetime
-
-        atoms = split_into_sentences(text)
-        num_atoms = len(atoms)
-        
-        # Word count for insights
-        total_words = sum(len(atom.split()) for atom in atoms)
-        increment_user_stats(user_id, words=total_words)
-        
-        for i, atom in enumerate(atoms):
-            if not atom or len(atom.strip()) < 3:
-                continue
-                
-            clean_text = scrub_pii(atom)
-            is_last = (i == num_atoms - 1)
-            
-            # 1. Expansion Absorption Logic (Only for the last fragment/atom)
-            if is_last:
-                one_minute_ago = datetime.datetime.utcnow() - datetime.timedelta(seconds=60)
-                last_entry = TypingHistory.query.filter(
-                    TypingHistory.user_id == user_id,
-                    TypingHistory.app_context == app_context,
-                    TypingHistory.timestamp >= one_minute_ago
-                ).order_by(TypingHistory.timestamp.desc()).first()
-
-                if last_entry and clean_text.startswith(last_entry.content) and len(clean_text) > len(last_entry.content):
-                    # Absorption: Update the previous fragment with the fuller sentence
-                    s_hash = get_semantic_hash(clean_text)
-                    last_entry.content = clean_text
-                    last_entry.semantic_hash = s_hash
-                    last_entry.timestamp = datetime.datetime.utcnow()
-                    last_entry.date_updated = datetime.datetime.utcnow()
-                    db.session.commit()
-                    continue
-
-            # 2. Standard Semantic Deduplication / Novel Entry (Upsert)
-            s_hash = get_semantic_hash(clean_text)
-            if s_hash:
-                existing = TypingHistory.query.filter_by(
-                    user_id=user_id,
-                    semantic_hash=s_hash,
-                    app_context=app_context
-                ).first()
-                
-                if existing:
-                    existing.frequency += 1
-                    existing.timestamp = datetime.datetime.utcnow()
-                    existing.date_updated = datetime.datetime.utcnow()
-                    existing.content = clean_text 
-                else:
-                    new_entry = TypingHistory(
-                        user_id=user_id, 
-                        content=clean_text,
-                        semantic_hash=s_hash,
-                        app_context=app_context,
-                        timestamp=datetime.datetime.utcnow(),
-                        date_updated=datetime.datetime.utcnow()
-                    )
-                    db.session.add(new_entry)
-                
-                db.session.commit()
+        deliver_thoughts(thoughts, 'priority_task', task, room=request.sid, namespace='/home')
 
 @socketio.on('analyze', namespace='/agent')
 def handle_analyze(data):
@@ -215,31 +225,54 @@ def handle_analyze(data):
     app_context = data.get('app_context')
     is_full = data.get('is_full_context', False)
 
-    socketio.start_background_task(
-        async_persist_context, 
-        current_app._get_current_object(),
-        user_id, text, app_context, is_full
-    )
+    # Latest-wins: a newer `analyze` for the same socket and app supersedes this one
+    request_key = (request.sid, app_context)
+    token = analyze_requests.claim(request_key)
+    try:
+        _run_analyze(data, user_id, text, app_context, is_full, request_key, token)
+    finally:
+        analyze_requests.release(request_key, token)
+
+def _run_analyze(data, user_id, text, app_context, is_full, request_key, token):
+    def is_stale():
+        return not analyze_requests.is_current(request_key, token)
+
+    # Debounce: wait for typing to settle before spending a Gemini call
+    socketio.sleep(ANALYZE_DEBOUNCE_MS / 1000.0)
+    if is_stale():
+        metrics.incr('analyze.coalesced')
+        return
+
+    # Persisted by the write-behind buffer (see ContextBusiness.queue_typing)
+    ContextBusiness.queue_typing(user_id, app_context, text)
 
     # --- Agentic AI Suggestion Engine (Gemini 3) ---
     from app.business.gemini_business import GeminiBusiness
     
     # 1. Gather Personal Context from TypingHistory
-    # Get top 30 most recent items or frequent (ordered by update time for relevance)
-    recent_history = TypingHistory.query.filter_by(user_id=user_id).order_by(TypingHistory.date_updated.desc()).limit(30).all()
-    
-    combined_history = [f"{h.content} (Logged on {h.date_updated.strftime('%Y-%m-%d %H:%M:%S')})" for h in recent_history]
+    # Top 30 most recent items (ordered by update time for relevance)
+    combined_history = ContextBusiness.get_snapshot(user_id)['history']
     
     # 2. Call the Agentic Brain
     current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     platform = data.get('platform')
-    analysis = GeminiBusiness.analyze_context(text, combined_history, app_context, current_time=current_time, user_platform=platform)
-    
-    # 3. Stream 'Thought Process' to UI
-    thoughts = analysis.get('thoughts', [])
-    for thought in thoughts:
+    streamed = []
+
+    def on_thought(thought):
+        if is_stale():
+            return
+        streamed.append(thought)
         emit('thought_update', {'text': thought})
-        socketio.sleep(2) # Allow user to read the thinking process
+
+    analysis = GeminiBusiness.analyze_context(text, combined_history, app_context, current_time=current_time, user_platform=platform, user_id=user_id, on_thought=on_thought, should_cancel=is_stale)
+
+    # Never emit results for text the user has already typed past
+    if is_stale():
+        metrics.incr('analyze.cancelled')
+        return
+    
+    # 3. 'Thought Process' still to deliver (anything not already streamed while generating)
+    thoughts = undelivered_thoughts(analysis.get('thoughts', []), streamed)
         
     # 4. Finalize and Show Actions
     insights = analysis.get('insights')
@@ -274,12 +307,11 @@ def handle_analyze(data):
             sentiment=mood_data.get('sentiment')
         )
 
-    emit('thought_update', {'text': analysis.get('final_thought', 'Ready.')})
-    emit('suggestion_ready', {
+    deliver_thoughts(thoughts, 'suggestion_ready', {
         'thought': analysis.get('final_thought', ''),
         'actions': analysis.get('actions', []),
         'insights': insights
-    })
+    }, final_thought=analysis.get('final_thought', 'Ready.'), is_stale=is_stale)
     
 @socketio.on('approve_action', namespace='/home')
 def handle_approve_action(data):
@@ -299,10 +331,8 @@ def handle_approve_action(data):
     emit('thought_update', {'text': "Starting..."}, namespace='/home')
     
     # 1. Fetch History for personalization
-    history = TypingHistory.query.filter_by(user_id=user_id).order_by(TypingHistory.date_updated.desc()).limit(30).all()
-    memories = Memory.query.filter_by(user_id=user_id).order_by(Memory.timestamp.desc()).limit(10).all()
-    combined_history = [f"{h.content} (Logged on {h.date_updated.strftime('%Y-%m-%d %H:%M:%S')})" for h in history] + \
-                       [f"{m.content} (Logged on {m.timestamp.strftime('%Y-%m-%d %H:%M:%S')})" for m in memories]
+    snapshot = ContextBusiness.get_snapshot(user_id)
+    combined_history = snapshot['history'] + snapshot['memories'][:10]
     
     # 2. Record approval for the priority loop memory
     new_action = UserAction(user_id=user_id, action_id=action_id, decision='approved', context=str(payload))
@@ -312,15 +342,18 @@ def handle_approve_action(data):
     
     # 3. Call the Agentic Brain for specialized execution
     current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    execution = GeminiBusiness.perform_agentic_action(action_id, payload, combined_history, user_input=user_input, current_time=current_time, user_platform=platform)
+    streamed = []
+
+    def on_thought(thought):
+        streamed.append(thought)
+        emit('thought_update', {'text': thought}, namespace='/home')
+
+    execution = GeminiBusiness.perform_agentic_action(action_id, payload, combined_history, user_input=user_input, current_time=current_time, user_platform=platform, user_id=user_id, on_thought=on_thought)
 
     print(execution)
     
-    # 4. Stream 'Thought Process' to UI
+    # 4. 'Thought Process' still to deliver (anything not already streamed while generating)
     thoughts = execution.get('thoughts', [])
-    for thought in thoughts:
-        emit('thought_update', {'text': thought}, namespace='/home')
-        socketio.sleep(2) # Short pause for readability
 
     # 5. Save to Memory for future reference
     if execution.get('result'):
@@ -360,7 +393,7 @@ def handle_approve_action(data):
             sentiment=mood_data.get('sentiment')
         )
 
-    emit('action_result', {
+    deliver_thoughts(undelivered_thoughts(thoughts, streamed), 'action_result', {
         'thought': thoughts[-1] if thoughts else 'Task complete.',
         'result': execution.get('result', ''),
         'action_id': action_id,
@@ -384,14 +417,12 @@ def handle_perform_action(data):
     
     emit('thought_update', {'text': f"Processing..."})
     
-    history = TypingHistory.query.filter_by(user_id=user_id).order_by(TypingHistory.date_updated.desc()).limit(30).all()
-    memories = Memory.query.filter_by(user_id=user_id).order_by(Memory.timestamp.desc()).limit(10).all()
-    combined_history = [f"{h.content} (Logged on {h.date_updated.strftime('%Y-%m-%d %H:%M:%S')})" for h in history] + \
-                       [f"{m.content} (Logged on {m.timestamp.strftime('%Y-%m-%d %H:%M:%S')})" for m in memories]
+    snapshot = ContextBusiness.get_snapshot(user_id)
+    combined_history = snapshot['history'] + snapshot['memories'][:10]
     
     # Execute action WITHOUT recording a UserAction (keep it separate from priority deduplication)
     current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    execution = GeminiBusiness.perform_keyboard_agentic_action(action_id, payload, context, combined_history, current_time=current_time)
+    execution = GeminiBusiness.perform_keyboard_agentic_action(action_id, payload, context, combined_history, current_time=current_time, user_id=user_id)
     
     # Update Insights
     insights = execution.get('insights')
@@ -459,37 +490,50 @@ def handle_decline_action(data):
 def handle_analyze_image(data):
     """
     Handles image analysis request from the Mobile Home screen.
+    Legacy single-event form with a base64 `image`; see upload_begin for the chunked one.
     """
     user_id = get_socket_user_id()
     if not user_id: return
 
+    run_image_analysis(user_id, decode_legacy_media(data.get('image')), data.get('mime_type', 'image/jpeg'), data.get('platform'))
+
+def run_image_analysis(user_id, image_data, mime_type, platform):
+    """Analyzes an image (bytes or memoryview) and emits the result to the current /home socket."""
     from app.business.gemini_business import GeminiBusiness
-    image_base64 = data.get('image')
-    mime_type = data.get('mime_type', 'image/jpeg')
-    platform = data.get('platform')
 
     emit('thought_update', {'text': "Analyzing your image..."}, namespace='/home')
 
-    # 1. Fetch Context
-    history = TypingHistory.query.filter_by(user_id=user_id).order_by(TypingHistory.date_updated.desc()).limit(30).all()
-    memories = Memory.query.filter_by(user_id=user_id).order_by(Memory.timestamp.desc()).limit(20).all()
-    recent_actions = UserAction.query.filter_by(user_id=user_id).order_by(UserAction.timestamp.desc()).limit(15).all()
+    # 0. One decode on the media pool gives the downscaled JPEG for the model and its fingerprint.
+    # Same image sent again recently: replay its analysis (no Gemini call, no new Memory row)
+    fingerprint = None
+    if image_data:
+        image_data, mime_type, fingerprint = prepare_image(image_data, mime_type, user_id=user_id)
+    cached = vision_cache.get(user_id, fingerprint) if fingerprint else None
+    if cached:
+        metrics.incr('vision.cache_hit')
+        increment_user_stats(user_id, interaction_mode='vision')
+        cached['thought'] = cached.get('plan', '')
+        deliver_thoughts(cached.get('thoughts', []), 'priority_task', cached, namespace='/home')
+        return
+    metrics.incr('vision.cache_miss')
 
-    history_list = [f"{h.content} (Logged on {h.date_updated.strftime('%Y-%m-%d %H:%M:%S')})" for h in history]
-    memory_list = [f"{m.content} (Logged on {m.timestamp.strftime('%Y-%m-%d %H:%M:%S')})" for m in memories]
-    action_history = [f"{a.decision.upper()}: {a.context or a.action_id} at {a.timestamp.strftime('%Y-%m-%d %H:%M:%S')}" for a in recent_actions]
+    # 1. Fetch Context
+    snapshot = ContextBusiness.get_snapshot(user_id)
+    history_list = snapshot['history']
+    memory_list = snapshot['memories']
+    action_history = snapshot['actions']
 
     # 2. Call Gemini
     current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    analysis = GeminiBusiness.analyze_image(image_base64, mime_type, history_list, memory_list, action_history, current_time=current_time, user_platform=platform)
+    analysis = GeminiBusiness.analyze_image(image_data, mime_type, history_list, memory_list, action_history, current_time=current_time, user_platform=platform, user_id=user_id)
+
+    # Only complete analyses are replayed (the error fallback has no insights)
+    if fingerprint and analysis.get('insights'):
+        vision_cache.put(user_id, fingerprint, analysis)
 
-    # 3. Stream Thoughts
     thoughts = analysis.get('thoughts', [])
-    for thought in thoughts:
-        emit('thought_update', {'text': thought}, namespace='/home')
-        socketio.sleep(2)
 
-    # 4. Store Representative Context in Memory
+    # 3. Store Representative Context in Memory
     # Extract the summary from the 'save_to_memory' action payload or use the plan
     save_action = next((a for a in analysis.get('actions', []) if a['id'] == 'save_to_memory'), None)
     memory_content = save_action['payload'] if save_action else analysis.get('plan', '')
@@ -532,46 +576,41 @@ def handle_analyze_image(data):
     
     db.session.commit()
 
-    # 5. Emit Result
+    # 5. Emit Thoughts and Result
     # Reuse onPriorityTask structure for UI compatibility
     analysis['thought'] = analysis.get('plan', '')
-    emit('priority_task', analysis, namespace='/home')
+    deliver_thoughts(thoughts, 'priority_task', analysis, namespace='/home')
 
 @socketio.on('analyze_voice', namespace='/home')
 def handle_analyze_voice(data):
     """
     Handles voice recording analysis request from the Mobile Home screen.
+    Legacy single-event form with a base64 `audio`; see upload_begin for the chunked one.
     """
     user_id = get_socket_user_id()
     if not user_id: return
 
+    run_voice_analysis(user_id, decode_legacy_media(data.get('audio')), data.get('mime_type', 'audio/m4a'), data.get('platform'))
+
+def run_voice_analysis(user_id, audio_data, mime_type, platform):
+    """Analyzes a voice recording (bytes or memoryview) and emits the result to the current /home socket."""
     from app.business.gemini_business import GeminiBusiness
-    audio_base64 = data.get('audio')
-    mime_type = data.get('mime_type', 'audio/m4a')
-    platform = data.get('platform')
 
     emit('thought_update', {'text': "Transcribing your voice..."}, namespace='/home')
 
     # 1. Fetch Context
-    history = TypingHistory.query.filter_by(user_id=user_id).order_by(TypingHistory.date_updated.desc()).limit(30).all()
-    memories = Memory.query.filter_by(user_id=user_id).order_by(Memory.timestamp.desc()).limit(20).all()
-    recent_actions = UserAction.query.filter_by(user_id=user_id).order_by(UserAction.timestamp.desc()).limit(15).all()
-
-    history_list = [f"{h.content} (Logged on {h.date_updated.strftime('%Y-%m-%d %H:%M:%S')})" for h in history]
-    memory_list = [f"{m.content} (Logged on {m.timestamp.strftime('%Y-%m-%d %H:%M:%S')})" for m in memories]
-    action_history = [f"{a.decision.upper()}: {a.context or a.action_id} at {a.timestamp.strftime('%Y-%m-%d %H:%M:%S')}" for a in recent_actions]
+    snapshot = ContextBusiness.get_snapshot(user_id)
+    history_list = snapshot['history']
+    memory_list = snapshot['memories']
+    action_history = snapshot['actions']
 
     # 2. Call Gemini
     current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    analysis = GeminiBusiness.analyze_voice(audio_base64, mime_type, history_list, memory_list, action_history, current_time=current_time, user_platform=platform)
+    analysis = GeminiBusiness.analyze_voice(audio_data, mime_type, history_list, memory_list, action_history, current_time=current_time, user_platform=platform, user_id=user_id)
 
-    # 3. Stream Thoughts
     thoughts = analysis.get('thoughts', [])
-    for thought in thoughts:
-        emit('thought_update', {'text': thought}, namespace='/home')
-        socketio.sleep(2)
 
-    # 4. Store Transcription and Insight in Memory
+    # 3. Store Transcription and Insight in Memory
     transcription = analysis.get('transcription', 'Audio recording')
     plan = analysis.get('plan', '')
     
@@ -613,9 +652,86 @@ def handle_analyze_voice(data):
     
     db.session.commit()
 
-    # 5. Emit Result
+    # 5. Emit Thoughts and Result
     analysis['thought'] = analysis.get('plan', '')
-    emit('priority_task', analysis, namespace='/home')
+    deliver_thoughts(thoughts, 'priority_task', analysis, namespace='/home')
+
+def decode_legacy_media(media_base64):
+    """Decodes a base64 media payload; None if it is missing or malformed (the analysis then reports an error)."""
+    try:
+        return base64.b64decode(media_base64) if media_base64 else None
+    except (binascii.Error, ValueError):
+        return None
+
+# Chunked binary uploads: upload_begin -> upload_chunk* -> upload_commit.
+# Every step is acknowledged (Socket.IO ack) with a dict, or {'error': ...}.
+MEDIA_ANALYZERS = {
+    'image': (run_image_analysis, 'image/jpeg'),
+    'voice': (run_voice_analysis, 'audio/m4a'),
+}
+
+@socketio.on('upload_begin', namespace='/home')
+def handle_upload_begin(data):
+    """
+    Starts a media upload: {kind: 'image'|'voice', size, mime_type, platform, upload_id (optional)}.
+    Ack: {upload_id, chunk_size}.
+    """
+    user_id = get_socket_user_id()
+    if not user_id: return {'error': 'unauthorized'}
+
+    kind = data.get('kind')
+    if kind not in MEDIA_ANALYZERS:
+        return {'error': f"unknown kind {kind!r}"}
+    try:
+        upload_id = media_uploads.begin(
+            user_id, request.sid, kind, data.get('size'),
+            data.get('mime_type') or MEDIA_ANALYZERS[kind][1],
+            meta={'platform': data.get('platform')},
+            upload_id=data.get('upload_id')
+        )
+    except UploadError as e:
+        return {'error': str(e)}
+    return {'upload_id': upload_id, 'chunk_size': media_uploads.chunk_bytes}
+
+@socketio.on('upload_chunk', namespace='/home')
+def handle_upload_chunk(data):
+    """
+    Appends one binary chunk: {upload_id, offset, data}. Ack: {received}.
+    Waiting for each ack before sending the next chunk keeps the server from buffering ahead.
+    """
+    user_id = get_socket_user_id()
+    if not user_id: return {'error': 'unauthorized'}
+
+    try:
+        received = media_uploads.chunk(user_id, data.get('upload_id'), data.get('data'), offset=data.get('offset'))
+    except UploadError as e:
+        return {'error': str(e)}
+    return {'received': received}
+
+@socketio.on('upload_commit', namespace='/home')
+def handle_upload_commit(data):
+    """
+    Finishes an upload. Ack (as soon as the upload is complete): {status: 'ok'}.
+    The analysis then runs in the background, exactly like analyze_image / analyze_voice,
+    and its result arrives through the usual thought_update / priority_task events.
+    """
+    user_id = get_socket_user_id()
+    if not user_id: return {'error': 'unauthorized'}
+
+    try:
+        upload = media_uploads.commit(user_id, data.get('upload_id'))
+    except UploadError as e:
+        return {'error': str(e)}
+    # Keeps request.sid and the socket session, so the analysis emits to this client
+    analyze = copy_current_request_context(MEDIA_ANALYZERS[upload.kind][0])
+    socketio.start_background_task(analyze, user_id, upload.buffer, upload.mime_type, upload.meta.get('platform'))
+    return {'status': 'ok'}
+
+@socketio.on('upload_abort', namespace='/home')
+def handle_upload_abort(data):
+    user_id = get_socket_user_id()
+    if user_id:
+        media_uploads.abort(user_id, data.get('upload_id'))
 
 @socketio.on('analyze_text', namespace='/home')
 def handle_analyze_text(data):
@@ -639,25 +755,18 @@ def handle_analyze_text(data):
     emit('thought_update', {'text': "Analyzing your input..."}, namespace='/home')
 
     # 1. Fetch Context
-    history = TypingHistory.query.filter_by(user_id=user_id).order_by(TypingHistory.date_updated.desc()).limit(30).all()
-    memories = Memory.query.filter_by(user_id=user_id).order_by(Memory.timestamp.desc()).limit(20).all()
-    recent_actions = UserAction.query.filter_by(user_id=user_id).order_by(UserAction.timestamp.desc()).limit(15).all()
-
-    history_list = [f"{h.content} (Logged on {h.date_updated.strftime('%Y-%m-%d %H:%M:%S')})" for h in history]
-    memory_list = [f"{m.content} (Logged on {m.timestamp.strftime('%Y-%m-%d %H:%M:%S')})" for m in memories]
-    action_history = [f"{a.decision.upper()}: {a.context or a.action_id} at {a.timestamp.strftime('%Y-%m-%d %H:%M:%S')}" for a in recent_actions]
+    snapshot = ContextBusiness.get_snapshot(user_id)
+    history_list = snapshot['history']
+    memory_list = snapshot['memories']
+    action_history = snapshot['actions']
 
     # 2. Call Gemini
     current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    analysis = GeminiBusiness.analyze_text_command(text, history_list, memory_list, action_history, current_time=current_time, user_platform=platform)
+    analysis = GeminiBusiness.analyze_text_command(text, history_list, memory_list, action_history, current_time=current_time, user_platform=platform, user_id=user_id)
 
-    # 3. Stream Thoughts
     thoughts = analysis.get('thoughts', [])
-    for thought in thoughts:
-        emit('thought_update', {'text': thought}, namespace='/home')
-        socketio.sleep(2)
 
-    # 4. Emit Result
+    # 3. Update Insights
     insights = analysis.get('insights')
     if insights:
         bio = insights.get('bio_data', {})
@@ -691,4 +800,4 @@ def handle_analyze_text(data):
         )
 
     analysis['thought'] = analysis.get('plan', '')
-    emit('priority_task', analysis, namespace='/home')
+    deliver_thoughts(thoughts, 'priority_task', analysis, namespace='/home')
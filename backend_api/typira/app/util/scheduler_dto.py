@@ -12,5 +12,6 @@ class SchedulerDto:
         'time': fields.String(required=True, description='Time of day (HH:mm)'),
         'is_repeat': fields.Boolean(description='Whether the schedule repeats'),
         'timestamp': fields.DateTime(readOnly=True, description='Creation timestamp'),
-        'last_run': fields.DateTime(readOnly=True, description='Last time the schedule was executed')
+        'last_run': fields.DateTime(readOnly=True, description='Last time the schedule was executed'),
+        'next_run_utc': fields.DateTime(readOnly=True, description='Next time the schedule will run (UTC)')
     })
@@ -0,0 +1,41 @@
+"""
+Cost of authenticating a request (User.decode_auth_token) with and without auth_cache:
+statements executed and latency per call, against SQLite.
+"""
+import uuid
+
+from benchmarks.common import make_app, count_queries, timed, report
+
+from app import db
+from app.helpers.auth_cache import auth_cache
+from app.models.users import User
+
+REQUESTS = 2000
+
+
+def main():
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        user = User(public_id=str(uuid.uuid4()), email="bench@example.com")
+        db.session.add(user)
+        db.session.commit()
+        token = user.encode_auth_token(user.public_id)['token']
+
+        def uncached():
+            auth_cache._verified.clear()
+            assert User.decode_auth_token(token)['status'] == 1
+
+        def cached():
+            assert User.decode_auth_token(token)['status'] == 1
+
+        for label, fn in (("verify every request (cache cleared)", uncached), ("auth_cache hit", cached)):
+            fn()
+            with count_queries(db.engine) as queries:
+                stats = timed(fn, REQUESTS)
+            report(label, *stats)
+            print(f"{'':<50} {queries[0] / REQUESTS:.2f} statements per request")
+
+
+if __name__ == "__main__":
+    main()
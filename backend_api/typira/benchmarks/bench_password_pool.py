@@ -0,0 +1,54 @@
+"""
+Login storm: socket (hub) responsiveness while 20 greenthreads verify bcrypt passwords,
+calling flask_bcrypt directly versus User.check_password (password_pool).
+"""
+import time
+
+import eventlet
+from flask import Flask
+
+from benchmarks import common  # noqa: F401  (sets up the import path)
+from app import flask_bcrypt
+from app.models.users import User
+
+LOGINS = 20
+
+
+def storm(check):
+    """Longest pause of a 10 ms greenthread ticker (a stand-in for socket traffic) during the storm."""
+    gaps, done = [], []
+
+    def ticker():
+        last = time.monotonic()
+        while not done:
+            eventlet.sleep(0.01)
+            now = time.monotonic()
+            gaps.append(now - last)
+            last = now
+
+    tick = eventlet.spawn(ticker)
+    started = time.monotonic()
+    pool = eventlet.GreenPool()
+    for _ in range(LOGINS):
+        pool.spawn(check)
+    pool.waitall()
+    elapsed = time.monotonic() - started
+    done.append(True)
+    tick.wait()
+    return max(gaps) * 1000, elapsed * 1000
+
+
+def main():
+    flask_bcrypt.init_app(Flask("bench"))
+    password_hash = flask_bcrypt.generate_password_hash("correct horse").decode("utf-8")
+
+    for label, check in (
+        ("flask_bcrypt on the hub", lambda: flask_bcrypt.check_password_hash(password_hash, "correct horse")),
+        ("User.check_password (password_pool)", lambda: User.check_password(password_hash, "correct horse")),
+    ):
+        gap, elapsed = storm(check)
+        print(f"{label:<40} worst hub pause {gap:8.1f} ms   {LOGINS} logins in {elapsed:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Persisting a typed message: one batched ContextBusiness.persist_typing call versus the
+old path of one lookup-and-commit per sentence. Statements, commits and time per message.
+"""
+from sqlalchemy import event
+
+from benchmarks.common import make_app, count_queries, timed, report
+
+from app import db
+from app.business.context_business import ContextBusiness
+
+MESSAGES = 50
+SENTENCES = 12
+
+
+def message(n):
+    return [f"Message {n} sentence {i} about the quarterly planning review number {i * 7 + n}."
+            for i in range(SENTENCES)]
+
+
+def main():
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        commits = [0]
+        event.listen(db.session, "after_commit", lambda session: commits.__setitem__(0, commits[0] + 1))
+        counter = iter(range(10 ** 6))
+
+        def per_sentence():
+            for entry in ContextBusiness.prepare_atoms(message(next(counter))):
+                ContextBusiness.persist_typing(1, "com.example.mail", [entry])
+
+        def batched():
+            ContextBusiness.persist_typing(1, "com.example.mail", ContextBusiness.prepare_atoms(message(next(counter))))
+
+        for label, fn in (("one persist_typing per sentence", per_sentence), ("batched persist_typing", batched)):
+            commits[0] = 0
+            with count_queries(db.engine) as queries:
+                stats = timed(fn, MESSAGES)
+            report(f"{label} ({SENTENCES} sentences)", *stats)
+            print(f"{'':<50} {queries[0] / MESSAGES:.1f} statements, {commits[0] / MESSAGES:.1f} commits per message")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+FairWorkerPool: hub responsiveness and per-user fairness with simulated blocking calls
+(time.sleep stands in for a Gemini HTTP call; like it, it blocks the OS thread).
+"""
+import time
+
+import eventlet
+
+from benchmarks import common  # noqa: F401  (sets up the import path)
+from app.helpers.worker_pool import FairWorkerPool
+
+CALL_SECONDS = 0.05
+CONCURRENT_CALLS = 20
+
+
+def hub_gap_ms(call):
+    """Longest pause of a 10 ms greenthread ticker while CONCURRENT_CALLS greenthreads run `call`."""
+    gaps, done = [], []
+
+    def ticker():
+        last = time.monotonic()
+        while not done:
+            eventlet.sleep(0.01)
+            now = time.monotonic()
+            gaps.append(now - last)
+            last = now
+
+    tick = eventlet.spawn(ticker)
+    started = time.monotonic()
+    pool = eventlet.GreenPool()
+    for _ in range(CONCURRENT_CALLS):
+        pool.spawn(call)
+    pool.waitall()
+    elapsed = time.monotonic() - started
+    done.append(True)
+    tick.wait()
+    return max(gaps) * 1000, elapsed * 1000
+
+
+def light_user_latency_ms(fair):
+    """
+    One user queues 40 calls, then 5 other users send one each: mean wait of the 5.
+    Unfair = every call under one key, i.e. a plain FIFO queue.
+    """
+    pool = FairWorkerPool("bench", max_workers=4, per_key_limit=2 if fair else None)
+    heavy = [pool.submit(time.sleep, CALL_SECONDS, key="heavy" if fair else "all") for _ in range(40)]
+    started = time.monotonic()
+    light = [pool.submit(time.sleep, CALL_SECONDS, key=f"light-{i}" if fair else "all") for i in range(5)]
+    finished = []
+    for future in light:
+        future.result()
+        finished.append(time.monotonic() - started)
+    for future in heavy:
+        future.result()
+    return sum(finished) / len(finished) * 1000
+
+
+def main():
+    pool = FairWorkerPool("bench", max_workers=8)
+    for label, call in (("blocking call on the hub", lambda: time.sleep(CALL_SECONDS)),
+                        ("FairWorkerPool.run", lambda: pool.run(time.sleep, CALL_SECONDS))):
+        gap, elapsed = hub_gap_ms(call)
+        print(f"{label:<32} worst hub pause {gap:8.1f} ms   {CONCURRENT_CALLS} calls in {elapsed:8.1f} ms")
+
+    for label, fair in (("single FIFO queue", False), ("per-user keys, per_key_limit=2", True)):
+        print(f"{label:<32} light users waited {light_user_latency_ms(fair):8.1f} ms on average")
+
+
+if __name__ == "__main__":
+    main()
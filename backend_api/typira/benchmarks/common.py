@@ -0,0 +1,46 @@
+"""
+Shared helpers for the scripts in this package. Run a benchmark from backend_api/typira with
+`python -m benchmarks.<name>`; each one prints its numbers and exits.
+"""
+import contextlib
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("SECRET_KEY", "typira-benchmark-secret-key-for-local-runs")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from tests.conftest import make_app  # noqa: E402,F401  (same bare app the tests use)
+
+
+@contextlib.contextmanager
+def count_queries(engine):
+    """Yields a one-item list holding the number of statements executed on `engine`."""
+    counter = [0]
+
+    def before_cursor_execute(*args):
+        counter[0] += 1
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def timed(fn, repeat):
+    """Runs `fn` `repeat` times; returns (mean, p95, max) in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.mean(samples), samples[int(len(samples) * 0.95) - 1], samples[-1]
+
+
+def report(label, mean, p95, worst):
+    print(f"{label:<50} mean {mean:8.3f} ms   p95 {p95:8.3f} ms   max {worst:8.3f} ms")
@@ -38,4 +38,93 @@ LEVEL_ADVANCED = 2
 PAGINATION_COUNT = 50
 
 PIN_TYPE_PASSWORD_RESET = 0
-PIN_TYPE_EMAIL_VERIFY = 1
\ No newline at end of file
+PIN_TYPE_EMAIL_VERIFY = 1
+
+# Gemini execution pool (see app/helpers/worker_pool.py)
+GEMINI_POOL_SIZE = int(os.environ.get("GEMINI_POOL_SIZE", 16))
+GEMINI_PER_USER_LIMIT = int(os.environ.get("GEMINI_PER_USER_LIMIT", 2))
+GEMINI_TIMEOUT_SECONDS = int(os.environ.get("GEMINI_TIMEOUT_SECONDS", 60))
+GEMINI_HTTP_MAX_CONNECTIONS = int(os.environ.get("GEMINI_HTTP_MAX_CONNECTIONS", 32))
+
+# Native threads for bcrypt hashing/verification (roughly one per core is plenty)
+PASSWORD_POOL_SIZE = int(os.environ.get("PASSWORD_POOL_SIZE", 4))
+
+# Quiet period before a keyboard `analyze` event is sent to Gemini; newer events
+# from the same socket and app_context within this window supersede older ones.
+ANALYZE_DEBOUNCE_MS = int(os.environ.get("ANALYZE_DEBOUNCE_MS", 300))
+
+# Per-user prompt context snapshot cache (see app/business/context_business.py)
+CONTEXT_CACHE_MAX_USERS = int(os.environ.get("CONTEXT_CACHE_MAX_USERS", 2048))
+CONTEXT_CACHE_TTL_SECONDS = int(os.environ.get("CONTEXT_CACHE_TTL_SECONDS", 60))
+
+# Write-behind buffer for typed context: flushed every N seconds or once this many messages are pending
+TYPING_BUFFER_FLUSH_SECONDS = float(os.environ.get("TYPING_BUFFER_FLUSH_SECONDS", 2))
+TYPING_BUFFER_MAX_PENDING = int(os.environ.get("TYPING_BUFFER_MAX_PENDING", 500))
+
+# Coalescing buffer for UserInsight / UserActivityHistory counters
+INSIGHT_BUFFER_FLUSH_SECONDS = float(os.environ.get("INSIGHT_BUFFER_FLUSH_SECONDS", 5))
+INSIGHT_BUFFER_MAX_PENDING = int(os.environ.get("INSIGHT_BUFFER_MAX_PENDING", 1000))
+# Failed write-behind keys are retried with exponential backoff, then dropped
+WRITE_BEHIND_MAX_ATTEMPTS = int(os.environ.get("WRITE_BEHIND_MAX_ATTEMPTS", 5))
+WRITE_BEHIND_RETRY_SECONDS = float(os.environ.get("WRITE_BEHIND_RETRY_SECONDS", 1))
+WRITE_BEHIND_MAX_RETRY_SECONDS = float(os.environ.get("WRITE_BEHIND_MAX_RETRY_SECONDS", 60))
+
+# Scheduled insights: how many run in parallel, and how long a job waits for its Gemini call.
+# The timeout only bounds the wait: the HTTP request keeps running (and holding a pool
+# worker) for up to GEMINI_TIMEOUT_SECONDS, so keep this below that.
+SCHEDULER_CONCURRENCY = int(os.environ.get("SCHEDULER_CONCURRENCY", 8))
+SCHEDULER_JOB_TIMEOUT_SECONDS = int(os.environ.get("SCHEDULER_JOB_TIMEOUT_SECONDS", 50))
+# Generate scheduled insights up to this many minutes ahead and only send the push at the due minute (0 disables)
+SCHEDULER_PRECOMPUTE_MINUTES = int(os.environ.get("SCHEDULER_PRECOMPUTE_MINUTES", 10))
+# Only one process dispatches schedules; a dead dispatcher's lease is taken over after this many seconds
+SCHEDULER_LEASE_SECONDS = int(os.environ.get("SCHEDULER_LEASE_SECONDS", 90))
+
+# Process metrics (app/helpers/metrics.py): worker processes print a snapshot every
+# N minutes (0 disables); web processes serve theirs at /api/insights/metrics
+METRICS_LOG_MINUTES = int(os.environ.get("METRICS_LOG_MINUTES", 5))
+
+# Per-role concurrency (manage.py web | worker; `run` keeps the defaults above)
+WEB_GEMINI_POOL_SIZE = int(os.environ.get("WEB_GEMINI_POOL_SIZE", GEMINI_POOL_SIZE))
+WORKER_GEMINI_POOL_SIZE = int(os.environ.get("WORKER_GEMINI_POOL_SIZE", 32))
+WORKER_SCHEDULER_CONCURRENCY = int(os.environ.get("WORKER_SCHEDULER_CONCURRENCY", 16))
+
+# FCM delivery queue (see app/helpers/notification_queue.py)
+FCM_BATCH_SIZE = int(os.environ.get("FCM_BATCH_SIZE", 500))
+FCM_BATCH_LINGER_SECONDS = float(os.environ.get("FCM_BATCH_LINGER_SECONDS", 0.2))
+FCM_MAX_RETRIES = int(os.environ.get("FCM_MAX_RETRIES", 3))
+FCM_RETRY_BACKOFF_SECONDS = float(os.environ.get("FCM_RETRY_BACKOFF_SECONDS", 1))
+FCM_BROADCAST_CONCURRENCY = int(os.environ.get("FCM_BROADCAST_CONCURRENCY", 4))
+
+# Auth shortcuts (see app/helpers/auth_cache.py)
+AUTH_CACHE_TTL_SECONDS = int(os.environ.get("AUTH_CACHE_TTL_SECONDS", 300))
+AUTH_CACHE_MAX_TOKENS = int(os.environ.get("AUTH_CACHE_MAX_TOKENS", 50000))
+# Max delay before a logout in another process is seen here (0 = check on every request)
+AUTH_BLACKLIST_SYNC_SECONDS = int(os.environ.get("AUTH_BLACKLIST_SYNC_SECONDS", 5))
+AUTH_BLOOM_CAPACITY = int(os.environ.get("AUTH_BLOOM_CAPACITY", 100000))
+BLACKLIST_PURGE_INTERVAL_HOURS = int(os.environ.get("BLACKLIST_PURGE_INTERVAL_HOURS", 1))
+
+# Speech uploads: sent inline up to this size, larger ones go through the Gemini File API
+SPEECH_INLINE_MAX_BYTES = int(os.environ.get("SPEECH_INLINE_MAX_BYTES", 8 * 1024 * 1024))
+# Optional retention of uploads in a content-addressed store (see app/helpers/artifact_store.py)
+UPLOAD_RETENTION_ENABLED = os.environ.get("UPLOAD_RETENTION_ENABLED", "false").lower() in ("1", "true", "yes")
+UPLOAD_RETENTION_DIR = os.environ.get("UPLOAD_RETENTION_DIR", "uploads")
+UPLOAD_RETENTION_MAX_MB = int(os.environ.get("UPLOAD_RETENTION_MAX_MB", 512))
+UPLOAD_RETENTION_MAX_AGE_HOURS = int(os.environ.get("UPLOAD_RETENTION_MAX_AGE_HOURS", 24))
+
+# Chunked media uploads over Socket.IO (upload_begin / upload_chunk / upload_commit)
+MEDIA_UPLOAD_MAX_BYTES = int(os.environ.get("MEDIA_UPLOAD_MAX_BYTES", 20 * 1024 * 1024))
+MEDIA_UPLOAD_CHUNK_BYTES = int(os.environ.get("MEDIA_UPLOAD_CHUNK_BYTES", 256 * 1024))
+MEDIA_UPLOAD_TTL_SECONDS = int(os.environ.get("MEDIA_UPLOAD_TTL_SECONDS", 120))
+
+# Vision preprocessing (see app/helpers/image_processing.py)
+IMAGE_MAX_DIMENSION = int(os.environ.get("IMAGE_MAX_DIMENSION", 1024))
+IMAGE_JPEG_QUALITY = int(os.environ.get("IMAGE_JPEG_QUALITY", 85))
+MEDIA_POOL_SIZE = int(os.environ.get("MEDIA_POOL_SIZE", 4))
+
+# Repeat-image cache: analyses replayed for identical images (see app/helpers/vision_cache.py).
+# VISION_CACHE_MAX_DISTANCE > 0 also replays for images whose dHash is that close, which
+# can match a different screenshot of the same app layout; 0 requires identical pixels.
+VISION_CACHE_TTL_SECONDS = int(os.environ.get("VISION_CACHE_TTL_SECONDS", 600))
+VISION_CACHE_MAX_DISTANCE = int(os.environ.get("VISION_CACHE_MAX_DISTANCE", 0))
+VISION_CACHE_PER_USER = int(os.environ.get("VISION_CACHE_PER_USER", 20))
+VISION_CACHE_MAX_USERS = int(os.environ.get("VISION_CACHE_MAX_USERS", 2048))
@@ -1,13 +1,24 @@
 from flask_migrate import Migrate
-from app import create_app, db
+from app import create_app, db, ROLE_ALL, ROLE_WEB, ROLE_WORKER, ROLE_CLI
 import os, logging
 import sys
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# python manage.py run     -> everything in one process (REST, sockets, scheduler)
+# python manage.py web     -> REST + sockets only
+# python manage.py worker  -> scheduler and background jobs, no HTTP listener
+# python manage.py migrate_blacklist -> one-off conversion of pre-digest blacklisted tokens
+# Anything else (e.g. flask db ...) uses TYPIRA_ROLE, default "cli": no scheduler,
+# flusher threads or push queue, so maintenance commands never start background work.
+ROLE_COMMANDS = {"run": ROLE_ALL, "web": ROLE_WEB, "worker": ROLE_WORKER, "migrate_blacklist": ROLE_CLI}
+
+argument = sys.argv[1] if len(sys.argv) > 1 else ""
+
 config_name = os.getenv("ENV","dev")
-app = create_app(config_name)
+app = create_app(config_name, ROLE_COMMANDS.get(argument))
 migrate = Migrate(app, db)
 
 
@@ -18,10 +29,19 @@ logging.basicConfig(filename='error.log', level=logging.ERROR,
 
 
 if __name__ == "__main__":
-    try:
-        argument = sys.argv[1]
-    except IndexError:
-        argument = ""
-    if argument == "run":
+    if argument in ("run", "web"):
         from app import socketio
         socketio.run(app, host="0.0.0.0", port=7009, debug=True)
+    elif argument == "migrate_blacklist":
+        # One-off: convert blacklisted tokens stored before digests/expiry existed
+        from app.models.blacklisted_tokens import BlacklistToken
+        with app.app_context():
+            print(f"Migrated {BlacklistToken.migrate_legacy_rows()} legacy blacklisted tokens")
+    elif argument == "worker":
+        from app import scheduler
+        print("Worker started: running scheduler (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            scheduler.shutdown()
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("SECRET_KEY", "typira-test-secret-key-for-local-runs-only")
+# genai.Client refuses to build without a key; no test reaches the real API
+os.environ.setdefault("GEMINI_API_KEY", "typira-test-gemini-key")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from app import db
+import app.models  # noqa: F401  (registers every table)
+
+
+def make_app(uri="sqlite://", **engine_options):
+    """A bare Flask app bound to `db`; enough for models and helpers (no blueprints or background services)."""
+    flask_app = Flask("typira-tests")
+    flask_app.config["SQLALCHEMY_DATABASE_URI"] = uri
+    flask_app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options
+    flask_app.config["SECRET_KEY"] = os.environ["SECRET_KEY"]
+    db.init_app(flask_app)
+    return flask_app
+
+
+@pytest.fixture
+def app():
+    flask_app = make_app()
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
@@ -0,0 +1,81 @@
+"""
+Local stand-in for firebase_admin.messaging, enough for NotificationQueue.
+
+Every send succeeds unless a failure is scripted for the token:
+    fake.fail("token-1", FakeError("UNAVAILABLE"), FakeError("UNAVAILABLE"))
+makes the next two sends to "token-1" fail, then it succeeds again.
+"""
+import threading
+
+
+class FakeError(Exception):
+    """A FirebaseError look-alike: only `code` and the message are inspected."""
+
+    def __init__(self, code, message=""):
+        super().__init__(message or code)
+        self.code = code
+
+
+def unregistered():
+    return FakeError("NOT_FOUND", "Requested entity was not found.")
+
+
+def invalid_token():
+    return FakeError("INVALID_ARGUMENT", "The registration token is not a valid FCM registration token")
+
+
+class _Payload:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+_CONSTRUCTORS = {"Message", "Notification", "APNSConfig", "APNSPayload", "Aps", "AndroidConfig", "AndroidNotification"}
+
+
+class SendResponse:
+    def __init__(self, exception=None):
+        self.exception = exception
+        self.success = exception is None
+
+
+class BatchResponse:
+    def __init__(self, responses):
+        self.responses = responses
+        self.success_count = sum(1 for response in responses if response.success)
+        self.failure_count = len(responses) - self.success_count
+
+
+class FakeMessaging:
+    def __init__(self):
+        self.calls = []
+        self._failures = {}
+        self._lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        # Optional hook run inside send_each (e.g. to hold calls open or raise)
+        self.on_send = None
+
+    def __getattr__(self, name):
+        # Message, Notification, ... constructors
+        if name not in _CONSTRUCTORS:
+            raise AttributeError(name)
+        return _Payload
+
+    def fail(self, token, *errors):
+        self._failures.setdefault(token, []).extend(errors)
+
+    def send_each(self, messages):
+        tokens = [message.token for message in messages]
+        with self._lock:
+            self.calls.append(tokens)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            if self.on_send:
+                self.on_send(tokens)
+            with self._lock:
+                errors = [self._failures[token].pop(0) if self._failures.get(token) else None for token in tokens]
+            return BatchResponse([SendResponse(error) for error in errors])
+        finally:
+            with self._lock:
+                self.active -= 1
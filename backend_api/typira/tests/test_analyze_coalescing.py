@@ -0,0 +1,112 @@
+"""Latest-wins `analyze`: superseded requests never reach Gemini or emit a stale result."""
+import pytest
+
+pytest.importorskip("google.genai")
+
+from app import socket_endpoints
+from app.business.gemini_business import GeminiBusiness
+from app.helpers.coalescer import LatestWins
+from app.helpers.metrics import metrics
+
+KEY = ("sid-1", "com.example.chat")
+
+
+def _counter(name):
+    return metrics.snapshot()["counters"].get(name, 0)
+
+
+def test_latest_claim_wins():
+    requests = LatestWins()
+    first = requests.claim(KEY)
+    second = requests.claim(KEY)
+
+    assert not requests.is_current(KEY, first)
+    assert requests.is_current(KEY, second)
+
+    # The superseded request finishing must not clear the newer claim
+    requests.release(KEY, first)
+    assert requests.is_current(KEY, second)
+    requests.release(KEY, second)
+    assert not requests.is_current(KEY, second)
+
+
+def test_forget_drops_every_key_of_a_socket():
+    requests = LatestWins()
+    kept = requests.claim(("sid-2", "app"))
+    dropped = requests.claim(KEY)
+
+    requests.forget(lambda key: key[0] == "sid-1")
+
+    assert not requests.is_current(KEY, dropped)
+    assert requests.is_current(("sid-2", "app"), kept)
+
+
+@pytest.fixture
+def analyze(app, monkeypatch):
+    """Runs _run_analyze for one claimed request; returns (run, emitted, gemini_calls)."""
+    requests = LatestWins()
+    emitted, gemini_calls = [], []
+    monkeypatch.setattr(socket_endpoints, "analyze_requests", requests)
+    monkeypatch.setattr(socket_endpoints, "emit", lambda event, payload, **kwargs: emitted.append((event, payload)))
+    monkeypatch.setattr(socket_endpoints.socketio, "sleep", lambda seconds: None)
+    monkeypatch.setattr(socket_endpoints.ContextBusiness, "queue_typing", staticmethod(lambda *args: None))
+    monkeypatch.setattr(socket_endpoints.ContextBusiness, "get_snapshot",
+                        staticmethod(lambda user_id: {'history': [], 'memories': [], 'actions': []}))
+    monkeypatch.setattr(socket_endpoints, "increment_user_stats", lambda *args, **kwargs: None)
+
+    def run(gemini):
+        def analyze_context(text, history, app_context, on_thought=None, should_cancel=None, **kwargs):
+            gemini_calls.append(text)
+            return gemini(on_thought, should_cancel, requests)
+
+        monkeypatch.setattr(GeminiBusiness, "analyze_context", staticmethod(analyze_context))
+        token = requests.claim(KEY)
+        with app.test_request_context():
+            socket_endpoints._run_analyze({'platform': 'android'}, 1, "hello there", KEY[1], False, KEY, token)
+
+    return run, emitted, gemini_calls
+
+
+def _result(thoughts):
+    return {'thoughts': thoughts, 'final_thought': 'Done.', 'actions': [{'id': 'reply'}], 'insights': None}
+
+
+def test_superseded_during_debounce_never_calls_gemini(analyze, monkeypatch):
+    run, emitted, gemini_calls = analyze
+    # A newer `analyze` for the same socket and app arrives while this one is debouncing
+    monkeypatch.setattr(socket_endpoints.socketio, "sleep",
+                        lambda seconds: socket_endpoints.analyze_requests.claim(KEY))
+    coalesced = _counter('analyze.coalesced')
+
+    run(lambda on_thought, should_cancel, requests: _result([]))
+
+    assert gemini_calls == []
+    assert emitted == []
+    assert _counter('analyze.coalesced') == coalesced + 1
+
+
+def test_superseded_during_gemini_emits_no_stale_result(analyze):
+    run, emitted, gemini_calls = analyze
+    cancelled = _counter('analyze.cancelled')
+
+    def gemini(on_thought, should_cancel, requests):
+        on_thought("Reading the chat")
+        requests.claim(KEY)
+        assert should_cancel()
+        on_thought("Drafting a reply")
+        return _result(["Reading the chat", "Drafting a reply"])
+
+    run(gemini)
+
+    assert gemini_calls == ["hello there"]
+    assert emitted == [('thought_update', {'text': "Reading the chat"})]
+    assert _counter('analyze.cancelled') == cancelled + 1
+
+
+def test_current_request_emits_its_result(analyze):
+    run, emitted, _ = analyze
+
+    run(lambda on_thought, should_cancel, requests: _result(["Reading the chat"]))
+
+    assert [event for event, _ in emitted] == ['thought_update', 'thought_update', 'suggestion_ready']
+    assert emitted[-1][1]['actions'] == [{'id': 'reply'}]
@@ -0,0 +1,94 @@
+import io
+import os
+import threading
+import time
+
+from app.helpers.artifact_store import ArtifactStore
+from app.helpers.worker_pool import FairWorkerPool
+
+HOUR = 3600
+
+
+def _store(tmp_path, **options):
+    options.setdefault("max_bytes", 10 * 1024 * 1024)
+    options.setdefault("max_age_seconds", HOUR)
+    return ArtifactStore(str(tmp_path / "uploads"), **options)
+
+
+def _age(path, seconds):
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def _stored_files(store):
+    return sorted(name for _, _, names in os.walk(store.root) for name in names)
+
+
+def test_identical_content_is_stored_once(tmp_path):
+    store = _store(tmp_path)
+
+    digest, path = store.put(b"hello audio", ".wav")
+    _age(path, 600)
+    same_digest, same_path = store.put(io.BytesIO(b"hello audio"), ".wav")
+
+    assert (same_digest, same_path) == (digest, path)
+    assert path == store.path(digest, ".wav")
+    assert _stored_files(store) == [digest + ".wav"]
+    # Storing it again counts as recent use
+    assert time.time() - os.path.getmtime(path) < 60
+
+
+def test_files_past_the_age_limit_are_evicted(tmp_path):
+    store = _store(tmp_path, max_age_seconds=HOUR)
+    _, old = store.put(b"old recording")
+    _, fresh = store.put(b"fresh recording")
+    _age(old, 2 * HOUR)
+
+    assert store.evict() == 1
+    assert not os.path.exists(old)
+    assert os.path.exists(fresh)
+
+
+def test_oldest_files_go_first_when_over_the_size_limit(tmp_path):
+    store = _store(tmp_path, max_bytes=250)
+    paths = []
+    for i in range(3):
+        _, path = store.put(bytes([i]) * 100)
+        _age(path, 300 - i * 100)
+        paths.append(path)
+    # The put that went over the limit already swept (inline, as there is no pool)
+    store.evict()
+
+    assert [os.path.exists(path) for path in paths] == [False, True, True]
+    assert sum(os.path.getsize(path) for path in paths[1:]) <= store.max_bytes
+
+
+def test_incoming_temp_files_are_left_alone(tmp_path):
+    store = _store(tmp_path, max_age_seconds=HOUR)
+    store.put(b"content")
+    incoming = os.path.join(store.root, ".incoming-partial")
+    with open(incoming, "wb") as partial:
+        partial.write(b"still being written")
+    _age(incoming, 2 * HOUR)
+
+    store.evict()
+
+    assert os.path.exists(incoming)
+
+
+def test_sweeps_run_on_the_pool(tmp_path):
+    pool = FairWorkerPool("artifact-test", max_workers=1)
+    store = _store(tmp_path, pool=pool)
+    swept = threading.Event()
+    sweep_threads = []
+
+    def evict():
+        sweep_threads.append(threading.current_thread().name)
+        swept.set()
+        return 0
+
+    store.evict = evict
+    store.put(b"first upload triggers the initial sweep")
+
+    assert swept.wait(5)
+    assert sweep_threads == ["artifact-test-0"]
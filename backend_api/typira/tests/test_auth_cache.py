@@ -0,0 +1,96 @@
+import datetime
+
+from app import db
+from app.helpers import auth_cache as auth_cache_module
+from app.helpers.auth_cache import AuthCache, BloomFilter, token_digest
+from app.models.blacklisted_tokens import BlacklistToken
+
+
+def _blacklist(tokens):
+    expires_at = datetime.datetime.utcnow() + datetime.timedelta(days=1)
+    for token in tokens:
+        db.session.add(BlacklistToken(token=token, expires_at=expires_at))
+    db.session.commit()
+
+
+def _small_cache(monkeypatch, capacity):
+    monkeypatch.setattr(auth_cache_module, "AUTH_BLOOM_CAPACITY", capacity)
+    cache = AuthCache()
+    cache._bloom = BloomFilter(capacity)
+    return cache
+
+
+def test_sync_past_capacity_keeps_every_token(app, monkeypatch):
+    cache = _small_cache(monkeypatch, 10)
+    tokens = [f"token-{i}" for i in range(15)]
+    _blacklist(tokens)
+
+    assert all(cache.is_blacklisted(token, token_digest(token)) for token in tokens)
+
+    # A forced re-sync must not lose anything either
+    cache._next_sync = 0
+    assert all(cache.is_blacklisted(token, token_digest(token)) for token in tokens)
+    assert cache._bloom.capacity >= 30
+
+
+def test_incremental_sync_that_overflows_rebuilds(app, monkeypatch):
+    cache = _small_cache(monkeypatch, 10)
+    first = [f"first-{i}" for i in range(8)]
+    _blacklist(first)
+    assert cache.is_blacklisted(first[0], token_digest(first[0]))
+
+    second = [f"second-{i}" for i in range(8)]
+    _blacklist(second)
+    cache._next_sync = 0
+    assert all(cache.is_blacklisted(token, token_digest(token)) for token in first + second)
+
+
+def test_revoke_past_capacity_keeps_every_token(app, monkeypatch):
+    cache = _small_cache(monkeypatch, 10)
+    tokens = [f"token-{i}" for i in range(15)]
+    for token in tokens:
+        _blacklist([token])
+        cache.revoke(token_digest(token))
+
+    assert all(cache.is_blacklisted(token, token_digest(token)) for token in tokens)
+
+
+def test_unlisted_token_is_not_blacklisted(app):
+    cache = AuthCache()
+    _blacklist(["revoked"])
+    assert cache.is_blacklisted("revoked", token_digest("revoked"))
+    assert not cache.is_blacklisted("valid", token_digest("valid"))
+
+
+def test_zero_sync_interval_sees_other_process_logout_at_once(app, monkeypatch):
+    monkeypatch.setattr(auth_cache_module, "AUTH_BLACKLIST_SYNC_SECONDS", 0)
+    cache = AuthCache()
+    digest = token_digest("shared-token")
+    cache.put(digest, 1, 4102444800)
+    assert cache.get(digest) == (1, 4102444800)
+
+    # Logout handled by another process: only the row exists, this cache was not told
+    _blacklist(["shared-token"])
+    assert cache.get(digest) is None
+    assert cache.is_blacklisted("shared-token", digest)
+
+
+def test_concurrent_logouts_of_one_token_both_succeed(app, monkeypatch):
+    from app.business.auth_business import AuthBusiness
+    from app.models import User
+
+    user = User(public_id="u-1", email="u1@example.com")
+    db.session.add(user)
+    db.session.commit()
+    token = user.encode_auth_token(user.public_id)['token']
+    assert AuthBusiness.logout_user(token)['status'] == 1
+
+    # The second request checked the blacklist before the first one committed
+    monkeypatch.setattr(BlacklistToken, "check_blacklist", staticmethod(lambda auth_token: False))
+    response = AuthBusiness.logout_user(token)
+
+    monkeypatch.undo()
+
+    assert response == {'status': 1, 'message': 'Successfully logged out.'}
+    assert BlacklistToken.query.filter_by(token_digest=token_digest(token)).count() == 1
+    assert auth_cache_module.auth_cache.is_blacklisted(token, token_digest(token))
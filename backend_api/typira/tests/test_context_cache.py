@@ -0,0 +1,38 @@
+"""ContextBusiness snapshot cache: invalidation bookkeeping stays bounded and race-safe."""
+from collections import OrderedDict
+
+import pytest
+
+from app.business import context_business
+from app.business.context_business import ContextBusiness
+
+
+@pytest.fixture
+def small_cache(monkeypatch):
+    monkeypatch.setattr(context_business, "CONTEXT_CACHE_MAX_USERS", 3)
+    monkeypatch.setattr(ContextBusiness, "_cache", OrderedDict())
+    monkeypatch.setattr(ContextBusiness, "_versions", OrderedDict())
+    monkeypatch.setattr(ContextBusiness, "_version_clock", 0)
+    monkeypatch.setattr(ContextBusiness, "_version_floor", 0)
+
+
+def test_versions_are_bounded(small_cache):
+    for user_id in range(100):
+        ContextBusiness.invalidate(user_id)
+
+    assert len(ContextBusiness._versions) == 3
+
+
+def test_invalidation_during_load_is_not_cached_after_pruning(small_cache, monkeypatch):
+    def load_while_written_to(user_id):
+        # A write for this user lands mid-load, then enough other users are
+        # invalidated that its version entry is pruned again
+        ContextBusiness.invalidate(user_id)
+        for other in range(100, 110):
+            ContextBusiness.invalidate(other)
+        return {'history': [], 'memories': [], 'actions': []}
+
+    monkeypatch.setattr(ContextBusiness, "_load_snapshot", staticmethod(load_while_written_to))
+    ContextBusiness.get_snapshot(1)
+
+    assert 1 not in ContextBusiness._cache
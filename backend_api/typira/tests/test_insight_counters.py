@@ -0,0 +1,105 @@
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import db
+from app.helpers.insight_helpers import increment_user_stats, insight_buffer, overlay_pending_stats, write_user_stats
+from app.models.insights import UserInsight, UserActivityHistory
+from tests.conftest import make_app
+
+INCREMENTS = 1000
+
+
+@pytest.fixture
+def file_app(tmp_path):
+    # A file database so every thread gets its own connection; SQLite serialises the writers
+    flask_app = make_app(f"sqlite:///{tmp_path / 'insights.db'}", connect_args={"timeout": 30})
+    with flask_app.app_context():
+        db.create_all()
+    yield flask_app
+    with flask_app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_parallel_upserts_lose_no_increments(file_app):
+    today = datetime.date.today()
+
+    def increment(_):
+        with file_app.app_context():
+            write_user_stats(1, {
+                'increments': {'time_saved_minutes': 1, 'words_polished': 2, 'voice_count': 1},
+                'assignments': {'last_updated': datetime.datetime.utcnow()},
+                'daily': {today: 1},
+            })
+            db.session.commit()
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(increment, range(INCREMENTS)))
+
+    with file_app.app_context():
+        insight = UserInsight.query.filter_by(user_id=1).one()
+        assert insight.time_saved_minutes == INCREMENTS
+        assert insight.words_polished == 2 * INCREMENTS
+        assert insight.voice_count == INCREMENTS
+        history = UserActivityHistory.query.filter_by(user_id=1, date=today).one()
+        assert history.time_saved_minutes == INCREMENTS
+
+
+def test_parallel_buffered_increments_are_exact(file_app, monkeypatch):
+    monkeypatch.setattr(insight_buffer, "app", file_app)
+    monkeypatch.setattr(insight_buffer, "max_pending", INCREMENTS * 10)
+
+    def increment(i):
+        user_id = 1 + i % 4
+        increment_user_stats(user_id, minutes=1, words=3, interaction_mode='text')
+        if i % 100 == 0:
+            insight_buffer.flush()
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(increment, range(INCREMENTS)))
+    insight_buffer.flush()
+
+    with file_app.app_context():
+        rows = UserInsight.query.all()
+        assert sum(row.time_saved_minutes for row in rows) == INCREMENTS
+        assert sum(row.words_polished for row in rows) == 3 * INCREMENTS
+        assert sum(row.text_count for row in rows) == INCREMENTS
+        assert all(row.time_saved_minutes == INCREMENTS // 4 for row in rows)
+
+
+def test_stats_overlay_includes_a_flush_in_progress(file_app, monkeypatch):
+    monkeypatch.setattr(insight_buffer, "app", file_app)
+    writing, release = threading.Event(), threading.Event()
+    original_write = insight_buffer.write
+
+    def slow_write(batch):
+        writing.set()
+        release.wait(5)
+        original_write(batch)
+
+    monkeypatch.setattr(insight_buffer, "write", slow_write)
+    increment_user_stats(1, minutes=2, words=5, interaction_mode='voice')
+    flusher = threading.Thread(target=insight_buffer.flush)
+    flusher.start()
+    try:
+        assert writing.wait(5)
+        increment_user_stats(1, minutes=1, words=1)
+
+        insight, history_map = UserInsight(user_id=1, time_saved_minutes=0, words_polished=0, voice_count=0), {}
+        with file_app.app_context():
+            overlay_pending_stats(1, insight, history_map)
+        assert insight.time_saved_minutes == 3
+        assert insight.words_polished == 6
+        assert insight.voice_count == 1
+        assert history_map == {datetime.date.today(): 3}
+    finally:
+        release.set()
+        flusher.join()
+    insight_buffer.flush()
+
+    assert insight_buffer.peek(1) is None
+    with file_app.app_context():
+        assert UserInsight.query.filter_by(user_id=1).one().words_polished == 6
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from app.helpers.json_stream import JsonArrayStreamParser
+
+
+def _feed(text, size):
+    parser = JsonArrayStreamParser("thoughts")
+    elements = []
+    for start in range(0, len(text), size):
+        elements.extend(parser.feed(text[start:start + size]))
+    return elements, parser
+
+
+def _every_split(text):
+    """The elements produced for every way of cutting `text` into two chunks."""
+    for cut in range(len(text) + 1):
+        parser = JsonArrayStreamParser("thoughts")
+        yield cut, parser.feed(text[:cut]) + parser.feed(text[cut:])
+
+
+ESCAPES = r'{"thoughts": ["He said \"hi\"", "back\\slash\\", "café 😀", "caf\u00e9 \ud83d\ude00", "tab\tand\nnewline", "\\\""]}'
+NESTED = ('{"thoughts": [{"step": 1, "tags": ["a", {"b": [1, 2]}]}, [1, [2, 3]], {}, [], '
+          '42, -1.5e3, true, null, "last"]}')
+BRACKETS = '{"thoughts": ["[not] {an} array", "]", "}{", "a, b", "\\"]"], "note": "]}"}'
+
+
+def test_elements_are_returned_as_soon_as_complete():
+    parser = JsonArrayStreamParser("thoughts")
+
+    assert parser.feed('{"thoughts": ["Reading') == []
+    assert parser.feed(' the chat"') == ["Reading the chat"]
+    assert parser.feed(', {"step": 2') == []
+    assert parser.feed('}') == [{"step": 2}]
+    assert parser.feed('], "final_thought": "Done."}') == []
+    assert json.loads(parser.text)["final_thought"] == "Done."
+
+
+@pytest.mark.parametrize("document", [ESCAPES, NESTED, BRACKETS], ids=["escapes", "nested", "brackets"])
+def test_any_chunking_gives_the_parsed_array(document):
+    expected = json.loads(document)["thoughts"]
+
+    for size in (1, 2, 3, 7, len(document)):
+        assert _feed(document, size)[0] == expected
+    for cut, elements in _every_split(document):
+        assert elements == expected, f"split at {cut}: {document[:cut]!r} | {document[cut:]!r}"
+
+
+def test_thoughts_after_other_keys():
+    document = json.dumps({
+        "title": "thoughts",
+        "actions": [{"id": "reply", "thoughts": ["decoy"]}],
+        "meta": {"thoughts": ["decoy"], "nested": [["thoughts"]]},
+        "thoughts": ["real one", {"step": "two"}],
+        "final_thought": "Done.",
+    })
+
+    assert _feed(document, 1)[0] == ["real one", {"step": "two"}]
+    assert _feed(document, len(document))[0] == ["real one", {"step": "two"}]
+
+
+def test_leading_text_before_the_object_is_ignored():
+    assert _feed('```json\n{"thoughts": ["a", "b"]}\n```', 4)[0] == ["a", "b"]
+
+
+@pytest.mark.parametrize("truncated, expected", [
+    ('{"thoughts": ["one", "tw', ["one"]),
+    ('{"thoughts": ["one", "esc\\', ["one"]),
+    ('{"thoughts": ["one", {"a": [1, 2', ["one"]),
+    ('{"thoughts": [1, 2', [1]),
+    ('{"thoughts": [', []),
+    ('{"title": "x", "thou', []),
+])
+def test_stream_ending_before_the_array_closes(truncated, expected):
+    elements, parser = _feed(truncated, 1)
+
+    assert elements == expected
+    assert parser.text == truncated
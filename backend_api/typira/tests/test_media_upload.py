@@ -0,0 +1,198 @@
+import types
+
+import pytest
+
+from app.helpers import media_upload as media_upload_module
+from app.helpers.media_upload import MediaUploads, UploadError
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(media_upload_module, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def _uploads(**options):
+    options.setdefault("max_bytes", 1000)
+    options.setdefault("chunk_bytes", 100)
+    return MediaUploads(**options)
+
+
+def test_chunks_are_reassembled_in_order(clock):
+    uploads = _uploads()
+    upload_id = uploads.begin(1, "sid-1", "image", 10, "image/png", meta={'platform': 'android'})
+
+    assert uploads.chunk(1, upload_id, b"hello", offset=0) == 5
+    assert uploads.chunk(1, upload_id, memoryview(b"world"), offset=5) == 10
+    upload = uploads.commit(1, upload_id)
+
+    assert bytes(upload.buffer) == b"helloworld"
+    assert upload.buffer.readonly
+    assert (upload.kind, upload.mime_type, upload.meta) == ("image", "image/png", {'platform': 'android'})
+    # Committed uploads are gone
+    with pytest.raises(UploadError):
+        uploads.commit(1, upload_id)
+
+
+def test_out_of_order_offsets_are_rejected(clock):
+    uploads = _uploads()
+    upload_id = uploads.begin(1, "sid-1", "image", 10, "image/png")
+    uploads.chunk(1, upload_id, b"hello", offset=0)
+
+    with pytest.raises(UploadError, match="expected offset 5"):
+        uploads.chunk(1, upload_id, b"world", offset=6)
+    with pytest.raises(UploadError, match="expected offset 5"):
+        uploads.chunk(1, upload_id, b"hello", offset=0)
+    # Nothing was written by the rejected chunks
+    assert uploads.chunk(1, upload_id, b"world", offset=5) == 10
+
+
+def test_chunks_past_the_announced_size_are_rejected(clock):
+    uploads = _uploads()
+    upload_id = uploads.begin(1, "sid-1", "voice", 8, "audio/m4a")
+    uploads.chunk(1, upload_id, b"12345")
+
+    with pytest.raises(UploadError, match="past the announced size"):
+        uploads.chunk(1, upload_id, b"6789")
+    with pytest.raises(UploadError, match="incomplete upload: 5/8"):
+        uploads.commit(1, upload_id)
+
+
+def test_oversized_chunks_and_bad_sizes_are_rejected(clock):
+    uploads = _uploads(chunk_bytes=4)
+    upload_id = uploads.begin(1, "sid-1", "voice", 8, "audio/m4a")
+
+    with pytest.raises(UploadError, match="limited to 4 bytes"):
+        uploads.chunk(1, upload_id, b"12345")
+    with pytest.raises(UploadError, match="must be binary"):
+        uploads.chunk(1, upload_id, "1234")
+    for size in (0, -1, "10", None):
+        with pytest.raises(UploadError, match="positive"):
+            uploads.begin(1, "sid-1", "voice", size, "audio/m4a")
+
+
+def test_open_uploads_share_a_per_user_cap(clock):
+    uploads = _uploads(max_bytes=1000)
+    first = uploads.begin(1, "sid-1", "image", 600, "image/png")
+
+    with pytest.raises(UploadError, match="1000 byte limit"):
+        uploads.begin(1, "sid-1", "image", 401, "image/png")
+    # Other users have their own allowance
+    uploads.begin(2, "sid-2", "image", 1000, "image/png")
+    # Space comes back once an upload is aborted (or committed)
+    uploads.begin(1, "sid-1", "image", 400, "image/png")
+    uploads.abort(1, first)
+    uploads.begin(1, "sid-1", "image", 600, "image/png")
+
+
+def test_upload_ids_are_unique_per_user(clock):
+    uploads = _uploads()
+    uploads.begin(1, "sid-1", "image", 10, "image/png", upload_id="retry-7")
+
+    with pytest.raises(UploadError, match="already in use"):
+        uploads.begin(1, "sid-1", "image", 10, "image/png", upload_id="retry-7")
+    uploads.begin(2, "sid-2", "image", 10, "image/png", upload_id="retry-7")
+    # Another user cannot write into it
+    with pytest.raises(UploadError, match="unknown"):
+        uploads.chunk(3, "retry-7", b"x")
+
+
+def test_idle_uploads_expire_after_the_ttl(clock, monkeypatch):
+    monkeypatch.setattr(media_upload_module, "MEDIA_UPLOAD_TTL_SECONDS", 120)
+    uploads = _uploads(max_bytes=100)
+    upload_id = uploads.begin(1, "sid-1", "image", 100, "image/png")
+
+    clock[0] += 119
+    uploads.chunk(1, upload_id, b"x" * 50)
+    # Every chunk renews the deadline
+    clock[0] += 119
+    uploads.chunk(1, upload_id, b"x" * 25)
+    clock[0] += 120
+
+    with pytest.raises(UploadError, match="expired"):
+        uploads.chunk(1, upload_id, b"x" * 25)
+    # Its reservation no longer counts against the cap
+    uploads.begin(1, "sid-1", "image", 100, "image/png")
+
+
+def test_expired_uploads_are_dropped_on_begin(clock, monkeypatch):
+    monkeypatch.setattr(media_upload_module, "MEDIA_UPLOAD_TTL_SECONDS", 120)
+    uploads = _uploads(max_bytes=100)
+    uploads.begin(1, "sid-1", "image", 100, "image/png")
+
+    clock[0] += 120
+
+    uploads.begin(1, "sid-1", "image", 100, "image/png")
+
+
+def test_forget_sid_drops_only_that_sockets_uploads(clock):
+    uploads = _uploads()
+    gone = uploads.begin(1, "sid-1", "image", 10, "image/png")
+    other_socket = uploads.begin(1, "sid-2", "image", 10, "image/png")
+
+    uploads.forget_sid("sid-1")
+
+    with pytest.raises(UploadError, match="unknown"):
+        uploads.chunk(1, gone, b"x")
+    assert uploads.chunk(1, other_socket, b"x") == 1
+
+
+@pytest.fixture
+def home_client(monkeypatch):
+    pytest.importorskip("google.genai")
+    import config
+    from app import create_app, db, socketio
+    from app import socket_endpoints  # noqa: F401  (registers the /home handlers)
+    from app.models import User
+
+    monkeypatch.delenv("TYPIRA_ROLE", raising=False)
+    monkeypatch.setattr(config.DevelopmentConfig, "SQLALCHEMY_DATABASE_URI", "sqlite://")
+    flask_app = create_app("dev")
+    with flask_app.app_context():
+        db.create_all()
+        user = User(public_id="u-1", email="u1@example.com")
+        db.session.add(user)
+        db.session.commit()
+        token = user.encode_auth_token(user.public_id)['token']
+        client = socketio.test_client(flask_app, namespace='/home', headers={'Authorization': f"Bearer {token}"})
+        yield client, user.id
+        client.disconnect(namespace='/home')
+        db.session.remove()
+        db.drop_all()
+
+
+def test_commit_is_acked_before_the_analysis_runs(home_client, monkeypatch):
+    from flask_socketio import emit
+    from app import socketio
+    from app import socket_endpoints
+
+    client, user_id = home_client
+    analyzed = []
+
+    def analyze(user_id, data, mime_type, platform):
+        analyzed.append((user_id, bytes(data), mime_type, platform))
+        emit('priority_task', {'title': "Reply to Sam"}, namespace='/home')
+
+    monkeypatch.setitem(socket_endpoints.MEDIA_ANALYZERS, 'image', (analyze, 'image/jpeg'))
+    begun = client.emit('upload_begin', {'kind': 'image', 'size': 5, 'platform': 'ios'},
+                        namespace='/home', callback=True)
+    client.emit('upload_chunk', {'upload_id': begun['upload_id'], 'offset': 0, 'data': b"image"},
+                namespace='/home', callback=True)
+
+    ack = client.emit('upload_commit', {'upload_id': begun['upload_id']}, namespace='/home', callback=True)
+
+    assert ack == {'status': 'ok'}
+    assert analyzed == []
+    socketio.sleep(0.05)
+    assert analyzed == [(user_id, b"image", 'image/jpeg', 'ios')]
+    received = [packet for packet in client.get_received('/home') if packet['name'] == 'priority_task']
+    assert [packet['args'][0] for packet in received] == [{'title': "Reply to Sam"}]
+
+
+def test_failed_commit_is_acked_with_the_error(home_client):
+    client, _ = home_client
+
+    ack = client.emit('upload_commit', {'upload_id': "missing"}, namespace='/home', callback=True)
+
+    assert ack == {'error': "unknown or expired upload"}
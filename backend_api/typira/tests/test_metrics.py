@@ -0,0 +1,50 @@
+import pytest
+
+pytest.importorskip("google.genai")
+
+import config
+from app import create_app, db
+from app.helpers.metrics import metrics
+from app.models import User
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.delenv("TYPIRA_ROLE", raising=False)
+    monkeypatch.setattr(config.DevelopmentConfig, "SQLALCHEMY_DATABASE_URI", "sqlite://")
+    app = create_app("dev")
+    with app.app_context():
+        db.create_all()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+
+def test_metrics_endpoint_serves_the_process_snapshot(client):
+    user = User(public_id="u-1", email="u1@example.com")
+    db.session.add(user)
+    db.session.commit()
+    token = user.encode_auth_token(user.public_id)['token']
+    metrics.incr('analyze.coalesced')
+    metrics.observe('scheduler.dispatch_lag_seconds', 1.5)
+
+    response = client.get('/api/insights/metrics', headers={'Authorization': f'Bearer {token}'})
+
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['counters']['analyze.coalesced'] >= 1
+    assert data['observations']['scheduler.dispatch_lag_seconds']['max'] >= 1.5
+
+
+def test_metrics_endpoint_requires_a_token(client):
+    assert client.get('/api/insights/metrics').status_code == 401
+
+
+def test_metrics_log_prints_one_json_line(capsys):
+    metrics.incr('analyze.cancelled')
+
+    metrics.log()
+
+    line = capsys.readouterr().out.strip()
+    assert line.startswith("📈 [METRICS]")
+    assert '"analyze.cancelled":' in line
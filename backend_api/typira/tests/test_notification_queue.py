@@ -0,0 +1,189 @@
+import time
+
+import pytest
+
+from app import db
+from app.helpers.metrics import metrics
+from app.helpers.notification_queue import NotificationQueue
+from app.models import FCMTokens, User
+from tests.fake_messaging import FakeError, FakeMessaging, invalid_token, unregistered
+
+
+@pytest.fixture
+def fake():
+    return FakeMessaging()
+
+
+def _queue(fake, **options):
+    options.setdefault("linger", 0)
+    return NotificationQueue(messaging_api=fake, **options)
+
+
+def _retry_delays(queue):
+    now = time.monotonic()
+    return sorted(round(due - now) for due, _, _ in queue._delayed)
+
+
+def _make_retries_due(queue):
+    queue._delayed = [(0, seq, push) for _, seq, push in queue._delayed]
+
+
+def _failed_count():
+    return metrics.snapshot()["counters"].get("notifications.failed", 0)
+
+
+def _tokens(*tokens):
+    user = User(public_id="u-1", email="u1@example.com")
+    db.session.add(user)
+    db.session.flush()
+    db.session.add_all([FCMTokens(user.id, token) for token in tokens])
+    db.session.commit()
+
+
+def test_batches_are_capped_at_500(fake):
+    queue = _queue(fake, batch_size=1000)
+    queue.enqueue([f"token-{i}" for i in range(1200)], "Title", "Body", {"count": 1})
+
+    queue.drain()
+
+    assert [len(call) for call in fake.calls] == [500, 500, 200]
+    assert fake.calls[0][0] == "token-0"
+
+
+def test_retryable_errors_back_off_exponentially(fake):
+    queue = _queue(fake, max_retries=2, backoff=10)
+    fake.fail("a", *[FakeError("UNAVAILABLE")] * 3)
+    queue.enqueue(["a", "b"], "Title", "Body")
+    failed_before = _failed_count()
+
+    queue.drain()
+    assert fake.calls == [["a", "b"]]
+    assert _retry_delays(queue) == [10]
+
+    _make_retries_due(queue)
+    queue.drain()
+    assert fake.calls[1] == ["a"]
+    assert _retry_delays(queue) == [20]
+
+    # Third failure is past max_retries: dropped and counted
+    _make_retries_due(queue)
+    queue.drain()
+    assert fake.calls[2] == ["a"]
+    assert queue._delayed == []
+    assert _failed_count() == failed_before + 1
+
+
+def test_failed_send_each_call_is_retried(fake):
+    queue = _queue(fake, backoff=10)
+    outage = [ConnectionError("FCM unreachable")]
+
+    def on_send(tokens):
+        if outage:
+            raise outage.pop()
+
+    fake.on_send = on_send
+    queue.enqueue(["a", "b"], "Title", "Body")
+
+    queue.drain()
+    assert _retry_delays(queue) == [10, 10]
+
+    _make_retries_due(queue)
+    queue.drain()
+    assert fake.calls == [["a", "b"], ["a", "b"]]
+    assert queue._delayed == []
+
+
+def test_unregistered_and_invalid_tokens_are_pruned(app, fake):
+    _tokens("dead", "invalid", "too-big", "ok")
+    fake.fail("dead", unregistered())
+    fake.fail("invalid", invalid_token())
+    # INVALID_ARGUMENT about the message itself says nothing about the token
+    fake.fail("too-big", FakeError("INVALID_ARGUMENT", "Message is too big"))
+    queue = _queue(fake)
+    queue.app = app
+    queue.enqueue(["dead", "invalid", "too-big", "ok"], "Title", "Body")
+
+    queue.drain()
+
+    remaining = {token for (token,) in FCMTokens.query.with_entities(FCMTokens.token)}
+    assert remaining == {"too-big", "ok"}
+    assert queue._delayed == []
+
+
+def _broadcast_tokens(count):
+    _tokens(*[f"token-{i}" for i in range(count)])
+    return [token_id for (token_id,) in FCMTokens.query.with_entities(FCMTokens.id).order_by(FCMTokens.id)]
+
+
+def _sent_tokens(fake):
+    return [token for call in fake.calls for token in call]
+
+
+def test_broadcast_resumes_after_the_last_reported_chunk(app, fake):
+    ids = _broadcast_tokens(10)
+    queue = _queue(fake, batch_size=3)
+    queue.app = app
+    progress = []
+
+    def interrupt(report, chunk):
+        progress.append(report)
+        if len(progress) == 2:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        queue.broadcast("Title", "Body", on_progress=interrupt)
+    resume_after_id = progress[-1]['resume_after_id']
+    assert resume_after_id == ids[5]
+    delivered = set(_sent_tokens(fake))
+    fake.calls.clear()
+
+    report = queue.broadcast("Title", "Body", start_after_id=resume_after_id)
+
+    # Nothing after the resume point had been reported done, so it is all sent now
+    assert _sent_tokens(fake) == [f"token-{i}" for i in range(6, 10)]
+    assert delivered | set(_sent_tokens(fake)) == {f"token-{i}" for i in range(10)}
+    assert report['resume_after_id'] == ids[-1]
+    assert (report['sent'], report['chunks']) == (4, 2)
+
+
+def test_broadcast_bounds_the_chunks_in_flight(app, fake, monkeypatch):
+    from app.helpers import notification_queue as notification_queue_module
+
+    monkeypatch.setattr(notification_queue_module, "FCM_BROADCAST_CONCURRENCY", 3)
+    _broadcast_tokens(40)
+    fake.on_send = lambda tokens: time.sleep(0.05)
+    queue = _queue(fake, batch_size=2)
+    queue.app = app
+
+    report = queue.broadcast("Title", "Body")
+
+    assert fake.max_active == 3
+    assert (report['sent'], report['chunks']) == (40, 20)
+    assert sorted(_sent_tokens(fake)) == sorted(f"token-{i}" for i in range(40))
+
+
+def test_broadcast_reports_failures_per_chunk(app, fake):
+    _broadcast_tokens(9)
+    fake.fail("token-1", unregistered())
+    fake.fail("token-4", FakeError("INVALID_ARGUMENT", "Message is too big"))
+    fake.fail("token-5", *[FakeError("UNAVAILABLE")] * 3)
+    fake.fail("token-7", FakeError("UNAVAILABLE"))
+    queue = _queue(fake, batch_size=3, max_retries=2, backoff=0)
+    queue.app = app
+    chunks = []
+
+    report = queue.broadcast("Title", "Body", on_progress=lambda report, chunk: chunks.append(chunk))
+
+    assert chunks == [
+        {'sent': 2, 'failed': 0, 'dead': ["token-1"]},
+        # token-5 is still unavailable after max_retries
+        {'sent': 1, 'failed': 2, 'dead': []},
+        # token-7 went through on its retry
+        {'sent': 3, 'failed': 0, 'dead': []},
+    ]
+    attempts = _sent_tokens(fake)
+    assert (attempts.count("token-5"), attempts.count("token-7"), attempts.count("token-8")) == (3, 2, 1)
+    assert {key: report[key] for key in ('sent', 'failed', 'pruned', 'chunks', 'failed_chunks')} == \
+        {'sent': 6, 'failed': 2, 'pruned': 1, 'chunks': 3, 'failed_chunks': 1}
+    remaining = {token for (token,) in FCMTokens.query.with_entities(FCMTokens.token)}
+    assert "token-1" not in remaining and len(remaining) == 8
@@ -0,0 +1,160 @@
+"""
+The hot per-user queries must be served by the composite indexes on typing_history,
+memories and user_actions (EXPLAIN QUERY PLAN on SQLite), never by a table scan.
+
+Plans are taken on a seeded database (many users, a few very heavy ones) after
+ANALYZE, so the planner chooses with real statistics, and the SQL is captured
+from the code paths that run it.
+"""
+import datetime
+import random
+
+import pytest
+from sqlalchemy import event, text
+
+pytest.importorskip("google.genai")
+
+from app import db
+from app.api import blueprint
+from app.business.context_business import ContextBusiness
+from app.models import Memory, TypingHistory, User, UserAction
+from app.socket_endpoints import handled_action_ids
+from tests.conftest import make_app
+
+USERS = 400
+HEAVY_USERS = 5
+HEAVY_USER_ROWS = 3000
+APPS = ["com.example.mail", "com.example.chat", "com.example.notes", "com.example.browser", None]
+
+
+def _rows_for(user_id):
+    # Skewed like real usage: a few heavy typists, a long tail of light users
+    if user_id <= HEAVY_USERS:
+        return HEAVY_USER_ROWS
+    return max(1, int(400 / (user_id - HEAVY_USERS)))
+
+
+def _seed():
+    rng = random.Random(42)
+    now = datetime.datetime.utcnow()
+    users, history, memories, actions = [], [], [], []
+    for user_id in range(1, USERS + 1):
+        users.append({'id': user_id, 'public_id': f"u-{user_id}", 'email': f"u{user_id}@example.com"})
+        for i in range(_rows_for(user_id)):
+            when = now - datetime.timedelta(minutes=rng.randrange(90 * 24 * 60))
+            semantic_hash = format(rng.getrandbits(64), '016x')
+            history.append({'user_id': user_id, 'content': f"typed sentence {i}", 'semantic_hash': semantic_hash,
+                            'app_context': rng.choice(APPS), 'frequency': rng.randint(1, 5),
+                            'timestamp': when, 'date_updated': when,
+                            **TypingHistory.band_values(semantic_hash)})
+            if i % 10 == 0:
+                memories.append({'user_id': user_id, 'content': f"memory {i}", 'source_type': 'text',
+                                 'timestamp': when})
+            if i % 5 == 0:
+                actions.append({'user_id': user_id, 'action_id': f"action_{i % 40}",
+                                'decision': rng.choice(['approved', 'declined']), 'timestamp': when})
+
+    db.session.execute(User.__table__.insert(), users)
+    db.session.execute(TypingHistory.__table__.insert(), history)
+    db.session.execute(Memory.__table__.insert(), memories)
+    db.session.execute(UserAction.__table__.insert(), actions)
+    db.session.commit()
+    db.session.execute(text("ANALYZE"))
+    db.session.commit()
+
+
+@pytest.fixture(scope="module")
+def seeded_app(tmp_path_factory):
+    flask_app = make_app(f"sqlite:///{tmp_path_factory.mktemp('plans') / 'typira.db'}")
+    flask_app.register_blueprint(blueprint)
+    with flask_app.app_context():
+        db.create_all()
+        _seed()
+        yield flask_app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def captured_selects(seeded_app):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+    db.session.rollback()
+
+
+def _plan(statement, parameters):
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+    return " | ".join(row[-1] for row in rows)
+
+
+def _plans(statements, table=None):
+    return [_plan(statement, parameters) for statement, parameters in statements
+            if table is None or f"FROM {table}" in statement]
+
+
+def _assert_no_scans(plans):
+    for plan in plans:
+        for step in plan.split(" | "):
+            if step.startswith("SCAN ") and step.split()[1] in ("typing_history", "memories", "user_actions"):
+                assert "INDEX" in step, plan
+
+
+def test_statistics_are_loaded(seeded_app):
+    analyzed = {row[0] for row in db.session.execute(text("SELECT DISTINCT tbl FROM sqlite_stat1"))}
+    assert {"typing_history", "memories", "user_actions"} <= analyzed
+
+
+def test_prompt_context_uses_user_indexes(captured_selects):
+    ContextBusiness._load_snapshot(1)
+
+    plans = _plans(captured_selects)
+    assert len(plans) == 3
+    assert "ix_typing_history_user_updated" in plans[0]
+    assert "ix_memories_user_timestamp" in plans[1]
+    assert "ix_user_actions_user_timestamp" in plans[2]
+    _assert_no_scans(plans)
+
+
+def test_persist_typing_lookups_use_indexes(captured_selects):
+    entries = ContextBusiness.prepare_atoms(["Meeting moved to Thursday afternoon.", "Bring the quarterly report."])
+    ContextBusiness.persist_typing(1, "com.example.mail", entries, commit=False)
+
+    plans = _plans(captured_selects)
+    absorption, candidates = plans[0], plans[1]
+    assert "ix_typing_history_user_app_timestamp" in absorption
+    # Hash/band candidates: an index search on one of the per-user composites (which
+    # one depends on table statistics), never a scan of every user's history
+    assert "SEARCH typing_history USING INDEX ix_typing_history_user_" in candidates
+    _assert_no_scans(plans)
+
+
+def test_history_listing_uses_user_timestamp_index(seeded_app, captured_selects):
+    user = db.session.get(User, 1)
+    token = user.encode_auth_token(user.public_id)['token']
+
+    response = seeded_app.test_client().get('/api/memory/typing-history?page=3',
+                                            headers={'Authorization': f"Bearer {token}"})
+
+    assert response.status_code == 200
+    plans = _plans(captured_selects, "typing_history")
+    # The page itself plus the pagination count
+    assert len(plans) == 2
+    assert any("ix_typing_history_user_timestamp" in plan for plan in plans)
+    _assert_no_scans(plans)
+
+
+def test_excluded_actions_use_user_indexes(captured_selects):
+    handled_action_ids(1)
+
+    plans = _plans(captured_selects)
+    assert len(plans) == 1
+    assert "SEARCH user_actions USING INDEX ix_user_actions_user_" in plans[0]
+    _assert_no_scans(plans)
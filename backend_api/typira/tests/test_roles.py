@@ -0,0 +1,19 @@
+import pytest
+
+pytest.importorskip("google.genai")
+
+import config
+from app import create_app, scheduler, ROLE_CLI
+from app.helpers.insight_helpers import insight_buffer
+from app.helpers.notification_queue import notification_queue
+
+
+def test_cli_role_starts_no_background_services(monkeypatch):
+    monkeypatch.delenv("TYPIRA_ROLE", raising=False)
+    monkeypatch.setattr(config.DevelopmentConfig, "SQLALCHEMY_DATABASE_URI", "sqlite://")
+    app = create_app("dev")
+
+    assert app.config['ROLE'] == ROLE_CLI
+    assert not scheduler.running
+    assert insight_buffer.app is None
+    assert notification_queue.app is None
@@ -0,0 +1,131 @@
+import datetime
+
+import pytest
+
+pytest.importorskip("google.genai")
+
+from app import db
+from app.business import scheduler_business
+from app.business.scheduler_business import compute_next_run_utc
+from app.models import Schedule, User
+
+
+def _schedule(time="09:00", repeat="Everyday", timezone="UTC"):
+    return Schedule(id=1, title="Brief", time=time, date_or_repeat=repeat, timezone=timezone)
+
+
+def utc(*args):
+    return datetime.datetime(*args)
+
+
+@pytest.mark.parametrize("after, expected", [
+    (utc(2030, 1, 1, 8, 0), utc(2030, 1, 1, 9, 0)),
+    # Inclusive: a run due this very minute is still ahead
+    (utc(2030, 1, 1, 9, 0), utc(2030, 1, 1, 9, 0)),
+    (utc(2030, 1, 1, 9, 1), utc(2030, 1, 2, 9, 0)),
+    (utc(2030, 12, 31, 23, 59), utc(2031, 1, 1, 9, 0)),
+])
+def test_daily_in_utc(after, expected):
+    assert compute_next_run_utc(_schedule(), after) == expected
+
+
+def test_daily_keeps_local_time_across_dst():
+    schedule = _schedule(timezone="America/New_York")
+
+    # 09:00 EST is 14:00 UTC; from 10 March 2030 it is 09:00 EDT, 13:00 UTC
+    assert compute_next_run_utc(schedule, utc(2030, 3, 9, 15, 0)) == utc(2030, 3, 10, 13, 0)
+    # Back to EST on 3 November 2030
+    assert compute_next_run_utc(schedule, utc(2030, 11, 2, 14, 0)) == utc(2030, 11, 3, 14, 0)
+
+
+def test_runs_in_the_dst_gap_and_overlap_happen_once():
+    # 02:30 does not exist on 10 March 2030 in New York; it runs at 03:30 EDT
+    gap = _schedule(time="02:30", timezone="America/New_York")
+    assert compute_next_run_utc(gap, utc(2030, 3, 10, 0, 0)) == utc(2030, 3, 10, 7, 30)
+    assert compute_next_run_utc(gap, utc(2030, 3, 10, 7, 31)) == utc(2030, 3, 11, 6, 30)
+
+    # 01:30 happens twice on 3 November 2030; only the second (EST) one runs
+    overlap = _schedule(time="01:30", timezone="America/New_York")
+    assert compute_next_run_utc(overlap, utc(2030, 11, 3, 4, 0)) == utc(2030, 11, 3, 6, 30)
+    assert compute_next_run_utc(overlap, utc(2030, 11, 3, 6, 31)) == utc(2030, 11, 4, 6, 30)
+
+
+@pytest.mark.parametrize("repeat, after, expected", [
+    # 1 January 2030 is a Tuesday
+    ("Tuesday", utc(2030, 1, 1, 8, 0), utc(2030, 1, 1, 9, 0)),
+    ("Tuesday", utc(2030, 1, 1, 9, 1), utc(2030, 1, 8, 9, 0)),
+    ("Monday", utc(2030, 1, 1, 8, 0), utc(2030, 1, 7, 9, 0)),
+    ("Sunday", utc(2030, 1, 1, 8, 0), utc(2030, 1, 6, 9, 0)),
+])
+def test_named_weekdays(repeat, after, expected):
+    assert compute_next_run_utc(_schedule(repeat=repeat), after) == expected
+
+
+def test_weekday_is_the_local_one():
+    # Monday 08:00 in Auckland (UTC+13 in January) is Sunday 19:00 UTC
+    auckland = _schedule(time="08:00", repeat="Monday", timezone="Pacific/Auckland")
+    assert compute_next_run_utc(auckland, utc(2030, 1, 6, 18, 0)) == utc(2030, 1, 6, 19, 0)
+
+    # Monday 20:00 in Los Angeles (UTC-8 in January) is Tuesday 04:00 UTC
+    los_angeles = _schedule(time="20:00", repeat="Monday", timezone="America/Los_Angeles")
+    assert compute_next_run_utc(los_angeles, utc(2030, 1, 8, 3, 0)) == utc(2030, 1, 8, 4, 0)
+    assert compute_next_run_utc(los_angeles, utc(2030, 1, 8, 4, 1)) == utc(2030, 1, 15, 4, 0)
+
+
+@pytest.mark.parametrize("timezone, expected", [
+    ("GMT+2", utc(2030, 1, 1, 7, 0)),
+    ("UTC+5", utc(2030, 1, 1, 4, 0)),
+    ("GMT-5", utc(2030, 1, 1, 14, 0)),
+    ("UTC-3", utc(2030, 1, 1, 12, 0)),
+    ("Asia/Kolkata", utc(2030, 1, 1, 3, 30)),
+    ("Not/AZone", utc(2030, 1, 1, 9, 0)),
+    (None, utc(2030, 1, 1, 9, 0)),
+])
+def test_offset_and_named_timezones(timezone, expected):
+    assert compute_next_run_utc(_schedule(timezone=timezone), utc(2030, 1, 1, 0, 0)) == expected
+
+
+def test_one_off_dates():
+    future = _schedule(time="18:45", repeat="2030-06-15", timezone="Europe/Paris")
+    # Paris is UTC+2 in June
+    assert compute_next_run_utc(future, utc(2030, 1, 1, 0, 0)) == utc(2030, 6, 15, 16, 45)
+    assert compute_next_run_utc(future, utc(2030, 6, 15, 16, 45)) == utc(2030, 6, 15, 16, 45)
+    # Once it has passed, it never runs again
+    assert compute_next_run_utc(future, utc(2030, 6, 15, 16, 46)) is None
+    assert compute_next_run_utc(_schedule(repeat="2020-01-01"), utc(2030, 1, 1, 0, 0)) is None
+
+
+@pytest.mark.parametrize("time, repeat", [
+    ("9am", "Everyday"),
+    ("25:00", "Everyday"),
+    (None, "Everyday"),
+    ("09:00", "Someday"),
+    ("09:00", "2030-02-30"),
+    ("09:00", None),
+])
+def test_unparseable_schedules_never_run(time, repeat):
+    assert compute_next_run_utc(_schedule(time=time, repeat=repeat), utc(2030, 1, 1, 0, 0)) is None
+
+
+def test_missed_runs_are_caught_up_once(app, monkeypatch):
+    user = User(public_id="u-1", email="u1@example.com")
+    db.session.add(user)
+    db.session.flush()
+    daily = _schedule(timezone="America/New_York")
+    daily.id, daily.user_id, daily.next_run_utc = None, user.id, utc(2030, 1, 1, 14, 0)
+    one_off = _schedule(repeat="2030-01-01")
+    one_off.id, one_off.user_id, one_off.next_run_utc = None, user.id, utc(2030, 1, 1, 9, 0)
+    db.session.add_all([daily, one_off])
+    db.session.commit()
+    submitted = []
+    monkeypatch.setattr(scheduler_business.schedule_pool, "submit",
+                        lambda fn, app, schedule_id, due_at, prepared, key: submitted.append((schedule_id, due_at)))
+
+    # The dispatcher was down from 09:00 until 14:07 UTC
+    scheduler_business._dispatch_due(app, utc(2030, 1, 1, 14, 7, 30))
+    scheduler_business._dispatch_due(app, utc(2030, 1, 1, 14, 8, 0))
+
+    assert submitted == [(one_off.id, utc(2030, 1, 1, 9, 0)), (daily.id, utc(2030, 1, 1, 14, 0))]
+    db.session.expire_all()
+    assert db.session.get(Schedule, daily.id).next_run_utc == utc(2030, 1, 2, 14, 0)
+    assert db.session.get(Schedule, one_off.id).next_run_utc is None
@@ -0,0 +1,99 @@
+"""
+Several dispatcher processes against one database: only the lease holder dispatches,
+and every due schedule runs exactly once.
+"""
+import datetime
+import multiprocessing
+import time
+
+import pytest
+
+pytest.importorskip("google.genai")
+
+from app import db
+from app.business import scheduler_business
+from app.models import Schedule, SchedulerLease, User
+from tests.conftest import make_app
+
+PROCESSES = 4
+TICKS = 3
+SCHEDULES = 30
+
+
+def _dispatcher_process(uri, runs_path, start, results):
+    """One worker process: a few scheduler ticks with process_schedule recording instead of sending."""
+    app = make_app(uri, connect_args={"timeout": 30})
+    holder = scheduler_business.LEASE_HOLDER
+    acquired = []
+
+    def process_schedule(app, schedule_id, due_at, prepared=None):
+        with open(runs_path, "a") as runs:
+            runs.write(f"{holder} {schedule_id} {due_at.isoformat()}\n")
+
+    original_acquire = SchedulerLease.acquire
+
+    def acquire(name, lease_holder, ttl_seconds):
+        owned = original_acquire(name, lease_holder, ttl_seconds)
+        acquired.append(owned)
+        return owned
+
+    scheduler_business.process_schedule = process_schedule
+    SchedulerLease.acquire = staticmethod(acquire)
+
+    start.wait()
+    for _ in range(TICKS):
+        scheduler_business.dispatch_due_schedules(app)
+    while any(scheduler_business.schedule_pool.stats()[field] for field in ("busy", "queued")):
+        time.sleep(0.01)
+    results.put((holder, any(acquired)))
+
+
+@pytest.fixture
+def shared_db(tmp_path):
+    uri = f"sqlite:///{tmp_path / 'scheduler.db'}"
+    flask_app = make_app(uri)
+    due_at = datetime.datetime.utcnow().replace(second=0, microsecond=0) - datetime.timedelta(minutes=1)
+    with flask_app.app_context():
+        db.create_all()
+        user = User(public_id="u-1", email="u1@example.com")
+        db.session.add(user)
+        db.session.flush()
+        db.session.add_all([
+            Schedule(user_id=user.id, title=f"Brief {i}", date_or_repeat="Everyday", time="09:00",
+                     timezone="UTC", next_run_utc=due_at)
+            for i in range(SCHEDULES)
+        ])
+        db.session.commit()
+        db.engine.dispose()
+    return uri, flask_app
+
+
+def test_one_lease_holder_runs_each_due_schedule_once(shared_db, tmp_path):
+    uri, flask_app = shared_db
+    runs_path = tmp_path / "runs.txt"
+    runs_path.touch()
+
+    # Fresh interpreters, so each process gets its own LEASE_HOLDER like separate workers
+    context = multiprocessing.get_context("spawn")
+    start, results = context.Event(), context.Queue()
+    processes = [context.Process(target=_dispatcher_process, args=(uri, str(runs_path), start, results))
+                 for _ in range(PROCESSES)]
+    for process in processes:
+        process.start()
+    start.set()
+    outcomes = [results.get(timeout=60) for _ in processes]
+    for process in processes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+
+    holders = {holder for holder, owned in outcomes if owned}
+    assert len({holder for holder, _ in outcomes}) == PROCESSES
+    assert len(holders) == 1
+
+    runs = [line.split() for line in runs_path.read_text().splitlines()]
+    assert sorted(int(schedule_id) for _, schedule_id, _ in runs) == list(range(1, SCHEDULES + 1))
+    assert {holder for holder, _, _ in runs} == holders
+
+    with flask_app.app_context():
+        assert db.session.get(SchedulerLease, scheduler_business.DISPATCHER_LEASE).holder in holders
+        assert Schedule.query.filter(Schedule.next_run_utc <= datetime.datetime.utcnow()).count() == 0
@@ -0,0 +1,58 @@
+import datetime
+import json
+
+import pytest
+
+pytest.importorskip("google.genai")
+
+from app import db
+from app.business import scheduler_business
+from app.models import Schedule, User
+
+FALLBACK = {"title": "Scheduled Helper", "short_description": "fallback", "full_formatted_result": "fallback"}
+
+
+def _schedule(due_at):
+    user = User(public_id="u-1", email="u1@example.com")
+    db.session.add(user)
+    db.session.flush()
+    schedule = Schedule(user_id=user.id, title="Brief", date_or_repeat="Everyday", time="09:00",
+                        timezone="UTC", next_run_utc=due_at)
+    db.session.add(schedule)
+    db.session.commit()
+    return schedule.id
+
+
+def _fake_insight(fails):
+    def generate_scheduled_insight(*args, raise_errors=False, **kwargs):
+        if fails:
+            if raise_errors:
+                raise RuntimeError("Gemini unavailable")
+            return dict(FALLBACK)
+        return {"title": "Real", "short_description": "real", "full_formatted_result": "real"}
+    return generate_scheduled_insight
+
+
+def test_failed_precompute_leaves_nothing_prepared(app, monkeypatch):
+    due_at = datetime.datetime(2030, 1, 1, 9, 0)
+    schedule_id = _schedule(due_at)
+    monkeypatch.setattr(scheduler_business.GeminiBusiness, "generate_scheduled_insight", _fake_insight(True))
+
+    scheduler_business.prepare_schedule(app, schedule_id, due_at)
+
+    schedule = db.session.get(Schedule, schedule_id)
+    assert schedule.prepared_for_utc is None
+    assert schedule.prepared_payload is None
+
+
+def test_successful_precompute_is_stored(app, monkeypatch):
+    due_at = datetime.datetime(2030, 1, 1, 9, 0)
+    schedule_id = _schedule(due_at)
+    monkeypatch.setattr(scheduler_business.GeminiBusiness, "generate_scheduled_insight", _fake_insight(False))
+
+    scheduler_business.prepare_schedule(app, schedule_id, due_at)
+
+    db.session.expire_all()
+    schedule = db.session.get(Schedule, schedule_id)
+    assert schedule.prepared_for_utc == due_at
+    assert json.loads(schedule.prepared_payload)["title"] == "Real"
@@ -0,0 +1,118 @@
+import io
+import types
+
+import pytest
+from PIL import Image, ImageDraw
+
+from app.helpers import image_processing, vision_cache as vision_cache_module
+from app.helpers.image_processing import prepare_image
+from app.helpers.vision_cache import VisionCache
+
+ANALYSIS = {'title': "Inbox", 'plan': "Reply to Sam", 'insights': {'focus_score': 80}}
+
+
+def _screenshot(message, fmt="PNG"):
+    """A chat app screenshot: same layout every time, only the message text differs."""
+    image = Image.new("RGB", (720, 1280), "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, 720, 120), fill=(33, 150, 243))
+    draw.rectangle((40, 300, 680, 420), fill=(230, 230, 230))
+    draw.text((60, 340), message, fill="black")
+    out = io.BytesIO()
+    image.save(out, format=fmt)
+    return out.getvalue()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(vision_cache_module, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def _fingerprint(message):
+    return prepare_image(_screenshot(message), "image/png")[2]
+
+
+def test_one_decode_gives_the_jpeg_and_its_fingerprint(monkeypatch):
+    opened = []
+    original_open = image_processing.Image.open
+    monkeypatch.setattr(image_processing.Image, "open", lambda *args: opened.append(1) or original_open(*args))
+
+    data, mime_type, fingerprint = prepare_image(_screenshot("See you at 6"), "image/png")
+
+    assert len(opened) == 1
+    assert mime_type == "image/jpeg"
+    assert Image.open(io.BytesIO(data)).format == "JPEG"
+    assert fingerprint == _fingerprint("See you at 6")
+
+
+def test_undecodable_image_has_no_fingerprint():
+    assert prepare_image(b"not an image", "image/png") == (b"not an image", "image/png", None)
+
+
+def test_same_image_hits_and_a_different_one_misses(clock):
+    cache = VisionCache()
+    cache.put(1, _fingerprint("See you at 6"), ANALYSIS)
+
+    assert cache.get(1, _fingerprint("See you at 6")) == ANALYSIS
+    assert cache.get(1, _fingerprint("Running late, start without me")) is None
+    assert cache.get(2, _fingerprint("See you at 6")) is None
+
+
+def test_same_layout_screenshots_are_not_replayed_by_default(clock):
+    first, second = _fingerprint("See you at 6"), _fingerprint("Running late, start without me")
+    # The perceptual hashes are (near) identical; only the exact digest tells them apart
+    assert vision_cache_module.hamming_distance(first[1], second[1]) <= 4
+    assert first[0] != second[0]
+    cache = VisionCache()
+    cache.put(1, first, ANALYSIS)
+
+    assert cache.get(1, second) is None
+
+
+def test_near_matches_when_a_distance_is_configured(clock, monkeypatch):
+    monkeypatch.setattr(vision_cache_module, "VISION_CACHE_MAX_DISTANCE", 4)
+    cache = VisionCache()
+    cache.put(1, ("a" * 64, "00000000000000ff"), ANALYSIS)
+
+    assert cache.get(1, ("b" * 64, "00000000000000f0")) == ANALYSIS
+    assert cache.get(1, ("b" * 64, "000000000000ffff")) is None
+
+
+def test_entries_expire_after_the_ttl(clock, monkeypatch):
+    monkeypatch.setattr(vision_cache_module, "VISION_CACHE_TTL_SECONDS", 600)
+    cache = VisionCache()
+    cache.put(1, ("a" * 64, "0" * 16), ANALYSIS)
+
+    clock[0] += 599
+    assert cache.get(1, ("a" * 64, "0" * 16)) == ANALYSIS
+    clock[0] += 1
+    assert cache.get(1, ("a" * 64, "0" * 16)) is None
+
+
+def test_lru_limits_per_user_and_across_users(clock, monkeypatch):
+    monkeypatch.setattr(vision_cache_module, "VISION_CACHE_PER_USER", 2)
+    monkeypatch.setattr(vision_cache_module, "VISION_CACHE_MAX_USERS", 2)
+    cache = VisionCache()
+    for digest in ("a", "b", "c"):
+        cache.put(1, (digest * 64, "0" * 16), {'title': digest})
+    assert cache.get(1, ("a" * 64, "0" * 16)) is None
+    assert cache.get(1, ("c" * 64, "0" * 16)) == {'title': "c"}
+
+    cache.put(2, ("a" * 64, "0" * 16), ANALYSIS)
+    cache.get(1, ("c" * 64, "0" * 16))
+    cache.put(3, ("a" * 64, "0" * 16), ANALYSIS)
+
+    # User 2 was the least recently used
+    assert cache.get(2, ("a" * 64, "0" * 16)) is None
+    assert cache.get(1, ("c" * 64, "0" * 16)) == {'title': "c"}
+
+
+def test_cached_analysis_is_a_copy(clock):
+    cache = VisionCache()
+    cache.put(1, ("a" * 64, "0" * 16), ANALYSIS)
+
+    cache.get(1, ("a" * 64, "0" * 16))['insights']['focus_score'] = 0
+
+    assert cache.get(1, ("a" * 64, "0" * 16))['insights']['focus_score'] == 80
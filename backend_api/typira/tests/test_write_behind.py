@@ -0,0 +1,65 @@
+from app.helpers import write_behind
+from app.helpers.write_behind import WriteBehindBuffer
+
+
+class CounterBuffer(WriteBehindBuffer):
+    """Sums integers per key into `stored`; keys in `broken` fail every write."""
+
+    def __init__(self):
+        super().__init__("test_buffer", flush_interval=60, max_pending=1000)
+        self.stored = {}
+        self.broken = set()
+
+    def merge(self, pending, key, item):
+        pending[key] = pending.get(key, 0) + item
+
+    def combine(self, older, newer):
+        return older + newer
+
+    def write(self, batch):
+        if self.broken & set(batch):
+            raise RuntimeError("write failed")
+        for key, value in batch.items():
+            self.stored[key] = self.stored.get(key, 0) + value
+
+
+def test_one_failing_key_does_not_drop_the_batch(app):
+    buffer = CounterBuffer()
+    buffer.app = app
+    buffer.broken = {"bad"}
+    for key in ("a", "b", "bad", "a"):
+        buffer.add(key, 1)
+
+    buffer.flush()
+
+    assert buffer.stored == {"a": 2, "b": 1}
+    assert buffer.peek("bad") == 1
+
+
+def test_failed_key_is_retried_with_later_items(app):
+    buffer = CounterBuffer()
+    buffer.app = app
+    buffer.broken = {"a"}
+    buffer.add("a", 1)
+    buffer.flush()
+    buffer.add("a", 2)
+
+    buffer.broken = set()
+    buffer.flush()
+
+    assert buffer.stored == {"a": 3}
+    assert buffer.peek("a") is None
+
+
+def test_key_is_dropped_after_max_attempts(app, monkeypatch):
+    monkeypatch.setattr(write_behind, "WRITE_BEHIND_MAX_ATTEMPTS", 3)
+    buffer = CounterBuffer()
+    buffer.app = app
+    buffer.broken = {"bad"}
+    buffer.add("bad", 1)
+
+    for _ in range(3):
+        buffer.flush()
+
+    assert buffer.peek("bad") is None
+    assert buffer.stored == {}